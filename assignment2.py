@@ -1,23 +1,170 @@
 import argparse
+import os
+import sys
 import functions
+import local_pdfs
+import metrics
+from incident_store import IncidentStore
+from incident_table import IncidentTable
+from rank_state import RankState
+import writers
 
+# options of run and their defaults, the keyword arguments of main and the defaults of the command line
+DEFAULT_OPTIONS = {
+    'workers': 4, 'parse_workers': 1, 'cache_dir': '.incident_cache', 'augment_workers': 8, 'stream': False,
+    'ems_mode': 'index', 'profile': False, 'metrics_path': None, 'extract_mode': 'text', 'incremental': False,
+    'output_format': 'print', 'output_path': None, 'geocoder_data': None, 'town_center': None, 'town_sectors': None,
+    'columns': None, 'store_path': None, 'shards': 1, 'shard_dir': None, 'shard_phase': None, 'shard_index': 0,
+    'watch': False, 'watch_interval': functions.WATCH_INTERVAL,
+}
 
-def main(urls_filename):
-    with open(urls_filename, 'r') as file:
-        urls = file.read().splitlines()
 
-    all_incidents = []
+def main(urls_filename, pdf_paths=None, **options):
+    urls = []
+    if urls_filename:
+        with open(urls_filename, 'r') as file:
+            urls = file.read().splitlines()
+    # local PDFs and directories of them follow the listed URLs
+    urls.extend(pdf_paths or [])
 
-    for url in urls:
-        # get incident PDF data
-        incident_data = functions.fetch_incidents(url)
+    run(urls, {**DEFAULT_OPTIONS, **options})
 
-        # extract incident data
-        incidents = functions.extract_incidents(incident_data)
 
+def run(urls, options=None):
+    """Augment and write the incidents of the given URLs in the current process.
+
+    Library entry point for schedulers, which avoid starting an interpreter for every run. Each run configures
+    the caches, the offline geocoder, the town and the share of the API rate limits from its own options. The
+    keep-alive connections and circuit breakers of http_client are kept for the next runs of the process.
+
+    Params:
+    - urls (list): URLs of incident summary PDFs, local PDF files and directories of them
+    - options (dict/None): DEFAULT_OPTIONS to change, the keyword arguments of main
+    Return:
+        count (int): number of written incidents
+    """
+    unknown = sorted((options or {}).keys() - DEFAULT_OPTIONS.keys())
+    if unknown:
+        raise ValueError(f"unknown options {unknown}, expected some of {sorted(DEFAULT_OPTIONS)}")
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    profile, metrics_path = options.pop('profile'), options.pop('metrics_path')
+    output_format, output_path = options.pop('output_format'), options.pop('output_path')
+    store_path = options.pop('store_path')
+    # local PDFs are memory mapped rather than downloaded, directories are replaced by the PDFs below them
+    urls = local_pdfs.expand_sources(urls)
+    if options['watch'] and not urls:
+        raise ValueError("watch mode needs at least one daily summary URL to find the URLs of the next days from")
+
+    # collect per-stage timings and counters only when they are reported
+    metrics.reset()
+    metrics.enable(profile or bool(metrics_path))
+    # only compute and write the selected columns
+    options['columns'], _ = functions.select_columns(options['columns'])
+    # a watching run keeps adding to the output of its earlier runs
+    writer = writers.open_writer(output_format, output_path, options['columns'], append=options['watch'])
+    # keep the augmented incidents for later queries, see incident_store.py
+    store = IncidentStore(store_path) if store_path else None
+    try:
+        with metrics.timer('total'):
+            run_pipeline(urls, writer=writer, store=store, **options)
+    finally:
+        writer.close()
+        if store is not None:
+            store.close()
+        if profile:
+            print(metrics.report(), file=sys.stderr)
+        if metrics_path:
+            metrics.write_json(metrics_path)
+        metrics.enable(False)
+    return writer.count
+
+
+def run_pipeline(urls, writer, store, workers, parse_workers, cache_dir, augment_workers, stream, ems_mode,
+                 extract_mode, incremental, geocoder_data, town_center, town_sectors, columns, shards, shard_dir,
+                 shard_phase, shard_index, watch, watch_interval):
+    # keep lookups, downloaded PDFs and parsed incidents across runs when a cache directory is given
+    functions.configure_cache(cache_dir)
+    # geocode addresses with the local address and street files when given
+    functions.configure_geocoder(geocoder_data)
+    # measure the side of town from another center, or with polygons
+    functions.configure_town(town_center, town_sectors)
+    # the shard phases below take their share of the API rate limits
+    functions.configure_rate_limits()
+
+    # keep polling for the summaries of the next days, printing only their new incidents
+    if watch:
+        if shards > 1 or shard_phase:
+            raise ValueError("watching runs in one process, it cannot be sharded")
+        state = RankState(os.path.join(cache_dir, functions.RANK_STATE_DB_NAME) if cache_dir else None)
+        try:
+            functions.watch_and_print(urls, state, watch_interval, workers, parse_workers, augment_workers, ems_mode,
+                                      extract_mode, writer, columns, store)
+        finally:
+            state.close()
+        return
+
+    # split the URLs between shard processes ranking over all of them, or run one phase of one shard
+    if shards > 1 or shard_phase:
+        if ems_mode != 'index':
+            raise ValueError("sharded runs match EMSSTAT records with the merged index, use the 'index' mode")
+        if incremental:
+            raise ValueError("sharded runs rank every incident of their URLs, they cannot be incremental")
+        if shard_dir:
+            os.makedirs(shard_dir, exist_ok=True)
+        if not shard_phase:
+            functions.sharded_augment_and_print(urls, shards, shard_dir, workers, parse_workers, augment_workers,
+                                                extract_mode, writer, columns, store)
+            return
+        if not shard_dir:
+            raise ValueError("the shard phases exchange their files through the shard directory")
+        if shard_phase == 'count':
+            functions.configure_rate_limits(shards)
+            functions.count_shard(urls, shard_index, shards, shard_dir, workers, parse_workers, extract_mode)
+        elif shard_phase == 'merge':
+            functions.merge_shard_counts(shard_dir, shards)
+        elif shard_phase == 'augment':
+            functions.configure_rate_limits(shards)
+            functions.augment_shard(shard_index, shard_dir, augment_workers, columns)
+        else:
+            functions.collect_shards(shard_dir, shards, writer, columns, store)
+        return
+
+    # only augment the incidents not seen by earlier runs, ranking them with the stored counts
+    if incremental:
+        if not cache_dir:
+            raise ValueError("incremental runs keep their state in the cache directory")
+        state = RankState(os.path.join(cache_dir, functions.RANK_STATE_DB_NAME))
+        try:
+            incidents = functions.stream_incidents(urls, workers, parse_workers, extract_mode)
+            with metrics.timer('augment'):
+                functions.augment_and_print_incremental(incidents, state, augment_workers, ems_mode, writer, columns,
+                                                        store)
+        finally:
+            state.close()
+        return
+
+    # print each incident as soon as it is augmented, keeping at most one document in memory
+    if stream:
+        functions.stream_augment_and_print(urls, workers, parse_workers, augment_workers, ems_mode=ems_mode,
+                                           extract_mode=extract_mode, writer=writer, columns=columns, store=store)
+        return
+
+    # keep the incidents column by column, the dicts of each document are dropped once added
+    all_incidents = IncidentTable()
+
+    # get incident PDF data, downloading several URLs at once
+    all_incident_data = (incident_data for url, incident_data in functions.fetch_all_incidents(urls, workers))
+
+    # extract incident data, parsing several PDFs at once when parse_workers > 1
+    for incidents in functions.extract_all_incidents(all_incident_data, parse_workers, extract_mode):
         all_incidents.extend(incidents)
 
-    augmented_incidents = functions.augment_and_print_data(all_incidents)
+    with metrics.timer('augment'):
+        augmented_incidents = functions.augment_and_print_data(all_incidents, augment_workers, ems_mode, writer,
+                                                               columns)
+    if store is not None:
+        with metrics.timer('store'):
+            store.add(augmented_incidents)
 
 
 if __name__ == "__main__":
@@ -25,9 +172,131 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     # define the required command-line argument '--urls' for the incident summary URL
     parser.add_argument(
-        "--urls", type=str, required=True, help="File containing list of incident URLs."
+        "--urls", type=str, default=None,
+        help="File containing list of incident URLs, local PDF files or directories of them."
+    )
+    # define the optional command-line argument '--pdfs' for archived summaries on disk
+    parser.add_argument(
+        "--pdfs", type=str, action="append", default=None,
+        help="Local PDF file or directory of PDFs, read without downloading, may be repeated."
+    )
+    # define the optional command-line argument '--workers' for the number of concurrent downloads
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_OPTIONS['workers'], help="Number of PDFs downloaded concurrently."
+    )
+    # define the optional command-line argument '--parse-workers' for the number of parsing processes
+    parser.add_argument(
+        "--parse-workers", type=int, default=DEFAULT_OPTIONS['parse_workers'],
+        help="Number of processes parsing PDFs, 1 parses serially."
+    )
+    # define the optional command-line argument '--cache-dir' for the persistent lookup caches
+    parser.add_argument(
+        "--cache-dir", type=str, default=DEFAULT_OPTIONS['cache_dir'],
+        help="Directory of the persistent geocode, weather and PDF caches, empty string disables it."
+    )
+    # define the optional command-line argument '--augment-workers' for the number of concurrent lookups
+    parser.add_argument(
+        "--augment-workers", type=int, default=DEFAULT_OPTIONS['augment_workers'],
+        help="Number of concurrent geocode and weather lookups, 1 looks them up one incident at a time."
+    )
+    # define the optional command-line argument '--stream' for the constant memory pipeline
+    parser.add_argument(
+        "--stream", action="store_true", help="Stream incidents through a spill file instead of keeping all in memory."
+    )
+    # define the optional command-line argument '--ems-mode' for the EMSSTAT detection
+    parser.add_argument(
+        "--ems-mode", choices=functions.EMS_MODES, default=DEFAULT_OPTIONS['ems_mode'],
+        help="'index' matches EMSSTAT records anywhere, 'window' only within 3 records as before."
+    )
+    # define the optional command-line argument '--extract-mode' for the PDF text extraction
+    parser.add_argument(
+        "--extract-mode", choices=functions.EXTRACT_MODES, default=DEFAULT_OPTIONS['extract_mode'],
+        help="'text' splits the page text, 'layout' assigns text runs to columns by their position."
+    )
+    # define the optional command-line argument '--incremental' for runs that only add new incidents
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="Only print incidents not seen by earlier runs, ranked with the counts stored in the cache directory."
+    )
+    # define the optional command-line arguments '--format' and '--output' for the output writer
+    parser.add_argument(
+        "--format", choices=writers.OUTPUT_FORMATS, default=DEFAULT_OPTIONS['output_format'],
+        help="Output format, 'print' is the double tab separated table printed before."
+    )
+    parser.add_argument(
+        "--output", type=str, default=DEFAULT_OPTIONS['output_path'],
+        help="File receiving the augmented incidents instead of stdout."
+    )
+    # define the optional command-line argument '--geocoder-data' for the offline geocoder
+    parser.add_argument(
+        "--geocoder-data", type=str, action="append", default=DEFAULT_OPTIONS['geocoder_data'],
+        help="CSV file of address points or street centerlines used to geocode without the API, may be repeated."
+    )
+    # define the optional command-line arguments '--town-center' and '--town-sectors' for the side of town
+    parser.add_argument(
+        "--town-center", type=lambda value: tuple(float(part) for part in value.split(',')),
+        default=DEFAULT_OPTIONS['town_center'],
+        help="Town center as LAT,LON that the side of town is measured from."
+    )
+    parser.add_argument(
+        "--town-sectors", type=str, default=DEFAULT_OPTIONS['town_sectors'],
+        help="JSON file mapping side of town labels to [lat, lon] polygons, replacing the compass directions."
+    )
+    # define the optional command-line argument '--columns' for the computed output columns
+    parser.add_argument(
+        "--columns", type=lambda value: value.split(','), default=DEFAULT_OPTIONS['columns'],
+        help="Comma separated output columns to compute, e.g. location_rank,incident_rank,ems_stat. "
+             "Weather and side_of_town need geocoding, the other columns do not use the network."
+    )
+    # define the optional command-line argument '--store' for the query store
+    parser.add_argument(
+        "--store", type=str, default=DEFAULT_OPTIONS['store_path'],
+        help="SQLite file the augmented incidents are added to, queried with incident_store.py."
+    )
+    # define the optional command-line arguments '--shards', '--shard-dir', '--shard-phase' and '--shard-index'
+    # for sharded runs, on local processes or on nodes sharing the shard directory
+    parser.add_argument(
+        "--shards", type=int, default=DEFAULT_OPTIONS['shards'],
+        help="Number of shards the URLs are split between, each shard runs in its own process."
+    )
+    parser.add_argument(
+        "--shard-dir", type=str, default=DEFAULT_OPTIONS['shard_dir'],
+        help="Directory of the shard files, shared by the nodes."
+    )
+    parser.add_argument(
+        "--shard-phase", choices=functions.SHARD_PHASES, default=DEFAULT_OPTIONS['shard_phase'],
+        help="Only run this phase: 'count' and 'augment' for one shard, 'merge' and 'collect' on the coordinator."
+    )
+    parser.add_argument(
+        "--shard-index", type=int, default=DEFAULT_OPTIONS['shard_index'],
+        help="Shard of the 'count' and 'augment' phases, from 0."
+    )
+    # define the optional command-line arguments '--watch' and '--watch-interval' for the daemon mode
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="Keep running, polling for the summary of the day after the last URL and printing its new incidents."
+    )
+    parser.add_argument(
+        "--watch-interval", type=float, default=DEFAULT_OPTIONS['watch_interval'],
+        help="Seconds between two polls of the watch mode."
+    )
+    # define the optional command-line arguments '--profile' and '--metrics-json' for the instrumentation
+    parser.add_argument(
+        "--profile", action="store_true", help="Print per-stage timings and counters to stderr after the run."
+    )
+    parser.add_argument(
+        "--metrics-json", type=str, default=DEFAULT_OPTIONS['metrics_path'],
+        help="Write per-stage timings and counters to this JSON file."
     )
     # parse command-line arguments
     args = parser.parse_args()
-    if args.urls:
-        main(args.urls)
\ No newline at end of file
+    if not args.urls and not args.pdfs:
+        parser.error("one of the arguments --urls --pdfs is required")
+    main(args.urls, pdf_paths=args.pdfs, workers=args.workers, parse_workers=args.parse_workers,
+         cache_dir=args.cache_dir, augment_workers=args.augment_workers, stream=args.stream, ems_mode=args.ems_mode,
+         profile=args.profile, metrics_path=args.metrics_json, extract_mode=args.extract_mode,
+         incremental=args.incremental, output_format=args.format, output_path=args.output,
+         geocoder_data=args.geocoder_data, town_center=args.town_center, town_sectors=args.town_sectors,
+         columns=args.columns, store_path=args.store, shards=args.shards, shard_dir=args.shard_dir,
+         shard_phase=args.shard_phase, shard_index=args.shard_index, watch=args.watch,
+         watch_interval=args.watch_interval)
@@ -0,0 +1,308 @@
+"""Throughput benchmark of the incident pipeline on synthetic PDFs and local network stand-ins.
+
+Run:
+    python -m benchmarks.bench run --days 7 --incidents 300 --latency 0.02
+Measure how the sharded pipeline scales with its shard processes:
+    python -m benchmarks.bench run --days 28 --incidents 300 --latency 0.02 --shards 4
+Check the startup time of the command line entry point against its budget:
+    python -m benchmarks.bench startup
+Compare two saved results:
+    python -m benchmarks.bench compare benchmarks/results/<old>.json benchmarks/results/<new>.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime
+
+from pypdf import PdfReader
+
+import functions
+import writers
+from incident_table import IncidentTable
+from benchmarks.fakes import FakeNetwork
+from benchmarks.synthetic import daily_summary_pdf, summary_dates
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+STAGES = ("fetch", "extract", "split_and_refactor", "tokenize", "augment")
+# stages only measured when asked for
+OPTIONAL_STAGES = ("sharded",)
+# modules that importing the entry point must leave to the stages that use them
+HEAVY_MODULES = ("pypdf", "requests", "urllib3", "numpy", "multiprocessing")
+# seconds `assignment2.py --help` may take on top of starting a bare interpreter
+STARTUP_BUDGET = 0.15
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@contextlib.contextmanager
+def measure(results, stage, items):
+    """Record wall time, CPU time and peak memory of a stage into results[stage].
+
+    Peak memory is the peak of the Python allocations of the stage when tracemalloc is tracing,
+    otherwise the peak resident size of the process so far.
+    """
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    yield
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+    if tracemalloc.is_tracing():
+        peak_mem = tracemalloc.get_traced_memory()[1]
+    else:
+        peak_mem = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    results[stage] = {
+        "wall_s": round(wall, 6),
+        "cpu_s": round(cpu, 6),
+        "peak_mem_bytes": peak_mem,
+        "items": items(),
+        "items_per_s": round(items() / wall, 2) if wall else None,
+    }
+
+
+def run(days=7, incidents=300, latency=0.0, workers=4, parse_workers=1, augment_workers=8, rate_limit=False,
+        seed=0, trace_memory=False, start=date(2024, 1, 1), shards=0):
+    """Run every stage of the pipeline once and return the measurements.
+
+    Params:
+    - days (int): number of daily summaries
+    - incidents (int): incidents per summary
+    - latency (float): seconds the local stand-ins wait before answering each request
+    - workers, parse_workers, augment_workers (int): worker counts of the pipeline stages
+    - rate_limit (bool): keep functions.API_RATE_LIMITS, otherwise lookups are not throttled
+    - seed (int): seed of the synthetic incidents
+    - trace_memory (bool): measure the peak Python allocations of each stage with tracemalloc, which slows
+      every stage down several times
+    - start (date): day of the first summary
+    - shards (int): also time the whole sharded pipeline with that many shard processes, from empty caches
+    Return:
+        result (dict): parameters, environment and per-stage measurements
+    """
+    pdfs = {f"{day}_daily_incident_summary.pdf": daily_summary_pdf(day, incidents, seed)
+            for day in summary_dates(start, days)}
+    stages = {}
+    saved_limits = dict(functions.API_RATE_LIMITS)
+    # start from empty in-memory caches so every run does the same lookups
+    functions.configure_cache(None)
+    if not rate_limit:
+        functions.API_RATE_LIMITS.update({api: float("inf") for api in functions.API_RATE_LIMITS})
+
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        with FakeNetwork(pdfs, latency) as network:
+            urls = network.pdf_urls()
+            all_data = []
+            with measure(stages, "fetch", lambda: len(all_data)):
+                all_data = [data for url, data in functions.fetch_all_incidents(urls, workers)]
+
+            documents = []
+            with measure(stages, "extract", lambda: sum(len(document) for document in documents)):
+                documents = list(functions.extract_all_incidents(all_data, parse_workers))
+
+            pages = _page_texts(all_data)
+            records = []
+            with measure(stages, "split_and_refactor", lambda: len(records)):
+                for page_text, page_type in pages:
+                    records.extend(functions.refactor_page_data(functions.split_all_incidents(page_text, page_type)))
+
+            tokens = []
+            with measure(stages, "tokenize", lambda: len(tokens)):
+                for page_text, page_type in pages:
+                    tokens.extend(functions.tokenize_page(page_text, page_type))
+
+            table = IncidentTable.from_records(record for document in documents for record in document)
+            with measure(stages, "augment", lambda: len(table)):
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    functions.augment_and_print_data(table, augment_workers)
+            if shards:
+                printed = []
+                # shard processes start from empty caches, like the stages above
+                functions.configure_cache(None)
+                with measure(stages, "sharded", lambda: sum(printed)):
+                    writer = writers.open_writer('print', os.devnull)
+                    printed.append(functions.sharded_augment_and_print(urls, shards, workers=workers,
+                                                                       parse_workers=parse_workers,
+                                                                       augment_workers=augment_workers,
+                                                                       writer=writer))
+                    writer.close()
+            requests = dict(network.requests)
+    finally:
+        tracemalloc.stop()
+        functions.API_RATE_LIMITS.update(saved_limits)
+
+    return {
+        "commit": _commit(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "params": {"days": days, "incidents": incidents, "latency": latency, "workers": workers,
+                   "parse_workers": parse_workers, "augment_workers": augment_workers, "rate_limit": rate_limit,
+                   "seed": seed, "trace_memory": trace_memory, "shards": shards},
+        "requests": requests,
+        "stages": stages,
+    }
+
+
+def startup(repeat=10, budget=STARTUP_BUDGET):
+    """Measure the startup time of assignment2.py and the heavy modules its import loads.
+
+    Params:
+    - repeat (int): number of timed starts of each command, the median is kept
+    - budget (float): seconds of startup allowed on top of a bare interpreter
+    Return:
+        result (dict): median seconds of a bare interpreter and of `assignment2.py --help`, their difference,
+            the HEAVY_MODULES loaded by `import assignment2` and whether the budget is kept
+    """
+    def median_seconds(command):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run(command, cwd=ROOT_DIR, stdout=subprocess.DEVNULL, check=True)
+            times.append(time.perf_counter() - start)
+        return statistics.median(times)
+
+    bare = median_seconds([sys.executable, "-c", "pass"])
+    cli = median_seconds([sys.executable, "assignment2.py", "--help"])
+    loaded = subprocess.run(
+        [sys.executable, "-c", f"import sys, assignment2; print(*[m for m in {HEAVY_MODULES!r} if m in sys.modules])"],
+        cwd=ROOT_DIR, capture_output=True, text=True, check=True
+    ).stdout.split()
+    overhead = cli - bare
+    return {
+        "commit": _commit(),
+        "bare_s": round(bare, 4),
+        "cli_help_s": round(cli, 4),
+        "overhead_s": round(overhead, 4),
+        "budget_s": budget,
+        "heavy_modules": loaded,
+        "within_budget": overhead <= budget and not loaded,
+    }
+
+
+def _page_texts(all_data):
+    # page text of every page, cut like _cut_page_text, so splitting and refactoring can be timed alone
+    pages = []
+    for data in all_data:
+        reader = PdfReader(io.BytesIO(data))
+        tot_pages = len(reader.pages)
+        for page_num, page in enumerate(reader.pages):
+            text = page.extract_text()
+            if page_num == 0:
+                pages.append((text[57:-55], None))
+            else:
+                pages.append((text, 'last' if page_num == tot_pages - 1 else None))
+    return pages
+
+
+def _commit():
+    # short hash of the checked out commit, with a marker when the tree has local changes
+    try:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(old, new, threshold=0.15):
+    """Compare two results stage by stage.
+
+    Params:
+    - old (dict): baseline result
+    - new (dict): result to check
+    - threshold (float): relative slowdown or memory growth reported as a regression
+    Return:
+        (lines, regressions) (tuple): report lines and the number of regressions
+    """
+    lines, regressions = [], 0
+    if old.get("params") != new.get("params"):
+        lines.append("warning: results were measured with different parameters")
+    lines.append(f"{'stage':<20}{'metric':<16}{old['commit']:>16}{new['commit']:>16}{'change':>10}")
+    for stage in STAGES + OPTIONAL_STAGES:
+        if stage not in old["stages"] or stage not in new["stages"]:
+            continue
+        for metric in ("wall_s", "cpu_s", "peak_mem_bytes"):
+            before, after = old["stages"][stage][metric], new["stages"][stage][metric]
+            change = (after - before) / before if before else 0.0
+            flag = ""
+            if change > threshold and metric != "cpu_s":
+                flag = "  REGRESSION"
+                regressions += 1
+            lines.append(f"{stage:<20}{metric:<16}{before:>16}{after:>16}{change:>+10.1%}{flag}")
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmark and save the result.")
+    run_parser.add_argument("--days", type=int, default=7, help="Number of daily summaries.")
+    run_parser.add_argument("--incidents", type=int, default=300, help="Incidents per summary.")
+    run_parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every fake request.")
+    run_parser.add_argument("--workers", type=int, default=4)
+    run_parser.add_argument("--parse-workers", type=int, default=1)
+    run_parser.add_argument("--augment-workers", type=int, default=8)
+    run_parser.add_argument("--rate-limit", action="store_true", help="Keep the API rate limits.")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--trace-memory", action="store_true",
+                            help="Measure per-stage peak allocations with tracemalloc instead of the process peak.")
+    run_parser.add_argument("--shards", type=int, default=0,
+                            help="Also time the sharded pipeline with this many shard processes.")
+    run_parser.add_argument("--output", type=str, default=None,
+                            help="Result file, defaults to benchmarks/results/<commit>.json.")
+
+    startup_parser = commands.add_parser("startup", help="Check the startup time of assignment2.py.")
+    startup_parser.add_argument("--repeat", type=int, default=10, help="Timed starts of each command.")
+    startup_parser.add_argument("--budget", type=float, default=STARTUP_BUDGET,
+                                help="Seconds allowed on top of a bare interpreter.")
+
+    compare_parser = commands.add_parser("compare", help="Compare two saved results.")
+    compare_parser.add_argument("old", type=str)
+    compare_parser.add_argument("new", type=str)
+    compare_parser.add_argument("--threshold", type=float, default=0.15,
+                                help="Relative slowdown or memory growth reported as a regression.")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        result = run(args.days, args.incidents, args.latency, args.workers, args.parse_workers,
+                     args.augment_workers, args.rate_limit, args.seed, args.trace_memory, shards=args.shards)
+        output = args.output or os.path.join(RESULTS_DIR, f"{result['commit']}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w") as file:
+            json.dump(result, file, indent=2)
+        for stage, metrics in result["stages"].items():
+            print(f"{stage:<20}{metrics['wall_s']:>10.3f}s wall{metrics['cpu_s']:>10.3f}s cpu"
+                  f"{metrics['peak_mem_bytes'] / 2 ** 20:>10.1f} MiB peak{metrics['items_per_s'] or 0:>12.0f} items/s")
+        print(f"saved {output}")
+        return 0
+
+    if args.command == "startup":
+        result = startup(args.repeat, args.budget)
+        print(f"bare interpreter {result['bare_s']:.3f}s, assignment2.py --help {result['cli_help_s']:.3f}s, "
+              f"overhead {result['overhead_s']:.3f}s of {result['budget_s']:.3f}s budget")
+        if result["heavy_modules"]:
+            print(f"imported at startup: {', '.join(result['heavy_modules'])}")
+        return 0 if result["within_budget"] else 1
+
+    with open(args.old) as file:
+        old = json.load(file)
+    with open(args.new) as file:
+        new = json.load(file)
+    lines, regressions = compare(old, new, args.threshold)
+    print("\n".join(lines))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""Local stand-ins for the PDF host, the geocoding API and the weather API, with injected latency."""
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import functions
+
+# center and spread of the fake coordinates, around Norman
+NORMAN_LAT, NORMAN_LON, SPREAD = 35.22, -97.44, 0.08
+
+
+def geocode_route(path, query):
+    # deterministic coordinates derived from the address
+    address = query.get("address", [""])[0]
+    digest = hashlib.sha256(address.encode()).digest()
+    lat = NORMAN_LAT + (digest[0] / 255 - 0.5) * SPREAD
+    lon = NORMAN_LON + (digest[1] / 255 - 0.5) * SPREAD
+    body = {"results": [{"geometry": {"location": {"lat": lat, "lng": lon}}}], "status": "OK"}
+    return 200, "application/json", json.dumps(body).encode()
+
+
+def weather_route(path, query):
+    # deterministic hourly weather codes derived from the cell and day
+    key = "{latitude}{longitude}{start_date}".format(**{name: values[0] for name, values in query.items()})
+    digest = hashlib.sha256(key.encode()).digest()
+    codes = [(0, 1, 2, 3, 51, 61, 71)[byte % 7] for byte in digest[:24]]
+    return 200, "application/json", json.dumps({"hourly": {"weather_code": codes}}).encode()
+
+
+class FakeNetwork:
+    """HTTP server answering every route of the pipeline locally.
+
+    Routes are looked up by the first path segment and can be replaced or added through the routes dict,
+    each route takes the path and the parsed query string and returns (status, content type, body).
+
+    Params:
+    - pdfs (dict): PDF document data served under /pdfs/<name>
+    - latency (dict/float): seconds slept before answering, per route name or for all routes
+    """
+
+    def __init__(self, pdfs=None, latency=0.0):
+        self.pdfs = dict(pdfs or {})
+        self.latency = latency
+        self.requests = Counter()
+        self.lock = threading.Lock()
+        self.routes = {"geocode": geocode_route, "archive": weather_route, "pdfs": self.pdf_route}
+        self.server = None
+        self.thread = None
+        self.saved_urls = None
+
+    def pdf_route(self, path, query):
+        name = path.rsplit("/", 1)[-1]
+        if name not in self.pdfs:
+            return 404, "text/plain", b"not found"
+        return 200, "application/pdf", self.pdfs[name]
+
+    def url(self, path):
+        """Absolute URL of a path on the server."""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/{path.lstrip('/')}"
+
+    def pdf_urls(self):
+        """URLs of the served PDFs, in insertion order."""
+        return [self.url(f"pdfs/{name}") for name in self.pdfs]
+
+    def start(self):
+        """Start serving on a free local port and point the lookup APIs of functions at the server."""
+        network = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body are separate writes, with Nagle's algorithm the body waits for the delayed ACK
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                route = parsed.path.strip("/").split("/")[0]
+                with network.lock:
+                    network.requests[route] += 1
+                latency = network.latency.get(route, 0.0) if isinstance(network.latency, dict) else network.latency
+                if latency:
+                    time.sleep(latency)
+                if route in network.routes:
+                    status, content_type, body = network.routes[route](parsed.path, parse_qs(parsed.query))
+                else:
+                    status, content_type, body = 404, "text/plain", b"not found"
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.saved_urls = (functions.GEOCODE_URL, functions.WEATHER_URL)
+        functions.GEOCODE_URL = self.url("geocode/json")
+        functions.WEATHER_URL = self.url("archive")
+        return self
+
+    def stop(self):
+        """Stop the server and restore the lookup API endpoints."""
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self.saved_urls is not None:
+            functions.GEOCODE_URL, functions.WEATHER_URL = self.saved_urls
+            self.saved_urls = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,162 @@
+"""Synthetic Norman-style daily incident summary PDFs."""
+import random
+from datetime import date, timedelta
+
+# x coordinate of the Date / Time, Incident Number, Location, Nature and Incident ORI columns
+COLUMN_X = (36, 110, 200, 380, 520)
+COLUMN_HEADERS = ("Date / Time", "Incident Number", "Location", "Nature", "Incident ORI")
+ROWS_PER_PAGE = 40
+ROW_HEIGHT = 17
+FONT_SIZE = 8
+
+STREETS = [
+    "W LINDSEY ST", "E LINDSEY ST", "N PORTER AVE", "S FLOOD AVE", "HEATHER GLEN DR", "BEVERLY HILLS ST",
+    "ALAMEDA ST", "CROSSROADS CT", "W BROOKS ST", "LAKEHURST DR", "MCCULLOUGH ST", "24TH AVE SE",
+    "SUMMIT WAY", "COLLEGE AVE", "CHAUTAUQUA AVE", "HEALTHPLEX PKWY", "ANN BRANDEN BLVD", "NORMAN CENTER CT",
+    "HUETTNER DR", "E ROBINSON ST", "HEMPHILL DR", "E BOYD ST", "12TH AVE SE", "E HAYES ST", "DEWEY AVE",
+    "CLASSEN BLVD", "W MAIN ST", "E ALAMEDA ST", "36TH AVE NW", "W TECUMSEH RD"
+]
+CROSS_STREETS = [
+    ("DOVER ST", "VICKSBURG AVE"), ("S JAMES GARNER AVE", "W APACHE ST"), ("E BOYD ST", "TROUT AVE"),
+    ("12TH AVE NE", "E TECUMSEH RD"), ("THOMPSON DR", "MELROSE DR"), ("WYLIE RD", "LINDALE AVE")
+]
+POLICE_NATURES = [
+    "Check Area", "Drunk Driver", "Alarm", "Extra Patrol", "Contact a Subject", "Welfare Check", "Noise Complaint",
+    "Assault", "Burglary", "Suspicious", "Follow Up", "Traffic Stop", "Larceny", "Prowler", "Motorist Assist",
+    "Animal Complaint", "Mutual Aid", "Escort/Transport", "Alarm Holdup/Panic"
+]
+MEDICAL_NATURES = [
+    "Medical Call Pd Requested", "Sick Person", "Falls", "Fire Alarm", "Public Assist", "Fire Residential",
+    "Animal Bites/Attacks", "Transfer/Interfacility"
+]
+
+
+def incident_rows(day, n_incidents, seed=0):
+    """Generate the rows of one daily summary.
+
+    About a third of the incidents are medical calls reported twice, once by the fire department (14005)
+    and once as EMSSTAT, as in the real summaries.
+
+    Params:
+    - day (date): day of the summary
+    - n_incidents (int): number of rows
+    - seed (int): seed of the random generator, the same seed gives the same rows
+    Return:
+        rows (list): (time, number, location, nature, ori) tuples ordered by time
+    """
+    rng = random.Random(f"{seed}-{day}")
+    rows = []
+    minute = 0
+    number = rng.randint(1000, 5000)
+    while len(rows) < n_incidents:
+        minute = min(minute + rng.randint(0, 4), 24 * 60 - 1)
+        incident_time = f"{day.month}/{day.day}/{day.year} {minute // 60}:{minute % 60:02d}"
+        location = _location(rng)
+        number += 1
+        if rng.random() < 0.33:
+            nature = rng.choice(MEDICAL_NATURES)
+            rows.append((incident_time, f"{day.year}-{number:08d}", location, nature, "14005"))
+            number += 1
+            rows.append((incident_time, f"{day.year}-{number:08d}", location, nature, "EMSSTAT"))
+        else:
+            rows.append((incident_time, f"{day.year}-{number:08d}", location, rng.choice(POLICE_NATURES),
+                         "OK0140200"))
+    return rows[:n_incidents]
+
+
+def _location(rng):
+    # street address, intersection or raw coordinates
+    kind = rng.random()
+    if kind < 0.75:
+        return f"{rng.randint(1, 40) * 100 + rng.randint(0, 99)} {rng.choice(STREETS)}"
+    if kind < 0.95:
+        return " / ".join(rng.choice(CROSS_STREETS))
+    return f"{35.15 + rng.random() * 0.15:.6f};{-97.5 + rng.random() * 0.15:.6f}"
+
+
+def daily_summary_pdf(day, n_incidents, seed=0, rows_per_page=ROWS_PER_PAGE):
+    """Build a daily incident summary PDF laid out like the Norman Police Department ones.
+
+    Params:
+    - day (date): day of the summary
+    - n_incidents (int): number of incidents
+    - seed (int): seed of the random generator
+    - rows_per_page (int): number of incidents per page
+    Return:
+        data (bytes): PDF document data
+    """
+    rows = incident_rows(day, n_incidents, seed)
+    pages = [rows[start:start + rows_per_page] for start in range(0, len(rows), rows_per_page)] or [[]]
+    contents = []
+    for page_num, page_rows in enumerate(pages):
+        content = []
+        y = 740
+        if page_num == 0:
+            # column headings, the title is drawn last so it is extracted after the rows
+            content.extend(_text(x, y, heading) for x, heading in zip(COLUMN_X, COLUMN_HEADERS))
+            y -= ROW_HEIGHT
+        for row in page_rows:
+            content.extend(_text(x, y, value) for x, value in zip(COLUMN_X, row))
+            y -= ROW_HEIGHT
+        if page_num == 0:
+            content.append(_text(36, 770, "NORMAN POLICE DEPARTMENT"))
+            content.append(_text(36, 758, "Daily Incident Summary (Public)"))
+        if page_num == len(pages) - 1:
+            # report date and time at the bottom of the last page
+            report_day = day + timedelta(days=1)
+            content.append(_text(36, 20, f"{report_day.month}/{report_day.day}/{report_day.year} 11:42"))
+        contents.append("".join(content))
+    return build_pdf(contents)
+
+
+def _text(x, y, value):
+    # one positioned text run
+    value = value.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return f"BT /F1 {FONT_SIZE} Tf 1 0 0 1 {x} {y} Tm ({value}) Tj ET\n"
+
+
+def build_pdf(contents):
+    """Assemble a PDF with one page per content stream, using the standard Helvetica font.
+
+    Params:
+        contents (list): content stream of each page
+    Return:
+        data (bytes): PDF document data
+    """
+    objects = [b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>", None]
+    font_id, pages_id = 1, 2
+    kids = []
+    for content in contents:
+        stream = content.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 %d 0 R >> >> "
+            b"/Contents %d 0 R >>" % (pages_id, font_id, len(objects))
+        )
+        kids.append(len(objects))
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), len(kids)
+    )
+    objects.append(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for object_id, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (object_id, body)
+    xref_offset = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        data += b"%010d 00000 n \n" % offset
+    data += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, len(objects), xref_offset
+    )
+    return bytes(data)
+
+
+def summary_dates(start, n_days):
+    """Dates of n_days consecutive daily summaries starting at start."""
+    return [start + timedelta(days=offset) for offset in range(n_days)]
+
+
+DEFAULT_START = date(2024, 1, 1)
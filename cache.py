@@ -0,0 +1,82 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# returned by get when a key is not cached, since None is a valid cached value
+MISSING = object()
+
+
+class SqliteCache:
+    """Key-value store persisted in a SQLite table, with expiry and a bounded in-memory LRU in front of it.
+
+    Params:
+    - path (str/None): SQLite database file, None keeps entries in memory only
+    - table (str): table holding the entries, several caches can share one database file
+    - ttl (float/None): seconds a value stays valid, None never expires
+    - negative_ttl (float/None): seconds a negative (None) value stays valid
+    - lru_size (int): number of entries kept in memory
+    """
+
+    def __init__(self, path, table, ttl=None, negative_ttl=None, lru_size=4096):
+        self.table = table
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.lru_size = lru_size
+        self.lru = OrderedDict()
+        self.lock = threading.Lock()
+        self.conn = None
+        if path:
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)"
+            )
+            self.conn.commit()
+
+    def get(self, key):
+        """Return the cached value of key, or MISSING if it is absent or expired."""
+        now = time.time()
+        with self.lock:
+            if key in self.lru:
+                value, expires_at = self.lru[key]
+                if expires_at is None or expires_at > now:
+                    self.lru.move_to_end(key)
+                    return value
+                del self.lru[key]
+            if self.conn is None:
+                return MISSING
+            row = self.conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] <= now):
+                return MISSING
+            value = json.loads(row[0])
+            self._remember(key, value, row[1])
+            return value
+
+    def put(self, key, value):
+        """Store value under key, None values expire after negative_ttl."""
+        ttl = self.negative_ttl if value is None else self.ttl
+        expires_at = None if ttl is None else time.time() + ttl
+        with self.lock:
+            self._remember(key, value, expires_at)
+            if self.conn is not None:
+                self.conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires_at)
+                )
+                self.conn.commit()
+
+    def _remember(self, key, value, expires_at):
+        # keep the entry in the LRU, evicting the least recently used ones above lru_size
+        self.lru[key] = (value, expires_at)
+        self.lru.move_to_end(key)
+        while len(self.lru) > self.lru_size:
+            self.lru.popitem(last=False)
+
+    def close(self):
+        """Close the database connection."""
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
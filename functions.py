@@ -1,96 +1,689 @@
 import io
+import os
+import sys
 import re
-import urllib.request
-from pypdf import PdfReader
-from datetime import datetime
+import json
+import hashlib
+from array import array
+from functools import lru_cache
+from contextlib import contextmanager
+import time
+import threading
+from collections import deque
+from bisect import bisect_right
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
 from collections import Counter
 import math
-import requests
-from requests.structures import CaseInsensitiveDict
+from cache import SqliteCache, MISSING
+import metrics
+from incident_table import IncidentTable
+import local_pdfs
+import writers
+# pypdf, requests (through http_client), numpy (through vectorized), the offline geocoder, multiprocessing and
+# tempfile are imported by the functions that use them, so that runs answered from the caches, or only printing
+# help, start quickly
+
+# geocoded addresses stay valid for 90 days, addresses the API could not resolve are retried after a day
+GEOCODE_TTL = 90 * 24 * 3600
+GEOCODE_NEGATIVE_TTL = 24 * 3600
+GEOCODE_LRU_SIZE = 4096
+CACHE_DB_NAME = "cache.sqlite"
+# database of the counts and incident numbers kept by incremental runs, inside the cache directory
+RANK_STATE_DB_NAME = "rank_state.sqlite"
+geocode_cache = SqliteCache(None, 'geocode', GEOCODE_TTL, GEOCODE_NEGATIVE_TTL, GEOCODE_LRU_SIZE)
+# geocoder of local address and street centerline files, None sends every address to the API
+offline_geocoder = None
+# files loaded into offline_geocoder, shard processes load them again
+geocoder_paths = []
+
+# hourly weather is fetched once per grid cell of WEATHER_GRID degrees and day, the archive does not change
+# once published but a missing day is retried after an hour
+WEATHER_GRID = 0.1
+WEATHER_NEGATIVE_TTL = 3600
+WEATHER_LRU_SIZE = 1024
+weather_cache = SqliteCache(None, 'weather', None, WEATHER_NEGATIVE_TTL, WEATHER_LRU_SIZE)
+
+# regex for recognizing the date that starts every incident
+DATE_SPLIT_PATTERN = re.compile(r'(?=\d{1,2}/\d{1,2}/\d{4})')
+# tokens that are always part of the nature, or split between the end of the location and the nature
+SPECIAL_TOKENS = {
+    "MVA": (None, "MVA"),
+    "COP": (None, "COP"),
+    "EMS": (None, "EMS"),
+    "RAMPMVA": ("RAMP", "MVA"),
+    "HWYMotorist": ("HWY", "Motorist"),
+    "RAMPMotorist": ("RAMP", "Motorist"),
+}
+
+# number of incidents before and after an incident searched for a matching EMSSTAT record
+EMS_WINDOW = 3
+# 'index' matches EMSSTAT records anywhere in the incidents by (time, location),
+# 'window' only searches EMS_WINDOW incidents around each incident as the original implementation
+EMS_MODES = ('index', 'window')
+
+# center of the town that sides of town are measured from, as (lat, lon)
+TOWN_CENTER = (35.220833, -97.443611)
+# the eight cardinal and intercardinal directions, clockwise from north
+DIRECTIONS = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
+# bearings this close to a sector boundary are classified again with the scalar function
+DIRECTION_TOLERANCE = 1e-6
+town_center = TOWN_CENTER
+# side of town label -> (lat, lon) polygon, replacing the compass sectors when set
+town_sectors = None
+# number of incidents whose lookups are batched together by the streaming pipeline
+STREAM_CHUNK_SIZE = 256
+# files of the sharded pipeline inside its shard directory, see sharded_augment_and_print
+SHARD_INCIDENTS_FILE = "shard-{}.incidents.jsonl"
+SHARD_COUNTS_FILE = "shard-{}.counts.json"
+SHARD_AUGMENTED_FILE = "shard-{}.augmented.jsonl"
+SHARD_RANKS_FILE = "ranks.json"
+# phases of the sharded pipeline, in order, nodes sharing the shard directory can run them separately
+SHARD_PHASES = ('count', 'merge', 'augment', 'collect')
+# date of a daily summary in its URL, and the upload month folder before it
+SUMMARY_DATE_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}')
+SUMMARY_FOLDER_PATTERN = re.compile(r'/\d{4}-\d{2}/')
+# seconds between two polls of the watch mode, and days after which a summary that never appeared is skipped
+WATCH_INTERVAL = 900
+WATCH_GRACE_DAYS = 7
+# what each output column and intermediate result is computed from, only the requested columns and
+# their dependencies are computed: 'coordinates' geocodes, 'weather' also calls the weather api
+COLUMN_DEPENDENCIES = {
+    'day_of_week': (),
+    'time_of_day': (),
+    'weather': ('coordinates',),
+    'location_rank': ('location_ranks',),
+    'side_of_town': ('coordinates',),
+    'incident_rank': ('incident_ranks',),
+    'incident_nature': (),
+    'ems_stat': ('ems_index',),
+    'coordinates': (),
+    'location_ranks': (),
+    'incident_ranks': (),
+    'ems_index': (),
+}
+
+# endpoints of the lookup APIs, the benchmarks point them at local stand-ins
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+WEATHER_URL = "https://archive-api.open-meteo.com/v1/archive"
+
+# requests per second allowed to each lookup API, geocoding allows 3,000 QPM and Open Meteo 600 per minute
+API_RATE_LIMITS = {'geocode': 50, 'weather': 10}
+# number of processes sharing API_RATE_LIMITS, each one takes an equal share
+rate_limit_shares = 1
+_rate_lock = threading.Lock()
+_next_request_time = {}
+
+# downloaded PDFs and parsed incidents are stored by content hash inside pdf_cache_dir, pdf_cache maps each URL
+# to the hash and validators of its last download
+PDF_LRU_SIZE = 1024
+# bump when a parser change would give different incidents for the same PDF
+PARSER_VERSION = 1
+pdf_cache_dir = None
+pdf_cache = SqliteCache(None, 'pdf', lru_size=PDF_LRU_SIZE)
+
+# define a dictionary of HTTP headers to simulate a request from a web browser
+FETCH_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux i686) AppleWebKit/537.17 (KHTML, like Gecko) Chrome/24.0.1312.27 "
+                  "Safari/537.17"
+}
+FETCH_TIMEOUT = (5, 30)
+# seconds to wait for a connection and a response of the geocoding and weather APIs
+LOOKUP_TIMEOUT = (5, 15)
+# smallest number of pages of one PDF worth sending to a separate parsing process
+MIN_PAGES_PER_TASK = 8
+
+# 'text' splits the extracted page text, 'layout' assigns positioned text runs to columns
+EXTRACT_MODES = ('text', 'layout')
+# column headings of the daily summary and the incident field of each column
+LAYOUT_HEADERS = ("Date / Time", "Incident Number", "Location", "Nature", "Incident ORI")
+LAYOUT_FIELDS = ("incident_time", "incident_number", "incident_location", "incident_nature", "incident_ori")
+# text runs starting at most this many points left of a heading still belong to its column
+LAYOUT_TOLERANCE = 2
+# font encodings whose strings are decoded without the character maps of pypdf
+SIMPLE_FONT_ENCODINGS = ('/WinAnsiEncoding', '/StandardEncoding')
+# kerning in a TJ array, in thousandths of an em, that separates two words
+WORD_SPACING = -200
+# regex for recognizing the date that starts the first column of a row
+DATE_PATTERN = re.compile(r'\d{1,2}/\d{1,2}/\d{4}')
+
+
+def fetch_incidents(url, retries=3, backoff=0.5):
+    """Download PDF data from provided URL
 
-lat_long_dict = {}
+    When the PDF cache is configured, a PDF downloaded before is only fetched again if the server reports a change.
+    Local files are memory mapped instead, see load_local_pdf.
 
+    Params:
+    - url (str): API to download PDF Document, or path of a local PDF
+    - retries (int): number of additional attempts after a failed download
+    - backoff (float): longest wait before the first retry, doubled on each retry
+    Return:
+        data (bytes/MappedPdf/None): Data of the PDF Document, None if it could not be downloaded
+    """
+    path = local_pdfs.source_path(url)
+    if path is not None:
+        return load_local_pdf(path)
+
+    # ask the server to answer 304 Not Modified when the cached copy is still current
+    cached = load_cached_pdf(url)
+    headers = {}
+    if cached is not None:
+        if cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        if cached['last_modified']:
+            headers['If-Modified-Since'] = cached['last_modified']
+
+    import requests
+    import http_client
+
+    start = time.perf_counter()
+    try:
+        # make an HTTP GET request to the specified URL, reusing the connection to the host
+        with metrics.timer('fetch'):
+            resp = http_client.get(url, headers=headers, timeout=FETCH_TIMEOUT, retries=retries, backoff=backoff,
+                                   default_headers=FETCH_HEADERS)
+        metrics.count('http.pdf')
+        if resp.status_code == 304 and cached is not None:
+            metrics.count('cache.pdf.not_modified')
+            metrics.record_url(url, time.perf_counter() - start)
+            return cached['data']
+        resp.raise_for_status()
+    except requests.RequestException as ex:
+        metrics.count('http.pdf.errors')
+        print("ERROR in fetching incidents: ", url, ex, file=sys.stderr)
+        return None
+    store_cached_pdf(url, resp)
+    metrics.record_url(url, time.perf_counter() - start)
+    # return the content of the HTTP response
+    return resp.content
+
+
+def load_local_pdf(path):
+    """Memory map a local PDF, its pages are read from the file as the parser accesses them.
+
+    Params:
+        path (str): PDF file
+    Return:
+        data (MappedPdf/None): Data of the PDF Document, None if it could not be read
+    """
+    try:
+        pdf = local_pdfs.MappedPdf(path)
+    except (OSError, ValueError) as ex:
+        # mmap cannot map an empty file
+        metrics.count('local.pdf.errors')
+        print("ERROR in reading incidents: ", path, ex, file=sys.stderr)
+        return None
+    metrics.count('local.pdf')
+    return pdf
 
-def fetch_incidents(url):
-    """Download PDF data from provided URL
+
+def load_cached_pdf(url):
+    """Find the cached copy of the PDF of a URL.
 
     Params:
-        url (str): API to download PDF Document
+        url (str): URL of the PDF Document
     Return:
-        data (bytes): Data of the PDF Document
+        cached (dict/None): etag, last_modified, sha256 and data of the cached PDF, None if not cached
     """
+    if not pdf_cache_dir:
+        return None
+    meta = pdf_cache.get(url)
+    if meta is MISSING:
+        return None
+    try:
+        with open(os.path.join(pdf_cache_dir, 'pdfs', meta['sha256'] + '.pdf'), 'rb') as file:
+            return dict(meta, data=file.read())
+    except OSError:
+        return None
+
+
+def store_cached_pdf(url, resp):
+    """Store a downloaded PDF under the hash of its content, with the validators of the response."""
+    if not pdf_cache_dir:
+        return
+    digest = hashlib.sha256(resp.content).hexdigest()
+    _write_atomic(os.path.join(pdf_cache_dir, 'pdfs', digest + '.pdf'), resp.content)
+    pdf_cache.put(url, {
+        'etag': resp.headers.get('ETag'),
+        'last_modified': resp.headers.get('Last-Modified'),
+        'sha256': digest
+    })
+
+
+def load_parsed_incidents(incident_data, extract_mode='text'):
+    """Return the incidents parsed before from the same PDF content, None if not cached."""
+    if not pdf_cache_dir:
+        return None
     try:
-        # define a dictionary of HTTP headers to simulate a request from a web browser
-        headers = {
-            "User-Agent": "Mozilla/5.0 (X11; Linux i686) AppleWebKit/537.17 (KHTML, like Gecko) Chrome/24.0.1312.27 "
-                          "Safari/537.17"
-        }
-        # make an HTTP GET request to the specified URL with the headers
-        data = urllib.request.urlopen(
-            urllib.request.Request(url, headers=headers)
-        ).read()
-        # return the content of the HTTP response
-        return data
-    except Exception as ex:
-        print("ERROR in fetching incidents: ", ex)
-
-
-def extract_incidents(incident_data):
+        with open(_parsed_path(incident_data, extract_mode), 'r') as file:
+            incidents = json.load(file)
+    except (OSError, ValueError):
+        metrics.count('cache.parsed.miss')
+        return None
+    metrics.count('cache.parsed.hit')
+    return incidents
+
+
+def store_parsed_incidents(incident_data, incidents, extract_mode='text'):
+    """Store the incidents parsed from a PDF under the hash of its content and the extraction mode."""
+    if not pdf_cache_dir:
+        return
+    _write_atomic(_parsed_path(incident_data, extract_mode), json.dumps(incidents).encode())
+
+
+def _parsed_path(incident_data, extract_mode='text'):
+    # parsed incidents are only reused by the same version and mode of the parser
+    digest = hashlib.sha256(incident_data).hexdigest()
+    return os.path.join(pdf_cache_dir, 'parsed', f"{digest}-{extract_mode}-v{PARSER_VERSION}.json")
+
+
+def _write_atomic(path, data):
+    # write to a temporary file first so a crash never leaves a truncated cache entry
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+
+
+def fetch_all_incidents(urls, workers=4):
+    """Download PDF data of several URLs concurrently.
+
+    Params:
+    - urls (list): URLs of PDF documents
+    - workers (int): number of concurrent downloads
+    Return:
+        generator of (url, data) tuples, in the same order as urls
+    """
+    if workers <= 1:
+        for url in urls:
+            yield url, fetch_incidents(url)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # keep a bounded number of downloads in flight so finished PDFs do not pile up in memory
+        pending = deque()
+        url_iter = iter(urls)
+        for url in url_iter:
+            pending.append((url, executor.submit(fetch_incidents, url)))
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            url, future = pending.popleft()
+            # yield each PDF as soon as it and all the ones before it are downloaded
+            yield url, future.result()
+            next_url = next(url_iter, None)
+            if next_url is not None:
+                pending.append((next_url, executor.submit(fetch_incidents, next_url)))
+
+
+def extract_incidents(incident_data, extract_mode='text'):
     """Extracts and gather incidents from PDF Document page-wise
 
     Params:
-        incident_data (bytes): PDF document data
+    - incident_data (bytes/MappedPdf/str/PathLike): PDF document data, or the path of a local PDF or of a
+      directory of PDFs
+    - extract_mode (str): one of EXTRACT_MODES
     Return:
-        incidents (list): All incidents with extracted fields
+        incidents (list): All incidents with extracted fields, of every PDF below a directory in name order
     """
-    # convert download data to bytes object
-    pdf_buffer = io.BytesIO(incident_data)
+    if isinstance(incident_data, (str, os.PathLike)):
+        incidents = []
+        for path in local_pdfs.expand_sources([os.fspath(incident_data)]):
+            pdf = load_local_pdf(path)
+            if pdf is not None:
+                incidents.extend(extract_page_range(pdf, 0, None, extract_mode))
+        return incidents
+    return extract_page_range(incident_data, 0, None, extract_mode)
+
+
+def _pdf_stream(incident_data):
+    # downloaded data is wrapped without a copy, a memory mapped PDF is read in place as its own file object
+    if isinstance(incident_data, local_pdfs.MappedPdf):
+        incident_data.seek(0)
+        return incident_data
+    return io.BytesIO(incident_data)
+
+
+def extract_page_range(incident_data, start, stop, extract_mode='text'):
+    """Extracts incidents from a range of pages of a PDF Document
+
+    Params:
+    - incident_data (bytes/MappedPdf): PDF document data
+    - start (int): first page number to extract
+    - stop (int/None): page number after the last page to extract, None for the end of the document
+    - extract_mode (str): one of EXTRACT_MODES
+    Return:
+        incidents (list): Incidents of the pages with extracted fields
+    """
+    from pypdf import PdfReader
+
     # create PDFReader object
-    reader = PdfReader(pdf_buffer)
+    reader = PdfReader(_pdf_stream(incident_data))
     # get total number of pages
     tot_pages = len(reader.pages)
+    if stop is None or stop > tot_pages:
+        stop = tot_pages
+    if extract_mode == 'layout':
+        return extract_layout_range(reader, start, stop)
 
     incidents = []
-    for page_num in range(tot_pages):
+    for page_num in range(start, stop):
         # create specific page object
         page = reader.pages[page_num]
-        # extract text
-        page_text = extract_page_text(page, page_num, tot_pages)
-        # refactor page text to capture different fields of incident
-        incidents.extend(refactor_page_data(page_text))
+        # extract text and capture different fields of incident
+        incidents.extend(extract_page_records(page, page_num, tot_pages))
 
     # create_json(incidents)
     return incidents
 
 
-def extract_page_text(page, page_num, tot_pages):
-    """Extract page text based on the page number.
+def extract_layout_range(reader, start, stop):
+    """Extracts incidents from a range of pages by the position of their text runs.
+
+    Pages without column headings reuse the columns of the last page that had them,
+    pages before any headings were found fall back to the text extraction.
+
+    Params:
+    - reader (PdfReader): PDF document
+    - start (int): first page number to extract
+    - stop (int): page number after the last page to extract
+    Return:
+        incidents (list): Incidents of the pages with extracted fields
+    """
+    tot_pages = len(reader.pages)
+    columns = None
+    if start > 0:
+        # the column headings are only printed on the first page
+        layout = layout_columns(extract_page_runs(reader.pages[0]))
+        if layout is not None:
+            columns = layout[0]
+
+    incidents = []
+    for page_num in range(start, stop):
+        page = reader.pages[page_num]
+        with metrics.timer('extract_text'):
+            runs = extract_page_runs(page)
+        metrics.count('pages')
+
+        with metrics.timer('layout'):
+            heading_y = None
+            layout = layout_columns(runs)
+            if layout is not None:
+                columns, heading_y = layout
+            page_incidents = layout_page_records(runs, columns, heading_y) if columns else None
+        if page_incidents is None:
+            page_incidents = extract_page_records(page, page_num, tot_pages)
+        else:
+            metrics.observe('records_per_page', len(page_incidents))
+        incidents.extend(page_incidents)
+    return incidents
+
+
+def extract_page_runs(page):
+    """Collect the positioned text runs of a page.
+
+    Runs are read straight from the content stream when all fonts of the page use a simple encoding,
+    otherwise pypdf extracts the text and reports the runs.
+
+    Params:
+        page (PageObject): specific page object
+    Return:
+        runs (list): (x, y, text) of every non-empty text run, in content stream order
+    """
+    runs = _content_stream_runs(page)
+    if runs is not None:
+        return runs
+
+    runs = []
+
+    def visit(text, cm, tm, font_dict, font_size):
+        text = text.strip()
+        if text:
+            runs.append(_position(tm, cm) + (text,))
+
+    page.extract_text(visitor_text=visit)
+    return runs
+
+
+def _content_stream_runs(page):
+    # text runs of the text showing operators, None when the page needs the full text extraction
+    from pypdf.generic import ContentStream
+
+    resources = page.get('/Resources')
+    fonts = resources.get_object().get('/Font') if resources is not None else None
+    for font in (fonts.get_object().values() if fonts is not None else ()):
+        font = font.get_object()
+        encoding = font.get('/Encoding')
+        if '/ToUnicode' in font or font.get('/Subtype') not in ('/Type1', '/TrueType'):
+            return None
+        if encoding not in SIMPLE_FONT_ENCODINGS and (encoding is not None or font.get('/Subtype') != '/Type1'):
+            return None
+    contents = page.get_contents()
+    if contents is None:
+        return []
+
+    runs = []
+    identity = (1, 0, 0, 1, 0, 0)
+    ctm, tm, lm, leading = identity, identity, identity, 0
+    states = []
+    for operands, operator in ContentStream(contents, page.pdf).operations:
+        if operator in (b'Tj', b'TJ', b"'", b'"'):
+            if operator in (b"'", b'"'):
+                # move to the next line before showing the text
+                lm = tm = _translate(lm, 0, -leading)
+            text = "".join(_decode_text(operands[-1] if operator == b'TJ' else [operands[-1]])).strip()
+            if text:
+                runs.append(_position(tm, ctm) + (text,))
+        elif operator == b'BT':
+            tm = lm = identity
+        elif operator == b'Tm':
+            tm = lm = tuple(float(value) for value in operands)
+        elif operator in (b'Td', b'TD'):
+            if operator == b'TD':
+                leading = -float(operands[1])
+            lm = tm = _translate(lm, float(operands[0]), float(operands[1]))
+        elif operator == b'T*':
+            lm = tm = _translate(lm, 0, -leading)
+        elif operator == b'TL':
+            leading = float(operands[0])
+        elif operator == b'cm':
+            ctm = _multiply(tuple(float(value) for value in operands), ctm)
+        elif operator == b'q':
+            states.append(ctm)
+        elif operator == b'Q' and states:
+            ctm = states.pop()
+        elif operator == b'Do':
+            # text inside form XObjects is only found by the full extraction
+            return None
+    return runs
+
+
+def _decode_text(strings):
+    # decode the strings of a text showing operator, large negative kerning separates words,
+    # the only strings of the operands are pypdf's TextStringObject
+    for value in strings:
+        if isinstance(value, str):
+            yield value.original_bytes.decode('cp1252', 'replace')
+        elif isinstance(value, bytes):
+            yield value.decode('cp1252', 'replace')
+        elif value < WORD_SPACING:
+            yield " "
+
+
+def _position(tm, ctm):
+    # page coordinates of the origin of the text matrix
+    return tm[4] * ctm[0] + tm[5] * ctm[2] + ctm[4], tm[4] * ctm[1] + tm[5] * ctm[3] + ctm[5]
+
+
+def _translate(matrix, tx, ty):
+    a, b, c, d, e, f = matrix
+    return a, b, c, d, tx * a + ty * c + e, tx * b + ty * d + f
+
+
+def _multiply(m, n):
+    return (
+        m[0] * n[0] + m[1] * n[2], m[0] * n[1] + m[1] * n[3],
+        m[2] * n[0] + m[3] * n[2], m[2] * n[1] + m[3] * n[3],
+        m[4] * n[0] + m[5] * n[2] + n[4], m[4] * n[1] + m[5] * n[3] + n[5],
+    )
+
+
+def layout_columns(runs):
+    """Find the column headings among the text runs of a page.
+
+    Params:
+        runs (list): (x, y, text) text runs of a page
+    Return:
+        (columns, heading_y) (tuple/None): x of each column in LAYOUT_HEADERS order and y of the headings,
+        None when the page has no headings
+    """
+    headings = {text: (x, y) for x, y, text in runs if text in LAYOUT_HEADERS}
+    if len(headings) != len(LAYOUT_HEADERS):
+        return None
+    columns = [headings[header][0] for header in LAYOUT_HEADERS]
+    return columns, min(y for x, y in headings.values())
+
+
+def layout_page_records(runs, columns, heading_y=None):
+    """Assign the text runs of a page to incident fields by their x coordinate.
+
+    A row starts at every date in the first column, the runs that follow it are added to the
+    column they are in. Rows without an incident number, like the report date on the last page, are dropped.
+
+    Params:
+    - runs (list): (x, y, text) text runs of a page
+    - columns (list): x of each column in LAYOUT_HEADERS order
+    - heading_y (float/None): y of the column headings, runs at or above it are skipped
+    Return:
+        page_incidents (list): extracted fields of each incident of the page
+    """
+    boundaries = [x - LAYOUT_TOLERANCE for x in columns[1:]]
+    rows = []
+    row = None
+    for x, y, text in runs:
+        if heading_y is not None and y >= heading_y:
+            # title and column headings
+            continue
+        column = bisect_right(boundaries, x)
+        if column == 0 and DATE_PATTERN.match(text):
+            row = [[] for _ in LAYOUT_FIELDS]
+            rows.append(row)
+        if row is not None:
+            row[column].append(text)
+    return [
+        {field: " ".join(" ".join(parts).split()) for field, parts in zip(LAYOUT_FIELDS, row)}
+        for row in rows if row[1]
+    ]
+
+
+def split_page_ranges(incident_data, workers, min_pages=MIN_PAGES_PER_TASK):
+    """Split a PDF Document into page ranges that can be parsed independently.
+
+    Params:
+    - incident_data (bytes/MappedPdf): PDF document data
+    - workers (int): number of parsing processes
+    - min_pages (int): smallest number of pages worth sending to a separate process
+    Return:
+        page_ranges (list): (start, stop) tuples covering every page in order
+    """
+    from pypdf import PdfReader
+
+    tot_pages = len(PdfReader(_pdf_stream(incident_data)).pages)
+    pages_per_task = max(min_pages, math.ceil(tot_pages / workers))
+    return [(start, min(start + pages_per_task, tot_pages)) for start in range(0, tot_pages, pages_per_task)] or [(0, 0)]
+
+
+def extract_all_incidents(all_incident_data, workers=1, extract_mode='text'):
+    """Extracts incidents from several PDF Documents, optionally across processes.
+
+    Documents are parsed in parallel, and large documents are further split into page ranges.
+    The incidents of each document are yielded in the same order as the serial path.
+
+    Params:
+    - all_incident_data (iterable): PDF document data of each document
+    - workers (int): number of parsing processes, 1 parses in the current process
+    - extract_mode (str): one of EXTRACT_MODES
+    Return:
+        generator of incidents (list), one list per document
+    """
+    if workers <= 1:
+        for incident_data in all_incident_data:
+            if incident_data is None:
+                # the PDF could not be downloaded
+                yield []
+                continue
+            # skip parsing when the same PDF content was parsed before
+            incidents = load_parsed_incidents(incident_data, extract_mode)
+            if incidents is None:
+                with metrics.timer('extract'):
+                    incidents = extract_incidents(incident_data, extract_mode)
+                store_parsed_incidents(incident_data, incidents, extract_mode)
+            yield incidents
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for incident_data in all_incident_data:
+            incidents = [] if incident_data is None else load_parsed_incidents(incident_data, extract_mode)
+            if incidents is not None:
+                # the same PDF content was parsed before
+                futures = [Future()]
+                futures[0].set_result(incidents)
+            else:
+                # submit every page range of the document as soon as its data is available
+                futures = [executor.submit(extract_page_range, incident_data, start, stop, extract_mode)
+                           for start, stop in split_page_ranges(incident_data, workers)]
+            pending.append((incident_data, incidents is not None, futures))
+            # hand over the documents that are already parsed, keeping the input order, and wait for the
+            # oldest one when too many are in flight, so that a directory of local PDFs is not mapped at once
+            while pending and (all(future.done() for future in pending[0][2]) or len(pending) > workers * 2):
+                yield _join_page_ranges(*pending.popleft(), extract_mode)
+        while pending:
+            yield _join_page_ranges(*pending.popleft(), extract_mode)
+
+
+def _join_page_ranges(incident_data, cached, futures, extract_mode='text'):
+    """Concatenate the incidents of the page ranges of one document in page order."""
+    incidents = []
+    for future in futures:
+        incidents.extend(future.result())
+    if not cached:
+        store_parsed_incidents(incident_data, incidents, extract_mode)
+    return incidents
+
+
+def extract_page_records(page, page_num, tot_pages):
+    """Extract the incidents of a page with the single-pass tokenizer.
 
     Params:
     - page (PageObject): specific page object
     - page_num (int): current page number
     - tot_pages (int): total number of pages in PDF document
     Return:
-         split_incidents (List[str]): Extracted incidents
+        page_incidents (list): extracted fields of each incident of the page
     """
-    if page_num == 0:
-        # extract the page text and remove header and column heading
-        page_text = page.extract_text()[57:-55]
-        # split the page text into individual incidents
-        split_incidents = split_all_incidents(page_text)
-    elif page_num == tot_pages - 1:
-        # extract the page text
+    # extract the page text
+    with metrics.timer('extract_text'):
         page_text = page.extract_text()
-        # split the page text into individual incidents
-        split_incidents = split_all_incidents(page_text, 'last')
-    else:
-        # extract the page text
-        page_text = page.extract_text()
-        # split the page text into individual incidents
-        split_incidents = split_all_incidents(page_text)
+    metrics.count('pages')
+
+    with metrics.timer('tokenize'):
+        page_incidents = tokenize_page(*_cut_page_text(page_text, page_num, tot_pages))
+    metrics.observe('records_per_page', len(page_incidents))
+    return page_incidents
 
-    # return incidents of a single page
-    return split_incidents
+
+def _cut_page_text(page_text, page_num, tot_pages):
+    # remove header and column heading from the first page, the last page footer is removed after splitting
+    if page_num == 0:
+        return page_text[57:-55], None
+    elif page_num == tot_pages - 1:
+        return page_text, 'last'
+    return page_text, None
 
 
 def split_all_incidents(page_text, page_type=None):
@@ -102,10 +695,8 @@ def split_all_incidents(page_text, page_type=None):
     Return:
          extracted_incident (list): Extract incidents
     """
-    # regex for recognizing date
-    pattern = r'(?=\d{1,2}/\d{1,2}/\d{4})'
     # split the page text into list of incidents using date regex
-    extracted_incidents = re.split(pattern, page_text.strip())
+    extracted_incidents = DATE_SPLIT_PATTERN.split(page_text.strip())
     if page_type == 'last':
         # remove the footer from last page
         extracted_incidents = extracted_incidents[:-1]
@@ -116,6 +707,24 @@ def split_all_incidents(page_text, page_type=None):
     return extracted_incidents
 
 
+def tokenize_page(page_text, page_type=None):
+    """Split a page into incidents and extract their fields in one pass.
+
+    Gives the same incidents as refactor_page_data(split_all_incidents(page_text, page_type)).
+
+    Params:
+    - page_text (str): page content
+    - page_type (str/None): type of page, could be 'last' or 'None'
+    Return:
+        page_incidents (list): extracted fields of each incident
+    """
+    records = DATE_SPLIT_PATTERN.split(page_text.strip())
+    if page_type == 'last':
+        # remove the footer from last page
+        records = records[:-1]
+    return [parse_record(record.split()) for record in records if record]
+
+
 def refactor_page_data(page_text):
     """Filter specific fields from the page content.
 
@@ -124,37 +733,37 @@ def refactor_page_data(page_text):
     Return:
         page_incidents (List): List of extracted fields of each incident
     """
-    page_incidents = []
-    for i in range(len(page_text)):
-        # split individual incidents into tokens to extract fixed fields
-        record = page_text[i].split()
-        rec_time = record[0] + " " + record[1]
-        rec_incident_num = record[2]
-        rec_incident_ori = record[-1]
-
-        if record[3: len(record)-1]:
-            # extract location and nature
-            location, nature = extract_location_and_nature(record[3: len(record)-1])
-        else:
-            location, nature = "", ""
-        # handle edge case when extra text incident number has an extra text
-        if len(rec_incident_num) > 13:
-            location = rec_incident_num[13:] + ' ' + location
-            rec_incident_num = rec_incident_num[:13]
-
-        # collect each incident record
-        page_incidents.append(
-            {
-                "incident_time": rec_time,
-                "incident_number": rec_incident_num,
-                "incident_location": location,
-                "incident_nature": nature,
-                "incident_ori": rec_incident_ori,
-            }
-        )
+    # split individual incidents into tokens to extract fixed fields
+    return [parse_record(record.split()) for record in page_text]
 
-    # return extracted fields of all the incidents of a specific page
-    return page_incidents
+
+def parse_record(record):
+    """Extract the fields of an incident from its tokens.
+
+    Params:
+        record (list): tokens of an incident
+    Return:
+        incident (dict): time, number, location, nature and ORI of the incident
+    """
+    rec_incident_num = record[2]
+
+    if len(record) > 4:
+        # extract location and nature
+        location, nature = _cached_location_and_nature(tuple(record[3:-1]))
+    else:
+        location, nature = "", ""
+    # handle edge case when extra text incident number has an extra text
+    if len(rec_incident_num) > 13:
+        location = rec_incident_num[13:] + ' ' + location
+        rec_incident_num = rec_incident_num[:13]
+
+    return {
+        "incident_time": record[0] + " " + record[1],
+        "incident_number": rec_incident_num,
+        "incident_location": location,
+        "incident_nature": nature,
+        "incident_ori": record[-1],
+    }
 
 
 def extract_location_and_nature(record):
@@ -165,32 +774,25 @@ def extract_location_and_nature(record):
     Return:
     - loc_str (str): Location of an incident
     - nature_str (str): Nature of an incident
-    Raise:
-        Exception while modifying location and nature for an edge case
     """
     location, nature = [], []
     for rec in record:
         # handle location and nature edge cases
-        if len(nature) == 0 and rec != "MVA" and rec != "COP" and rec != "EMS" and rec != "RAMPMVA" and (
-                rec.isdecimal() or rec.isupper() or rec == "/" or ';' in rec or rec == '1/2'):
+        special = SPECIAL_TOKENS.get(rec)
+        if special is not None:
+            location_part, nature_part = special
+            if location_part:
+                location.append(location_part)
+            nature.append(nature_part)
+        elif not nature and (rec.isdecimal() or rec.isupper() or rec == "/" or ';' in rec or rec == '1/2'):
+            # location includes numbers, upper case words, "/", coordinates and "1/2"
             location.append(rec)
-        elif rec == 'HWYMotorist' or rec == 'RAMPMotorist':
-            location.append(rec.split('Motorist')[0])
-            nature.append('Motorist')
-        elif rec == "RAMPMVA":
-            location.append('RAMP')
-            nature.append('MVA')
         else:
             nature.append(rec)
 
-    try:
-        if location:
-            # handle edge case when location ends with numeric
-            if location[-1].isnumeric() and len(location[-1]) != 1:
-                nature.insert(0, location[-1])
-                location.pop()
-    except Exception as ex:
-        print("ERROR in Location: ", ex)
+    # handle edge case when location ends with numeric
+    if location and location[-1].isnumeric() and len(location[-1]) != 1:
+        nature.insert(0, location.pop())
 
     # convert location and nature into string
     loc_str = " ".join(location)
@@ -199,104 +801,973 @@ def extract_location_and_nature(record):
     return loc_str, nature_str
 
 
-def augment_and_print_data(incidents):
+@lru_cache(maxsize=65536)
+def _cached_location_and_nature(tokens):
+    # the same address and nature are repeated on many incidents
+    return extract_location_and_nature(tokens)
+
+
+def augment_and_print_data(incidents, workers=1, ems_mode='index', writer=None, columns=None):
+    # Incident tables are augmented column by column
+    if isinstance(incidents, IncidentTable):
+        return augment_and_print_table(incidents, workers, ems_mode, writer, columns)
+
+    # Only compute the requested columns and what they depend on
+    columns, needed = select_columns(columns)
+
     # Pre-calculate location and incident ranks
-    location_ranks = calculate_location_ranks(incidents)
-    incident_ranks = calculate_incident_ranks(incidents)
+    location_ranks = calculate_location_ranks(incidents) if 'location_ranks' in needed else {}
+    incident_ranks = calculate_incident_ranks(incidents) if 'incident_ranks' in needed else {}
+
+    # Look up coordinates and weather of all incidents concurrently, the loop below then reads them from the results
+    coordinates = weather = None
+    if workers > 1 and 'coordinates' in needed:
+        coordinates = lookup_coordinates(incidents, workers)
+        if 'weather' in needed:
+            weather = prefetch_weather(incidents, coordinates, workers)
+        if 'side_of_town' in needed:
+            directions = find_directions(coordinates)
+
+    # Index the EMSSTAT records once instead of searching around every incident
+    ems_index = build_ems_index(incidents) if ems_mode == 'index' and 'ems_index' in needed else None
 
     # Augment each incident with additional data including EMSSTAT
-    for i, incident in enumerate(incidents):
-        augment_incident(incident, location_ranks, incident_ranks)
-        incident['ems_stat'] = check_ems_stat(incident, incidents, i)
-        lat, lon = get_lat_long(incident)
-        incident['side_of_town'] = find_direction(lat, lon)
-        incident['weather'] = find_weather(incident, lat, lon)
-        if i == 0:
-            print_headers()
-        print_augmented_data(incident)
+    with _output(writer, columns) as output:
+        for i, incident in enumerate(incidents):
+            augment_incident(incident, location_ranks, incident_ranks, needed)
+            if 'ems_stat' in needed:
+                incident['ems_stat'] = check_ems_stat(incident, incidents, i, ems_index)
+            if 'coordinates' in needed:
+                if coordinates:
+                    lat, lon = coordinates[i]
+                else:
+                    lat, lon = get_lat_long(incident)
+                if 'side_of_town' in needed:
+                    incident['side_of_town'] = directions[i] if coordinates else find_direction(lat, lon)
+                if 'weather' in needed:
+                    incident['weather'] = find_weather(incident, lat, lon, weather)
+            output.write_row(_output_row(incident, columns))
     return incidents
 
 
-def find_weather(incident, lat, lon):
+def select_columns(columns=None):
+    """Check the requested output columns and find everything they are computed from.
+
+    Params:
+        columns (iterable/None): names of writers.OUTPUT_COLUMNS, None selects all of them
+    Return:
+    - columns (tuple): requested columns in the requested order
+    - needed (set): requested columns and their COLUMN_DEPENDENCIES, followed transitively
+    """
+    columns = writers.OUTPUT_COLUMNS if columns is None else tuple(dict.fromkeys(columns))
+    unknown = [column for column in columns if column not in writers.OUTPUT_COLUMNS]
+    if unknown or not columns:
+        raise ValueError(f"unknown output columns {unknown}, expected some of {writers.OUTPUT_COLUMNS}")
+
+    needed = set()
+    pending = list(columns)
+    while pending:
+        name = pending.pop()
+        if name not in needed:
+            needed.add(name)
+            pending.extend(COLUMN_DEPENDENCIES[name])
+    return columns, needed
+
+
+def augment_and_print_table(table, workers=1, ems_mode='index', writer=None, columns=None):
+    """Augment and print the incidents of an IncidentTable column by column.
+
+    Params:
+    - table (IncidentTable): extracted incidents
+    - workers (int): number of concurrent geocode and weather lookups
+    - ems_mode (str): EMSSTAT detection, one of EMS_MODES
+    - writer (writer/None): output of the augmented rows, None prints them to stdout
+    - columns (iterable/None): output columns computed and printed, None for all of them
+    Return:
+        table (IncidentTable): the same table with the computed columns added
+    """
+    import vectorized
+
+    columns, needed = select_columns(columns)
+
+    # rank locations and natures and parse all incident times with array operations
+    if 'location_rank' in needed:
+        location_ranks, _ = vectorized.competition_ranks(table.column('incident_location'))
+        table.set_column('location_rank', vectorized.to_array('i', location_ranks))
+    if 'incident_rank' in needed:
+        incident_ranks, _ = vectorized.competition_ranks(table.column('incident_nature'))
+        table.set_column('incident_rank', vectorized.to_array('i', incident_ranks))
+    if 'day_of_week' in needed or 'time_of_day' in needed:
+        days_of_week, hours = vectorized.days_and_hours(table.column('incident_time'))
+        table.set_column('day_of_week', vectorized.to_array('b', days_of_week))
+        table.set_column('time_of_day', vectorized.to_array('b', hours))
+    if 'ems_stat' in needed:
+        table.set_column('ems_stat', array('b', calculate_ems_stats(table, ems_mode)))
+
+    # geocode each incident and look up its weather
+    if 'coordinates' in needed:
+        rows = list(table)
+        weather = None
+        if workers > 1:
+            coordinates = lookup_coordinates(rows, workers)
+            if 'weather' in needed:
+                weather = prefetch_weather(rows, coordinates, workers)
+        else:
+            coordinates = [get_lat_long(row) for row in rows]
+        if 'side_of_town' in needed:
+            table.set_column('side_of_town', find_directions(coordinates))
+        if 'weather' in needed:
+            table.set_column('weather', [find_weather(row, lat, lon, weather)
+                                         for row, (lat, lon) in zip(rows, coordinates)])
+
+    print_augmented_table(table, writer, columns)
+    return table
+
+
+def stream_incidents(urls, workers=4, parse_workers=1, extract_mode='text'):
+    """Download and extract the incidents of several URLs one document at a time.
+
+    Params:
+    - urls (list): URLs of PDF documents
+    - workers (int): number of concurrent downloads
+    - parse_workers (int): number of parsing processes
+    - extract_mode (str): one of EXTRACT_MODES
+    Return:
+        generator of incidents (dict), in document and page order
+    """
+    all_incident_data = (incident_data for url, incident_data in fetch_all_incidents(urls, workers))
+    for incidents in extract_all_incidents(all_incident_data, parse_workers, extract_mode):
+        yield from incidents
+
+
+def spill_incidents(incidents, spill_file):
+    """First pass of the streaming pipeline: write incidents to a spill file and count them.
+
+    Params:
+    - incidents (iterable): incidents to spill
+    - spill_file (file): text file receiving one JSON incident per line
+    Return:
+    - location_counts (Counter): number of incidents per location
+    - nature_counts (Counter): number of incidents per nature
+    - ems_index (set): (time, location) of every EMSSTAT incident
+    """
+    location_counts, nature_counts, ems_index = Counter(), Counter(), set()
+    for incident in incidents:
+        location_counts[incident['incident_location']] += 1
+        nature_counts[incident['incident_nature']] += 1
+        if incident['incident_ori'].upper() == 'EMSSTAT':
+            ems_index.add((incident['incident_time'], incident['incident_location']))
+        spill_file.write(json.dumps(incident) + "\n")
+    return location_counts, nature_counts, ems_index
+
+
+def read_spilled_incidents(spill_file):
+    """Read back the incidents written by spill_incidents, one at a time."""
+    spill_file.seek(0)
+    for line in spill_file:
+        yield json.loads(line)
+
+
+def augment_stream(incidents, location_ranks, incident_ranks, workers=1, ems_index=None, columns=None):
+    """Second pass of the streaming pipeline: augment incidents as they are read.
+
+    Only the EMSSTAT window and one chunk of STREAM_CHUNK_SIZE incidents are kept in memory.
+
+    Params:
+    - incidents (iterable): incidents in output order
+    - location_ranks (dict): rank of each location over all incidents
+    - incident_ranks (dict): rank of each nature over all incidents
+    - workers (int): number of concurrent geocode and weather lookups per chunk
+    - ems_index (set/None): (time, location) of every EMSSTAT incident, None searches the EMS_WINDOW instead
+    - columns (iterable/None): output columns computed, None for all of them
+    Return:
+        generator of augmented incidents (dict)
+    """
+    columns, needed = select_columns(columns)
+    if 'ems_stat' not in needed:
+        with_ems_stats = ((incident, None) for incident in incidents)
+    elif ems_index is not None:
+        with_ems_stats = ((incident, check_ems_stat(incident, None, None, ems_index)) for incident in incidents)
+    else:
+        with_ems_stats = _ems_windows(incidents, EMS_WINDOW)
+
+    chunk = []
+    for incident, ems_stat in with_ems_stats:
+        chunk.append((incident, ems_stat))
+        if len(chunk) >= (STREAM_CHUNK_SIZE if workers > 1 else 1):
+            yield from _augment_chunk(chunk, location_ranks, incident_ranks, workers, needed)
+            chunk = []
+    yield from _augment_chunk(chunk, location_ranks, incident_ranks, workers, needed)
+
+
+def _ems_windows(incidents, window):
+    """Yield (incident, ems_stat) pairs keeping only the window incidents before and after each one."""
+    buffer = deque()
+    current = 0
+    for incident in incidents:
+        buffer.append(incident)
+        # the incident at current has all its following window incidents
+        if len(buffer) - 1 - current >= window:
+            yield buffer[current], check_ems_stat(buffer[current], buffer, current)
+            current += 1
+            if current > window:
+                buffer.popleft()
+                current -= 1
+    while current < len(buffer):
+        yield buffer[current], check_ems_stat(buffer[current], buffer, current)
+        current += 1
+
+
+def _augment_chunk(chunk, location_ranks, incident_ranks, workers, needed):
+    """Augment a chunk of (incident, ems_stat) pairs with the needed columns."""
+    if 'coordinates' not in needed:
+        for incident, ems_stat in chunk:
+            augment_incident(incident, location_ranks, incident_ranks, needed)
+            if 'ems_stat' in needed:
+                incident['ems_stat'] = ems_stat
+            yield incident
+        return
+
+    incidents = [incident for incident, ems_stat in chunk]
+    weather = None
+    if workers > 1:
+        coordinates = lookup_coordinates(incidents, workers)
+        if 'weather' in needed:
+            weather = prefetch_weather(incidents, coordinates, workers)
+    else:
+        coordinates = [get_lat_long(incident) for incident in incidents]
+    directions = find_directions(coordinates) if 'side_of_town' in needed else [None] * len(coordinates)
+    for (incident, ems_stat), (lat, lon), direction in zip(chunk, coordinates, directions):
+        augment_incident(incident, location_ranks, incident_ranks, needed)
+        if 'ems_stat' in needed:
+            incident['ems_stat'] = ems_stat
+        if 'side_of_town' in needed:
+            incident['side_of_town'] = direction
+        if 'weather' in needed:
+            incident['weather'] = find_weather(incident, lat, lon, weather)
+        yield incident
+
+
+def stream_augment_and_print(urls, workers=4, parse_workers=1, augment_workers=1, spill_dir=None, ems_mode='index',
+                             extract_mode='text', writer=None, columns=None, store=None):
+    """Download, extract, augment and print incidents with memory bounded by one document.
+
+    The first pass spills the incidents to a temporary file while counting locations and natures,
+    the second pass reads them back and prints each row as soon as it is augmented.
+
+    Params:
+    - urls (list): URLs of PDF documents
+    - workers (int): number of concurrent downloads
+    - parse_workers (int): number of parsing processes
+    - augment_workers (int): number of concurrent geocode and weather lookups
+    - spill_dir (str/None): directory of the temporary spill file, None for the system default
+    - ems_mode (str): EMSSTAT detection, one of EMS_MODES
+    - extract_mode (str): one of EXTRACT_MODES
+    - writer (writer/None): output of the augmented rows, None prints them to stdout
+    - columns (iterable/None): output columns computed and printed, None for all of them
+    - store (IncidentStore/None): store also receiving the augmented incidents
+    Return:
+        count (int): number of printed incidents
+    """
+    import tempfile
+
+    with tempfile.TemporaryFile('w+', dir=spill_dir) as spill_file:
+        location_counts, nature_counts, ems_index = spill_incidents(
+            stream_incidents(urls, workers, parse_workers, extract_mode), spill_file
+        )
+        location_ranks = ranks_from_counts(location_counts)
+        incident_ranks = ranks_from_counts(nature_counts)
+        if ems_mode != 'index':
+            ems_index = None
+
+        count = _print_augmented_stream(augment_stream(read_spilled_incidents(spill_file), location_ranks,
+                                                       incident_ranks, augment_workers, ems_index, columns),
+                                        writer, columns, store)
+    return count
+
+
+def augment_and_print_incremental(incidents, state, workers=1, ems_mode='index', writer=None, columns=None,
+                                  store=None):
+    """Augment and print only the incidents not processed by earlier runs, ranked over all of them.
+
+    The new incidents are merged into the stored location and nature counts, the ranks are computed
+    from the merged counts and the state is committed once every new incident is printed.
+
+    Params:
+    - incidents (iterable): incidents of this run, those merged by earlier runs are skipped
+    - state (RankState): counts, EMSSTAT index and incident keys of earlier runs
+    - workers (int): number of concurrent geocode and weather lookups
+    - ems_mode (str): EMSSTAT detection, one of EMS_MODES
+    - writer (writer/None): output of the augmented rows, None prints them to stdout
+    - columns (iterable/None): output columns computed and printed, None for all of them
+    - store (IncidentStore/None): store also receiving the augmented incidents
+    Return:
+        count (int): number of printed incidents
+    """
+    new_incidents = state.merge(incidents)
+    location_ranks = ranks_from_counts(state.location_counts())
+    incident_ranks = ranks_from_counts(state.nature_counts())
+    # EMSSTAT records of earlier runs are matched in index mode, the window only covers this run
+    ems_index = state.ems_index() if ems_mode == 'index' else None
+
+    count = _print_augmented_stream(augment_stream(new_incidents, location_ranks, incident_ranks, workers, ems_index,
+                                                   columns), writer, columns, store)
+    state.commit()
+    return count
+
+
+def summary_url_template(url):
+    """Turn the URL of a daily summary into a template of the summaries of other days.
+
+    Params:
+        url (str): URL holding the YYYY-MM-DD date of its summary, and optionally a YYYY-MM upload folder
+    Return:
+    - template (str): the URL with '{date}' for the date and '{folder}' for the upload folder
+    - day (date): date of the summary of url
+    """
+    matches = list(SUMMARY_DATE_PATTERN.finditer(url))
+    if not matches:
+        raise ValueError(f"{url} has no YYYY-MM-DD date to derive the URLs of the next summaries from")
+    match = matches[-1]
+    day = datetime.strptime(match.group(), "%Y-%m-%d").date()
+    prefix = SUMMARY_FOLDER_PATTERN.sub('/{folder}/', url[:match.start()].replace('{', '{{').replace('}', '}}'))
+    return prefix + '{date}' + url[match.end():].replace('{', '{{').replace('}', '}}'), day
+
+
+def summary_urls(template, day):
+    """Return the candidate URLs of the summary of a day, a summary uploaded the next day may be in the next folder."""
+    folders = dict.fromkeys([day.strftime("%Y-%m"), (day + timedelta(days=1)).strftime("%Y-%m")])
+    return list(dict.fromkeys(template.format(date=day.isoformat(), folder=folder) for folder in folders))
+
+
+def poll_incidents(url, validators):
+    """Download a summary if it exists and changed since it was last polled.
+
+    Params:
+    - url (str): URL of the summary PDF, or path of a local one
+    - validators (dict): url -> (ETag, Last-Modified) of the last download, updated by a new download, read
+      from the PDF cache for URLs it does not hold
+    Return:
+        data (bytes/MappedPdf/None): Data of the PDF Document, None when it is missing or not modified
+    Raise:
+        requests.RequestException when the server cannot be reached or answers with an error
+    """
+    # a local archive is watched for the file of the next day, its modification time is the validator
+    path = local_pdfs.source_path(url)
+    if path is not None:
+        try:
+            modified = os.stat(path).st_mtime
+        except OSError:
+            return None
+        if validators.get(url) == (None, modified):
+            return None
+        validators[url] = (None, modified)
+        return load_local_pdf(path)
+
+    import http_client
+
+    # a summary downloaded by fetch_incidents is validated with the headers kept by the PDF cache
+    if url not in validators and pdf_cache_dir:
+        meta = pdf_cache.get(url)
+        if meta is not MISSING:
+            validators[url] = (meta['etag'], meta['last_modified'])
+    headers = {}
+    etag, last_modified = validators.get(url, (None, None))
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    resp = http_client.get(url, headers=headers, timeout=FETCH_TIMEOUT, default_headers=FETCH_HEADERS)
+    metrics.count('http.poll')
+    # an unpublished summary is a 404, or a page of the site rather than a PDF
+    if resp.status_code in (304, 404):
+        return None
+    resp.raise_for_status()
+    if not resp.content.startswith(b'%PDF'):
+        return None
+    validators[url] = (resp.headers.get('ETag'), resp.headers.get('Last-Modified'))
+    store_cached_pdf(url, resp)
+    return resp.content
+
+
+def watch_and_print(urls, state, interval=WATCH_INTERVAL, workers=4, parse_workers=1, augment_workers=1,
+                    ems_mode='index', extract_mode='text', writer=None, columns=None, store=None, polls=None):
+    """Augment and print the listed summaries, then poll for the summaries of the next days and print their incidents.
+
+    The URL of the next summary is built from the last listed URL. Every day goes through the incremental
+    pipeline on the same state, so only incidents not printed before are augmented, ranked over all of them,
+    with the lookup caches of this process kept warm. When the next summary is not there yet, the last
+    processed one is polled again for revisions before sleeping, both with conditional requests.
+
+    Params:
+    - urls (list): URLs of incident summary PDFs, the last one is the latest summary
+    - state (RankState): counts, EMSSTAT index and incident keys of the printed incidents
+    - interval (float): seconds between two polls
+    - workers (int): number of PDFs downloaded concurrently for the listed URLs
+    - parse_workers (int): number of processes parsing the listed PDFs
+    - augment_workers (int): number of concurrent geocode and weather lookups
+    - ems_mode (str): EMSSTAT detection, one of EMS_MODES
+    - extract_mode (str): text extraction, one of EXTRACT_MODES
+    - writer (writer/None): output of the augmented rows, flushed after every day, None prints them to stdout
+    - columns (iterable/None): output columns computed and printed, None for all of them
+    - store (IncidentStore/None): store also receiving the augmented incidents
+    - polls (int/None): number of polls before returning, None polls forever
+    Return:
+        count (int): number of printed incidents
+    """
+    import requests
+
+    if not urls:
+        raise ValueError("watch mode needs at least one daily summary URL to find the URLs of the next days from")
+    template, day = summary_url_template(urls[-1])
+    latest = [urls[-1]]
+    validators = {}
+
+    def print_new(url, incident_data):
+        # augment and print the incidents of a summary that were not printed before, None when that failed
+        try:
+            incidents = next(extract_all_incidents([incident_data], parse_workers, extract_mode))
+            count = augment_and_print_incremental(incidents, state, augment_workers, ems_mode, writer, columns,
+                                                  store)
+        except Exception as ex:
+            # a truncated or malformed summary must not stop the daemon, it is downloaded and parsed again at the
+            # next poll, without validators so that the server cannot answer 304
+            state.rollback()
+            validators[url] = (None, None)
+            metrics.count('watch.errors')
+            print("ERROR in processing incidents: ", url, ex, file=sys.stderr)
+            return None
+        if writer is not None:
+            writer.flush(file=True)
+        return count
+
+    count = augment_and_print_incremental(stream_incidents(urls, workers, parse_workers, extract_mode), state,
+                                          augment_workers, ems_mode, writer, columns, store)
+    if writer is not None:
+        writer.flush(file=True)
+
+    done = 0
+    while polls is None or done < polls:
+        done += 1
+        next_day = day + timedelta(days=1)
+        try:
+            incident_data = None
+            for url in summary_urls(template, next_day):
+                incident_data = poll_incidents(url, validators)
+                if incident_data is not None:
+                    latest = [url]
+                    break
+            if incident_data is not None:
+                printed = print_new(url, incident_data)
+                if printed is not None:
+                    metrics.count('watch.days')
+                    count += printed
+                    day = next_day
+                    # the summary of the following day may be out already
+                    continue
+            elif next_day < datetime.now().date() - timedelta(days=WATCH_GRACE_DAYS):
+                # never published, keep going with the following days
+                metrics.count('watch.skipped_days')
+                day = next_day
+                continue
+            else:
+                # summaries are sometimes republished with more incidents
+                for url in latest:
+                    incident_data = poll_incidents(url, validators)
+                    if incident_data is not None:
+                        count += print_new(url, incident_data) or 0
+        except requests.RequestException as ex:
+            metrics.count('watch.errors')
+            print("ERROR in polling incidents: ", ex, file=sys.stderr)
+        time.sleep(interval)
+    return count
+
+
+def sharded_augment_and_print(urls, shards, shard_dir=None, workers=4, parse_workers=1, augment_workers=1,
+                              extract_mode='text', writer=None, columns=None, store=None):
+    """Download, extract and augment the URLs in shard processes, ranking over all of them.
+
+    Each shard takes a contiguous slice of the URLs. Every shard first spills its incidents and writes its
+    partial location and nature counts and EMSSTAT index, the counts of all shards are merged into global ranks,
+    then every shard augments its incidents with those ranks. The shards are printed in URL order, so the rows
+    are identical to augment_and_print_data in 'index' EMSSTAT mode.
+
+    Params:
+    - urls (list): URLs of PDF documents
+    - shards (int): number of shard processes
+    - shard_dir (str/None): directory of the shard files, None for a temporary directory
+    - workers (int): number of concurrent downloads per shard
+    - parse_workers (int): number of parsing processes per shard
+    - augment_workers (int): number of concurrent geocode and weather lookups per shard
+    - extract_mode (str): one of EXTRACT_MODES
+    - writer (writer/None): output of the augmented rows, None prints them to stdout
+    - columns (iterable/None): output columns computed and printed, None for all of them
+    - store (IncidentStore/None): store also receiving the augmented incidents
+    Return:
+        count (int): number of printed incidents
+    """
+    import multiprocessing
+    import tempfile
+    from concurrent.futures import ProcessPoolExecutor
+
+    # fork where the platform has it, the initializer sets up everything a spawned worker does not inherit
+    context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+    with tempfile.TemporaryDirectory(dir=shard_dir) as tmp_dir:
+        # each worker opens its own caches and connections and takes its share of the API rate limits
+        with ProcessPoolExecutor(max_workers=shards, mp_context=context, initializer=configure_shard_worker,
+                                 initargs=(pdf_cache_dir, shards, geocoder_paths, town_center, town_sectors,
+                                           (GEOCODE_URL, WEATHER_URL))) as executor:
+            with metrics.timer('shard_count'):
+                list(executor.map(count_shard, [urls] * shards, range(shards), [shards] * shards,
+                                  [tmp_dir] * shards, [workers] * shards, [parse_workers] * shards,
+                                  [extract_mode] * shards))
+            merge_shard_counts(tmp_dir, shards)
+            with metrics.timer('shard_augment'):
+                list(executor.map(augment_shard, range(shards), [tmp_dir] * shards, [augment_workers] * shards,
+                                  [columns] * shards))
+        return collect_shards(tmp_dir, shards, writer, columns, store)
+
+
+def shard_urls(urls, index, shards):
+    """Return the contiguous slice of urls taken by shard index out of shards."""
+    return urls[len(urls) * index // shards:len(urls) * (index + 1) // shards]
+
+
+def configure_shard_worker(cache_dir, shards, paths=None, center=None, sectors=None, api_urls=None):
+    """Configure a shard process like the process that started it, with its share of the API rate limits.
+
+    A forked process would otherwise read from the keep-alive connections of its parent, and a spawned one
+    would start without the offline geocoder, the town and the API endpoints.
+
+    Params:
+    - cache_dir (str/None): cache directory, see configure_cache
+    - shards (int): number of shards running at the same time
+    - paths (list/None): files of the offline geocoder, see configure_geocoder
+    - center (tuple/None): (lat, lon) of the town center, None for TOWN_CENTER
+    - sectors (dict/None): side of town label -> polygon, None for the compass directions
+    - api_urls (tuple/None): GEOCODE_URL and WEATHER_URL, None keeps those of the module
+    """
+    global town_center, town_sectors, GEOCODE_URL, WEATHER_URL
+    import http_client
+
+    http_client.reset()
+    configure_cache(cache_dir)
+    configure_geocoder(paths)
+    town_center = tuple(center) if center else TOWN_CENTER
+    town_sectors = sectors
+    if api_urls:
+        GEOCODE_URL, WEATHER_URL = api_urls
+    configure_rate_limits(shards)
+
+
+def count_shard(urls, index, shards, shard_dir, workers=4, parse_workers=1, extract_mode='text'):
+    """First phase of a shard: spill the incidents of its URLs and write their partial counts.
+
+    Params:
+    - urls (list): URLs of every shard
+    - index (int): index of this shard
+    - shards (int): number of shards
+    - shard_dir (str): directory shared by the shards
+    - workers (int): number of concurrent downloads
+    - parse_workers (int): number of parsing processes
+    - extract_mode (str): one of EXTRACT_MODES
+    Return:
+        count (int): number of incidents of the shard
+    """
+    incidents_path = os.path.join(shard_dir, SHARD_INCIDENTS_FILE.format(index))
+    with open(f"{incidents_path}.tmp", 'w') as spill_file:
+        location_counts, nature_counts, ems_index = spill_incidents(
+            stream_incidents(shard_urls(urls, index, shards), workers, parse_workers, extract_mode), spill_file
+        )
+    os.replace(f"{incidents_path}.tmp", incidents_path)
+    counts = {'locations': location_counts, 'natures': nature_counts, 'ems_index': sorted(ems_index)}
+    _write_atomic(os.path.join(shard_dir, SHARD_COUNTS_FILE.format(index)), json.dumps(counts).encode())
+    return sum(location_counts.values())
+
+
+def merge_shard_counts(shard_dir, shards):
+    """Merge the partial counts of every shard into the global ranks that all shards augment with.
+
+    Params:
+    - shard_dir (str): directory shared by the shards
+    - shards (int): number of shards
+    Return:
+    - location_ranks (dict): rank of each location over all shards
+    - incident_ranks (dict): rank of each nature over all shards
+    - ems_index (set): (time, location) of every EMSSTAT incident of all shards
+    """
+    location_counts, nature_counts, ems_index = Counter(), Counter(), set()
+    for index in range(shards):
+        with open(os.path.join(shard_dir, SHARD_COUNTS_FILE.format(index))) as file:
+            counts = json.load(file)
+        location_counts.update(counts['locations'])
+        nature_counts.update(counts['natures'])
+        ems_index.update(tuple(key) for key in counts['ems_index'])
+    location_ranks = ranks_from_counts(location_counts)
+    incident_ranks = ranks_from_counts(nature_counts)
+    ranks = {'location_ranks': location_ranks, 'incident_ranks': incident_ranks, 'ems_index': sorted(ems_index)}
+    _write_atomic(os.path.join(shard_dir, SHARD_RANKS_FILE), json.dumps(ranks).encode())
+    return location_ranks, incident_ranks, ems_index
+
+
+def augment_shard(index, shard_dir, augment_workers=1, columns=None):
+    """Second phase of a shard: augment its spilled incidents with the merged ranks.
+
+    Params:
+    - index (int): index of this shard
+    - shard_dir (str): directory shared by the shards, holding the ranks of merge_shard_counts
+    - augment_workers (int): number of concurrent geocode and weather lookups
+    - columns (iterable/None): output columns computed, None for all of them
+    Return:
+        count (int): number of augmented incidents
+    """
+    with open(os.path.join(shard_dir, SHARD_RANKS_FILE)) as file:
+        ranks = json.load(file)
+    ems_index = {tuple(key) for key in ranks['ems_index']}
+
+    count = 0
+    augmented_path = os.path.join(shard_dir, SHARD_AUGMENTED_FILE.format(index))
+    with open(os.path.join(shard_dir, SHARD_INCIDENTS_FILE.format(index))) as spill_file, \
+            open(f"{augmented_path}.tmp", 'w') as augmented_file:
+        for incident in augment_stream(read_spilled_incidents(spill_file), ranks['location_ranks'],
+                                       ranks['incident_ranks'], augment_workers, ems_index, columns):
+            augmented_file.write(json.dumps(incident) + "\n")
+            count += 1
+    os.replace(f"{augmented_path}.tmp", augmented_path)
+    return count
+
+
+def collect_shards(shard_dir, shards, writer=None, columns=None, store=None):
+    """Print the augmented incidents of every shard, in shard order.
+
+    Params:
+    - shard_dir (str): directory shared by the shards
+    - shards (int): number of shards
+    - writer (writer/None): output of the augmented rows, None prints them to stdout
+    - columns (iterable/None): output columns printed, None for all of them
+    - store (IncidentStore/None): store also receiving the augmented incidents
+    Return:
+        count (int): number of printed incidents
+    """
+    def augmented_incidents():
+        for index in range(shards):
+            with open(os.path.join(shard_dir, SHARD_AUGMENTED_FILE.format(index))) as file:
+                for line in file:
+                    yield json.loads(line)
+
+    return _print_augmented_stream(augmented_incidents(), writer, columns, store)
+
+
+def _print_augmented_stream(augmented_incidents, writer=None, columns=None, store=None):
+    """Write augmented incidents as they come, the writer adds the headers before the first one."""
+    columns, _ = select_columns(columns)
+    if store is not None:
+        augmented_incidents = store.tee(augmented_incidents)
+    count = 0
+    with _output(writer, columns) as output:
+        for incident in augmented_incidents:
+            output.write_row(_output_row(incident, columns))
+            count += 1
+    return count
+
+
+@contextmanager
+def _output(writer, columns=writers.OUTPUT_COLUMNS):
+    """Use the given writer, or print columns to stdout for the duration of the block when it is None."""
+    if writer is not None:
+        yield writer
+        return
+    writer = writers.open_writer(columns=columns)
+    try:
+        yield writer
+    finally:
+        writer.close()
+
+
+def _output_row(incident, columns=writers.OUTPUT_COLUMNS):
+    # augmented fields of an incident in the order of print_headers, or of the selected columns
+    return tuple(incident.get(column) for column in columns)
+
+
+def lookup_coordinates(incidents, workers=1):
+    """Geocode the locations of all incidents concurrently.
+
+    Incidents sharing a normalized address are coalesced into a single lookup.
+
+    Params:
+    - incidents (list): incidents with their incident_location
+    - workers (int): number of concurrent lookups
+    Return:
+        coordinates (list): (lat, lon) tuple of each incident, in the same order as incidents
+    """
+    first_incidents = {}
+    for incident in incidents:
+        first_incidents.setdefault(normalize_address(incident['incident_location']), incident)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        resolved = dict(zip(first_incidents, executor.map(get_lat_long, first_incidents.values())))
+
+    return [resolved[normalize_address(incident['incident_location'])] for incident in incidents]
+
+
+def prefetch_weather(incidents, coordinates, workers=1):
+    """Fetch the hourly weather of every grid cell and day of the incidents concurrently.
+
+    Params:
+    - incidents (list): incidents with their incident_time
+    - coordinates (list): (lat, lon) tuple of each incident
+    - workers (int): number of concurrent requests
+    Return:
+        weather (dict): (cell_lat, cell_lon, date) mapped to its hourly weather, passed to find_weather since
+            the cache may already have evicted the first groups of a large batch
+    """
+    groups = group_by_weather(incidents, coordinates)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(groups, executor.map(lambda group: fetch_hourly_weather(*group), groups)))
+
+
+def _rate_limit(api):
+    """Block until another request to api fits in its share of the API_RATE_LIMITS budget."""
+    with _rate_lock:
+        now = time.monotonic()
+        slot = max(now, _next_request_time.get(api, now))
+        _next_request_time[api] = slot + rate_limit_shares / API_RATE_LIMITS[api]
+    if slot > now:
+        with metrics.timer('rate_limit_wait'):
+            time.sleep(slot - now)
+
+
+def find_weather(incident, lat, lon, prefetched=None):
     # If latitude or longitude is None, return "Unknown" for the weather
     if lat is None or lon is None:
         return "Unknown"
 
-    url = "https://archive-api.open-meteo.com/v1/archive"
-
     date_time = datetime.strptime(incident['incident_time'], "%m/%d/%Y %H:%M")
-    date = date_time.date()
     hour = date_time.hour
 
+    # every incident of the same grid cell and day is answered from one prefetched or cached request
+    group = weather_group(incident, lat, lon)
+    hourly = prefetched[group] if prefetched and group in prefetched else fetch_hourly_weather(*group)
+    try :
+        weather_code = hourly[hour]
+    except Exception as e:
+        weather_code = "Unknown"
+    return weather_code
+
+
+def weather_group(incident, lat, lon):
+    """Find the grid cell and day whose hourly weather answers an incident.
+
+    Params:
+    - incident (dict): incident with its incident_time
+    - lat (float): latitude of the incident location
+    - lon (float): longitude of the incident location
+    Return:
+        (cell_lat, cell_lon, date) (tuple): center of the WEATHER_GRID cell and date of the incident
+    """
+    date = datetime.strptime(incident['incident_time'], "%m/%d/%Y %H:%M").date()
+    cell_lat = round(round(lat / WEATHER_GRID) * WEATHER_GRID, 4)
+    cell_lon = round(round(lon / WEATHER_GRID) * WEATHER_GRID, 4)
+    return cell_lat, cell_lon, date
+
+
+def group_by_weather(incidents, coordinates):
+    """Group incidents that share a weather lookup.
+
+    Params:
+    - incidents (list): incidents with their incident_time
+    - coordinates (list): (lat, lon) tuple of each incident
+    Return:
+        groups (dict): (cell_lat, cell_lon, date) mapped to the indexes of its incidents
+    """
+    groups = {}
+    for i, (incident, (lat, lon)) in enumerate(zip(incidents, coordinates)):
+        if lat is None or lon is None:
+            continue
+        groups.setdefault(weather_group(incident, lat, lon), []).append(i)
+    return groups
+
+
+def fetch_hourly_weather(cell_lat, cell_lon, date):
+    """Fetch the hourly weather codes of a grid cell for a whole day.
+
+    Params:
+    - cell_lat (float): latitude of the grid cell center
+    - cell_lon (float): longitude of the grid cell center
+    - date (date): day of the weather
+    Return:
+        hourly (list/None): 24 weather codes, None if the API did not return them
+    """
+    key = f"{cell_lat},{cell_lon},{date}"
+    cached = weather_cache.get(key)
+    if cached is not MISSING:
+        metrics.count('cache.weather.hit')
+        return cached
+    metrics.count('cache.weather.miss')
+    import requests
+    import http_client
+
+    url = WEATHER_URL
+
     params = {
-        "latitude": lat,
-        "longitude": lon,
+        "latitude": cell_lat,
+        "longitude": cell_lon,
         "start_date": date,
         "end_date": date,
         "hourly": "weather_code"
     }
 
-    resp = requests.get(url, params=params)
-    resp = resp.json()
-    try :
-        weather_code = resp['hourly']['weather_code'][hour]
+    _rate_limit('weather')
+    try:
+        with metrics.timer('weather'):
+            resp = http_client.get(url, params=params, timeout=LOOKUP_TIMEOUT)
+        metrics.count('http.weather')
+        resp = resp.json()
+    except (requests.RequestException, ValueError):
+        # the API could not be reached, the day is asked again by the next lookup
+        metrics.count('http.weather.errors')
+        return None
+    try:
+        hourly = resp['hourly']['weather_code']
     except Exception as e:
-        weather_code = "Unknown"
-    return weather_code
+        hourly = None
+    weather_cache.put(key, hourly)
+    return hourly
 
 
 def get_lat_long(incident):
 
     # Google Maps Geocoding API endpoint
-    url = "https://maps.googleapis.com/maps/api/geocode/json"
+    url = GEOCODE_URL
 
     loc = incident.get('incident_location')
 
-    if loc in lat_long_dict:
-        return lat_long_dict[loc]
+    # Check if the location is already in coordinate format
+    pattern = r'^-?\d{1,2}(?:\.\d+)?;?-?\d{1,3}(?:\.\d+)?$'
+    if bool(re.match(pattern, loc)):
+        lat, lon = loc.split(";")
+        return float(lat), float(lon)
+
+    # Place the address with the local address and street files before asking the API
+    address = normalize_address(loc)
+    if offline_geocoder is not None:
+        coordinates = offline_geocoder.geocode(address)
+        if coordinates is not None:
+            metrics.count('geocode.offline.hit')
+            return coordinates
+        metrics.count('geocode.offline.miss')
+
+    # Look the address up in the geocode cache, None marks an address the API could not resolve
+    cached = geocode_cache.get(address)
+    if cached is not MISSING:
+        metrics.count('cache.geocode.hit')
+        return tuple(cached) if cached is not None else (None, None)
+    metrics.count('cache.geocode.miss')
+    import requests
+    import http_client
+
+    # Prepare the parameters for the API request
+    params = {
+        "address": address,
+        "key": ""
+    }
 
-    else:
-        # Check if the location is already in coordinate format
-        pattern = r'^-?\d{1,2}(?:\.\d+)?;?-?\d{1,3}(?:\.\d+)?$'
-        if bool(re.match(pattern, loc)):
-            lat, lon = loc.split(";")
-            lat_long_dict[loc] = (float(lat), float(lon))
-            return float(lat), float(lon)
-
-        # Prepare the parameters for the API request
-        params = {
-            "address": loc,
-            "key": ""
-        }
-
-        headers = CaseInsensitiveDict()
-        headers["Accept"] = "application/json"
-
-        # Make the request to the Google Maps API
-        resp = requests.get(url, headers=headers, params=params)
+    headers = {"Accept": "application/json"}
+
+    # Make the request to the Google Maps API
+    _rate_limit('geocode')
+    try:
+        with metrics.timer('geocode'):
+            resp = http_client.get(url, headers=headers, params=params, timeout=LOOKUP_TIMEOUT)
+        metrics.count('http.geocode')
         resp = resp.json()
+    except (requests.RequestException, ValueError):
+        # the API could not be reached, the address is asked again by the next lookup
+        metrics.count('http.geocode.errors')
+        return None, None
+
+    try:
+        # Extract the latitude and longitude from the API response
+        results = resp['results'][0]['geometry']['location']
+        lat, lon = results['lat'], results['lng']
+    except (IndexError, KeyError, Exception) as e:
+        lat, lon = None, None
+    geocode_cache.put(address, (lat, lon) if lat is not None and lon is not None else None)
+    return lat, lon
+
+
+def normalize_address(loc):
+    """Normalize an incident location so spelling variants share one geocode cache entry.
+
+    Params:
+        loc (str): incident location
+    Return:
+        address (str): upper-cased location with single spaces and " / " between intersecting streets
+    """
+    address = " ".join(loc.upper().split())
+    return re.sub(r'\s*/\s*', ' / ', address)
 
-        try:
-            # Extract the latitude and longitude from the API response
-            results = resp['results'][0]['geometry']['location']
-            lat, lon = results['lat'], results['lng']
-        except (IndexError, KeyError, Exception) as e:
-            lat, lon = None, None
-        lat_long_dict[loc] = (lat, lon)
-        return lat, lon
 
+def configure_geocoder(paths):
+    """Geocode addresses with local address point and street centerline files before using the API.
 
-def find_direction(lat, lon):
+    Params:
+        paths (list/None): CSV files loaded into an OfflineGeocoder, None or an empty list disables it
+    """
+    global offline_geocoder, geocoder_paths
+    geocoder = None
+    if paths:
+        from offline_geocoder import OfflineGeocoder
+
+        geocoder = OfflineGeocoder(normalize_address)
+        for path in paths:
+            geocoder.load(path)
+    offline_geocoder = geocoder
+    geocoder_paths = list(paths or [])
+
+
+def configure_rate_limits(shares=1):
+    """Take an equal share of API_RATE_LIMITS, when shares processes send lookups at the same time."""
+    global rate_limit_shares
+    rate_limit_shares = shares
+
+
+def configure_cache(cache_dir):
+    """Persist the lookup caches in a SQLite database inside cache_dir, and cache PDFs and parsed incidents there.
+
+    Params:
+        cache_dir (str/None): directory of the caches, None keeps the lookup caches in memory only and disables
+            the PDF cache
+    """
+    global geocode_cache, weather_cache, pdf_cache, pdf_cache_dir
+    path = None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        path = os.path.join(cache_dir, CACHE_DB_NAME)
+    geocode_cache.close()
+    weather_cache.close()
+    pdf_cache.close()
+    pdf_cache_dir = cache_dir or None
+    pdf_cache = SqliteCache(path, 'pdf', lru_size=PDF_LRU_SIZE)
+    geocode_cache = SqliteCache(path, 'geocode', GEOCODE_TTL, GEOCODE_NEGATIVE_TTL, GEOCODE_LRU_SIZE)
+    weather_cache = SqliteCache(path, 'weather', None, WEATHER_NEGATIVE_TTL, WEATHER_LRU_SIZE)
+
+
+def find_direction(lat, lon, center=None, sectors=None):
     # If latitude or longitude is None, return "Unknown" for the direction
     if lat is None or lon is None:
         return "Unknown"
 
-    # Coordinates for the center of the town
-    center_latitude = 35.220833
-    center_longitude = -97.443611
+    # Sides of town drawn as polygons replace the compass sectors
+    sectors = town_sectors if sectors is None else sectors
+    if sectors:
+        for label, polygon in sectors.items():
+            if _in_polygon(lat, lon, polygon):
+                return label
+        return "Unknown"
 
-    # Convert all latitudes and longitudes from degrees to radians
-    center_lat_rad, center_lon_rad = map(math.radians, [center_latitude, center_longitude])
+    # Center of the town in radians, computed once per center
+    center_lat_rad, center_lon_rad, sin_center_lat, cos_center_lat = _center_radians(center or town_center)
     target_lat_rad, target_lon_rad = map(math.radians, [lat, lon])
 
     # Calculate the differences in coordinates
@@ -305,60 +1776,121 @@ def find_direction(lat, lon):
 
     # Calculate the angle/bearing from the center of the town to the target location
     x = math.sin(delta_lon) * math.cos(target_lat_rad)
-    y = math.cos(center_lat_rad) * math.sin(target_lat_rad) - (
-            math.sin(center_lat_rad) * math.cos(target_lat_rad) * math.cos(delta_lon))
+    y = cos_center_lat * math.sin(target_lat_rad) - (
+            sin_center_lat * math.cos(target_lat_rad) * math.cos(delta_lon))
     bearing = (math.degrees(math.atan2(x, y)) + 360) % 360
 
-    # Define the eight cardinal and intercardinal directions
-    directions = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
-
     # Determine the direction based on the bearing
     direction_idx = int((bearing + 22.5) // 45) % 8
-    return directions[direction_idx]
+    return DIRECTIONS[direction_idx]
+
+
+def find_directions(coordinates, center=None, sectors=None):
+    """Find the side of town of many coordinates in one vectorized pass.
+
+    Gives the same result as find_direction for every coordinate. Bearings within DIRECTION_TOLERANCE
+    degrees of a sector boundary are classified with find_direction, since numpy's trigonometry may
+    round differently from math.
+
+    Params:
+    - coordinates (list): (lat, lon) tuple of each incident, either may be None
+    - center (tuple/None): (lat, lon) of the town center, None for town_center
+    - sectors (dict/None): side of town label -> (lat, lon) polygon, None for town_sectors
+    Return:
+        directions (list): side of town of each coordinate
+    """
+    import vectorized
+
+    sectors = town_sectors if sectors is None else sectors
+    lats, lons, known = vectorized.coordinates_array(coordinates)
+    if sectors:
+        labels = list(sectors) + ["Unknown"]
+        indexes = vectorized.sector_indexes(lats, lons, [list(polygon) for polygon in sectors.values()])
+        return [labels[index] if is_known else "Unknown" for index, is_known in zip(indexes.tolist(), known.tolist())]
+
+    center = center or town_center
+    bearings = vectorized.bearings(lats, lons, *_center_radians(center))
+    directions = [DIRECTIONS[index] if is_known else "Unknown"
+                  for index, is_known in zip(vectorized.octants(bearings).tolist(), known.tolist())]
+    for i in vectorized.near_octant_boundary(bearings, DIRECTION_TOLERANCE):
+        directions[i] = find_direction(*coordinates[i], center, sectors=())
+    return directions
+
+
+@lru_cache(maxsize=16)
+def _center_radians(center):
+    # latitude and longitude of the center in radians, and the sine and cosine of its latitude
+    center_lat_rad, center_lon_rad = map(math.radians, center)
+    return center_lat_rad, center_lon_rad, math.sin(center_lat_rad), math.cos(center_lat_rad)
+
+
+def _in_polygon(lat, lon, polygon):
+    # even-odd rule, with the same arithmetic as vectorized.points_in_polygon
+    inside = False
+    polygon = list(polygon)
+    for (lat_i, lon_i), (lat_j, lon_j) in zip(polygon, polygon[-1:] + polygon[:-1]):
+        if (lat_i > lat) != (lat_j > lat) and lon < (lon_j - lon_i) * (lat - lat_i) / (lat_j - lat_i) + lon_i:
+            inside = not inside
+    return inside
+
+
+def configure_town(center=None, sectors_path=None):
+    """Set the town center and the side of town polygons used by find_direction and find_directions.
+
+    Params:
+    - center (tuple/None): (lat, lon) of the town center, None for TOWN_CENTER
+    - sectors_path (str/None): JSON file mapping each side of town label to a list of [lat, lon] vertices,
+        None uses the compass directions around the center
+    """
+    global town_center, town_sectors
+    sectors = None
+    if sectors_path:
+        with open(sectors_path, 'r') as file:
+            sectors = {label: [tuple(vertex) for vertex in polygon] for label, polygon in json.load(file).items()}
+    town_center = tuple(center) if center else TOWN_CENTER
+    town_sectors = sectors
 
 
 def calculate_location_ranks(incidents):
     # Calculate and return location ranks
-    locations = [incident['incident_location'] for incident in incidents]
+    locations = _column(incidents, 'incident_location')
     location_counts = Counter(locations)
-    ranked_locations = sorted(location_counts.items(), key=lambda x: (-x[1], x[0]))
-
-    location_ranks = {}
-    current_rank = 0
-    last_count = None
-    for i, (location, count) in enumerate(ranked_locations, start=1):
-        if count != last_count:
-            current_rank = i
-        location_ranks[location] = current_rank
-        last_count = count
-
-    return location_ranks
+    return ranks_from_counts(location_counts)
 
 
 def calculate_incident_ranks(incidents):
     # Calculate and return incident ranks based on incident nature
-    natures = [incident['incident_nature'] for incident in incidents]
+    natures = _column(incidents, 'incident_nature')
     nature_counts = Counter(natures)
-    ranked_natures = sorted(nature_counts.items(), key=lambda x: (-x[1], x[0]))
+    return ranks_from_counts(nature_counts)
 
-    incident_ranks = {}
+
+def ranks_from_counts(counts):
+    # Rank values by descending count, tied values share the rank of the first of them
+    ranked_values = sorted(counts.items(), key=lambda x: (-x[1], x[0]))
+
+    ranks = {}
     current_rank = 0
     last_count = None
-    for i, (nature, count) in enumerate(ranked_natures, start=1):
+    for i, (value, count) in enumerate(ranked_values, start=1):
         if count != last_count:
             current_rank = i
-        incident_ranks[nature] = current_rank
+        ranks[value] = current_rank
         last_count = count
 
-    return incident_ranks
+    return ranks
 
 
-def check_ems_stat(current_incident, all_incidents, current_index):
+def check_ems_stat(current_incident, all_incidents, current_index, ems_index=None):
     # Check current incident's ORI
     if current_incident['incident_ori'].upper() == 'EMSSTAT':
         return 1
 
-    window = 3
+    # With an index of EMSSTAT records, any record sharing the time and location matches
+    if ems_index is not None:
+        return int((current_incident['incident_time'], current_incident['incident_location']) in ems_index)
+
+    window = EMS_WINDOW
     start_index = max(0, current_index - window)
     end_index = min(len(all_incidents), current_index + window + 1)
 
@@ -373,35 +1905,73 @@ def check_ems_stat(current_incident, all_incidents, current_index):
     return 0
 
 
-def augment_incident(incident, location_ranks, incident_ranks):
-    # Augmenting the incident with location rank, incident rank, etc.
-    incident_datetime_str = incident.get("incident_time", "1/1/1900 00:00")
+def build_ems_index(incidents):
+    # Collect the (time, location) of every EMSSTAT record in one pass
+    times = _column(incidents, 'incident_time')
+    locations = _column(incidents, 'incident_location')
+    oris = _column(incidents, 'incident_ori')
+    return {(incident_time, location) for incident_time, location, ori in zip(times, locations, oris)
+            if ori.upper() == 'EMSSTAT'}
+
+
+def calculate_ems_stats(incidents, ems_mode='index'):
+    # Calculate the EMSSTAT of every incident, see EMS_MODES
+    times = _column(incidents, 'incident_time')
+    locations = _column(incidents, 'incident_location')
+    # upper-case each ORI only once
+    is_ems = [ori.upper() == 'EMSSTAT' for ori in _column(incidents, 'incident_ori')]
+
+    if ems_mode == 'index':
+        ems_index = build_ems_index(incidents)
+        return [int(is_ems[i] or (times[i], locations[i]) in ems_index) for i in range(len(is_ems))]
+
+    ems_stats = []
+    for i in range(len(is_ems)):
+        ems_stat = int(is_ems[i])
+        if not ems_stat:
+            for j in range(max(0, i - EMS_WINDOW), min(len(is_ems), i + EMS_WINDOW + 1)):
+                if j != i and is_ems[j] and times[j] == times[i] and locations[j] == locations[i]:
+                    ems_stat = 1
+                    break
+        ems_stats.append(ems_stat)
+    return ems_stats
+
+
+def _column(incidents, name):
+    # Values of one field of every incident, read directly from the columns of an IncidentTable
+    if isinstance(incidents, IncidentTable):
+        return incidents.column(name)
+    return [incident[name] for incident in incidents]
+
+
+def augment_incident(incident, location_ranks, incident_ranks, columns=None):
+    # Augmenting the incident with location rank, incident rank, etc., only the given columns when there are some
+    if columns is None or 'day_of_week' in columns or 'time_of_day' in columns:
+        incident_datetime_str = incident.get("incident_time", "1/1/1900 00:00")
+        incident['day_of_week'], incident['time_of_day'] = _day_and_hour(incident_datetime_str)
+    if columns is None or 'location_rank' in columns:
+        incident['location_rank'] = location_ranks.get(incident['incident_location'], -1)
+    if columns is None or 'incident_rank' in columns:
+        incident['incident_rank'] = incident_ranks.get(incident['incident_nature'], -1)
+
+
+def _day_and_hour(incident_datetime_str):
+    # Day of the week (isoweekday() + 1, so Monday is 2 and Sunday is 8) and hour of an incident time
     incident_datetime = datetime.strptime(incident_datetime_str, "%m/%d/%Y %H:%M")
-
-    incident['day_of_week'] = incident_datetime.isoweekday() + 1
-    incident['time_of_day'] = incident_datetime.hour
-    incident['location_rank'] = location_ranks.get(incident['incident_location'], -1)
-    incident['incident_rank'] = incident_ranks.get(incident['incident_nature'], -1)
+    return incident_datetime.isoweekday() + 1, incident_datetime.hour
 
 
 def print_headers():
-    headers = [
-        "Day of the Week", "Time of Day", "Weather",
-        "Location Rank", "Side of Town", "Incident Rank",
-        "Nature", "EMSSTAT"
-    ]
-    print("\t\t".join(headers))
+    print("\t\t".join(writers.OUTPUT_HEADERS))
 
 
 def print_augmented_data(incident):
+    # Print one augmented incident, the bulk paths write rows through writers.py instead
+    print("\t\t".join([str(value) for value in _output_row(incident)]))
 
-    day_of_week = incident.get('day_of_week')
-    time_of_day = incident.get('time_of_day')
-    location_rank = incident.get('location_rank')
-    incident_rank = incident.get('incident_rank')
-    incident_nature = incident.get('incident_nature')
-    ems_stat = incident.get('ems_stat')
-    side_of_town = incident.get('side_of_town')
-    weather = incident.get('weather')
 
-    print(f"{day_of_week}\t\t{time_of_day}\t\t{weather}\t\t{location_rank}\t\t{side_of_town}\t\t{incident_rank}\t\t{incident_nature}\t\t{ems_stat}")
+def print_augmented_table(table, writer=None, columns=writers.OUTPUT_COLUMNS):
+    # Write the augmented columns of an IncidentTable row by row
+    values = [table.column(name) for name in columns]
+    with _output(writer, columns) as output:
+        output.write_rows(zip(*values))
@@ -0,0 +1,166 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+
+import metrics
+
+# seconds to wait for a connection and for the response
+DEFAULT_TIMEOUT = (5, 30)
+# additional attempts after a failed request, and the base delay before the first one
+RETRIES = 3
+BACKOFF = 0.5
+MAX_BACKOFF = 30
+# responses that are retried, honoring their Retry-After header up to MAX_RETRY_AFTER seconds
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+MAX_RETRY_AFTER = 120
+# consecutive failures that open the circuit of a host, and seconds before a request is tried again
+FAILURE_THRESHOLD = 5
+CIRCUIT_COOLDOWN = 30
+
+# one session per thread and host, each keeps a pool of keep-alive connections
+_local = threading.local()
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of sending a request to a host whose circuit is open."""
+
+
+class CircuitBreaker:
+    """Fail fast after FAILURE_THRESHOLD consecutive failures of a host.
+
+    Once CIRCUIT_COOLDOWN seconds have passed a single trial request is let through, its success closes the
+    circuit and its failure opens it for another cooldown.
+
+    Params:
+    - threshold (int): consecutive failures that open the circuit
+    - cooldown (float): seconds the circuit stays open
+    """
+
+    def __init__(self, threshold=FAILURE_THRESHOLD, cooldown=CIRCUIT_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """Return whether a request may be sent now."""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if not self.trial and time.monotonic() - self.opened_at >= self.cooldown:
+                self.trial = True
+                return True
+            return False
+
+    def record(self, success):
+        """Record the outcome of a request."""
+        with self.lock:
+            if success:
+                self.failures = 0
+                self.opened_at = None
+                self.trial = False
+                return
+            self.failures += 1
+            if self.trial or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+                self.trial = False
+
+
+def get(url, params=None, headers=None, timeout=DEFAULT_TIMEOUT, retries=RETRIES, backoff=BACKOFF,
+        default_headers=None):
+    """Send a GET request with retries, backoff and a circuit breaker per host.
+
+    Connection errors, timeouts and RETRY_STATUSES responses are retried after an exponential backoff with full
+    jitter, or after the Retry-After delay of the response when it is longer.
+
+    Params:
+    - url (str): requested URL
+    - params (dict/None): query parameters
+    - headers (dict/None): headers of this request
+    - timeout (float/tuple): connect and read timeouts in seconds
+    - retries (int): additional attempts after a failed request
+    - backoff (float): upper bound of the delay before the first retry, doubled on each retry
+    - default_headers (dict/None): headers of every request of the session, set when it is created
+    Return:
+        resp (Response): the first response that is not retried, or the last one
+    Raise:
+        requests.RequestException when the last attempt fails, CircuitOpenError when the host is failing
+    """
+    host = urlsplit(url).netloc
+    breaker = _breaker(host)
+    for attempt in range(retries + 1):
+        if not breaker.allow():
+            metrics.count('http.circuit_open')
+            raise CircuitOpenError(f"circuit open for {host} after {breaker.failures} consecutive failures")
+        delay = 0
+        try:
+            resp = session_for(url, default_headers).get(url, params=params, headers=headers, timeout=timeout)
+        except requests.RequestException:
+            breaker.record(False)
+            if attempt == retries:
+                raise
+        else:
+            if resp.status_code not in RETRY_STATUSES:
+                breaker.record(True)
+                return resp
+            breaker.record(False)
+            if attempt == retries:
+                return resp
+            delay = retry_after(resp)
+        metrics.count('http.retries')
+        time.sleep(max(delay, random.uniform(0, min(MAX_BACKOFF, backoff * 2 ** attempt))))
+
+
+def session_for(url, default_headers=None):
+    """Return the session of the calling thread for the host of url, creating it on first use."""
+    sessions = getattr(_local, 'sessions', None)
+    if sessions is None:
+        sessions = _local.sessions = {}
+    host = urlsplit(url).netloc
+    session = sessions.get(host)
+    if session is None:
+        session = requests.Session()
+        if default_headers:
+            session.headers.update(default_headers)
+        sessions[host] = session
+    return session
+
+
+def retry_after(resp):
+    """Seconds to wait according to the Retry-After header of a response, 0 without one."""
+    value = resp.headers.get('Retry-After')
+    if not value:
+        return 0
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return 0
+    return min(max(seconds, 0), MAX_RETRY_AFTER)
+
+
+def reset():
+    """Drop the sessions and circuit breakers, a forked process must not share the connections of its parent."""
+    global _local, _breakers, _breakers_lock
+    _local = threading.local()
+    _breakers = {}
+    _breakers_lock = threading.Lock()
+
+
+def _breaker(host):
+    # circuit breaker of a host, shared by all threads
+    with _breakers_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = _breakers[host] = CircuitBreaker()
+        return breaker
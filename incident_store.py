@@ -0,0 +1,185 @@
+import argparse
+import sqlite3
+from functools import lru_cache
+from itertools import islice
+
+# incident and augmented fields stored for every incident, in table column order
+STORE_FIELDS = (
+    ('number', 'incident_number'), ('ori', 'incident_ori'), ('time', None), ('date', None),
+    ('location', 'incident_location'), ('nature', 'incident_nature'), ('day_of_week', 'day_of_week'),
+    ('time_of_day', 'time_of_day'), ('weather', 'weather'), ('location_rank', 'location_rank'),
+    ('side_of_town', 'side_of_town'), ('incident_rank', 'incident_rank'), ('ems_stat', 'ems_stat')
+)
+# indexed columns, the filters and groupings of most queries, each followed by the date for date ranges
+INDEXED_COLUMNS = ('date', 'location', 'nature', 'side_of_town')
+# groupings of aggregate, as SQL expressions over the incidents table
+GROUPS = {
+    'date': 'date', 'month': 'substr(date, 1, 7)', 'day_of_week': 'day_of_week', 'hour': 'time_of_day',
+    'location': 'location', 'nature': 'nature', 'side_of_town': 'side_of_town', 'weather': 'weather', 'ori': 'ori'
+}
+# measures of aggregate: number of incidents, number and share of EMSSTAT incidents
+MEASURES = {'count': 'COUNT(*)', 'ems_count': 'SUM(ems_stat)', 'ems_share': 'AVG(ems_stat)'}
+# incidents inserted by one statement
+STORE_BATCH = 1024
+
+
+class IncidentStore:
+    """Augmented incidents of many runs in a SQLite file, queried without fetching or parsing the PDFs again.
+
+    Incidents are identified by their number and ORI, adding an incident again replaces the stored one.
+    Times are stored as 'YYYY-MM-DD HH:MM' so that date ranges are index range scans.
+
+    Params:
+        path (str/None): SQLite database file, None keeps the store in memory only
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path or ":memory:")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS incidents (number TEXT, ori TEXT, time TEXT, date TEXT, location TEXT, "
+            "nature TEXT, day_of_week INTEGER, time_of_day INTEGER, weather TEXT, location_rank INTEGER, "
+            "side_of_town TEXT, incident_rank INTEGER, ems_stat INTEGER, PRIMARY KEY (number, ori))"
+        )
+        for column in INDEXED_COLUMNS:
+            key = column if column == 'date' else f"{column}, date"
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS incidents_{column} ON incidents ({key})")
+        self.conn.commit()
+
+    def add(self, incidents):
+        """Store augmented incidents and commit them.
+
+        Params:
+            incidents (iterable): augmented incidents, columns that were not computed are stored as NULL
+        Return:
+            count (int): number of stored incidents
+        """
+        count = 0
+        incidents = iter(incidents)
+        while True:
+            rows = [_store_row(incident) for incident in islice(incidents, STORE_BATCH)]
+            if not rows:
+                break
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO incidents VALUES ({', '.join('?' * len(STORE_FIELDS))})", rows
+            )
+            count += len(rows)
+        self.conn.commit()
+        return count
+
+    def tee(self, incidents):
+        """Yield the augmented incidents while storing them, committing once they are all stored."""
+        pending = []
+        for incident in incidents:
+            pending.append(incident)
+            if len(pending) >= STORE_BATCH:
+                self.add(pending)
+                pending = []
+            yield incident
+        self.add(pending)
+
+    def aggregate(self, group_by=(), measure='count', start=None, end=None, limit=None, order='measure', **filters):
+        """Aggregate the stored incidents matching the filters.
+
+        Params:
+        - group_by (tuple): names of GROUPS
+        - measure (str): one of MEASURES
+        - start (str/date/None): first date included, as 'YYYY-MM-DD'
+        - end (str/date/None): last date included, as 'YYYY-MM-DD'
+        - limit (int/None): number of returned rows
+        - order (str): 'measure' sorts by descending measure, 'group' by the group values
+        - filters: GROUPS name mapped to a value, or to a list of accepted values
+        Return:
+            rows (list): group values followed by the measure, one tuple per group
+        """
+        if isinstance(group_by, str):
+            group_by = (group_by,)
+        unknown = [name for name in (*group_by, *filters) if name not in GROUPS]
+        if unknown or measure not in MEASURES or order not in ('measure', 'group'):
+            raise ValueError(f"unknown groupings or filters {unknown}, expected some of {tuple(GROUPS)}, "
+                             f"a measure of {tuple(MEASURES)} and an order of 'measure' or 'group'")
+
+        conditions, params = [], []
+        if start is not None:
+            conditions.append("date >= ?")
+            params.append(str(start))
+        if end is not None:
+            conditions.append("date <= ?")
+            params.append(str(end))
+        for name, value in filters.items():
+            if isinstance(value, (list, tuple, set)):
+                conditions.append(f"{GROUPS[name]} IN ({', '.join('?' * len(value))})")
+                params.extend(value)
+            else:
+                conditions.append(f"{GROUPS[name]} = ?")
+                params.append(value)
+
+        groups = [GROUPS[name] for name in group_by]
+        query = f"SELECT {', '.join([*groups, MEASURES[measure]])} FROM incidents"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        if groups:
+            query += " GROUP BY " + ", ".join(groups)
+            order_by = [f"{MEASURES[measure]} DESC", *groups] if order == 'measure' else groups
+            query += " ORDER BY " + ", ".join(order_by)
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return self.conn.execute(query, params).fetchall()
+
+    def date_range(self):
+        """Return the first and last stored dates, (None, None) for an empty store."""
+        return self.conn.execute("SELECT MIN(date), MAX(date) FROM incidents").fetchone()
+
+    def close(self):
+        """Close the database connection."""
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def _store_row(incident):
+    # values of STORE_FIELDS, with the incident time in sortable form
+    time = _sortable_time(incident['incident_time'])
+    return (
+        incident['incident_number'], incident['incident_ori'], time, time[:10], incident['incident_location'],
+        incident['incident_nature'], *[incident.get(field) for column, field in STORE_FIELDS[6:]]
+    )
+
+
+@lru_cache(maxsize=65536)
+def _sortable_time(incident_time):
+    # 'M/D/YYYY H:MM' as 'YYYY-MM-DD HH:MM', many incidents share the same minute
+    date, _, clock = incident_time.partition(' ')
+    month, day, year = date.split('/')
+    hour, minute = clock.split(':')
+    return f"{int(year):04d}-{int(month):02d}-{int(day):02d} {int(hour):02d}:{int(minute):02d}"
+
+
+if __name__ == "__main__":
+    # aggregate a store filled by assignment2.py --store
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--store", type=str, required=True, help="SQLite file written by assignment2.py --store.")
+    parser.add_argument(
+        "--group-by", type=lambda value: value.split(','), default=(),
+        help=f"Comma separated groupings out of {', '.join(GROUPS)}."
+    )
+    parser.add_argument("--measure", choices=MEASURES, default="count", help="Aggregated measure of each group.")
+    parser.add_argument("--start", type=str, default=None, help="First date included, as YYYY-MM-DD.")
+    parser.add_argument("--end", type=str, default=None, help="Last date included, as YYYY-MM-DD.")
+    parser.add_argument("--limit", type=int, default=None, help="Number of groups printed.")
+    parser.add_argument(
+        "--order", choices=('measure', 'group'), default="measure",
+        help="'measure' prints the largest groups first, 'group' sorts by the group values."
+    )
+    parser.add_argument(
+        "--where", type=lambda value: value.split('=', 1), action="append", default=[],
+        help="Filter as NAME=VALUE, e.g. side_of_town=N, may be repeated."
+    )
+    args = parser.parse_args()
+    store = IncidentStore(args.store)
+    try:
+        for row in store.aggregate(args.group_by, args.measure, args.start, args.end, args.limit, args.order,
+                                   **dict(args.where)):
+            print("\t\t".join(str(value) for value in row))
+    finally:
+        store.close()
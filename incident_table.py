@@ -0,0 +1,124 @@
+import sys
+from array import array
+from collections.abc import MutableMapping
+
+# columns extracted from the PDF by refactor_page_data
+BASE_COLUMNS = ("incident_time", "incident_number", "incident_location", "incident_nature", "incident_ori")
+# columns with few distinct values, each distinct string is stored once
+INTERNED_COLUMNS = {"incident_time", "incident_location", "incident_nature", "incident_ori", "side_of_town"}
+# placeholder of a row that has no value in a column
+MISSING = object()
+
+
+class IncidentTable:
+    """Incidents stored column by column instead of one dict per incident.
+
+    String columns are lists of interned strings, integer columns set with set_column can be arrays.
+    Indexing or iterating the table gives IncidentRow views that behave like the incident dicts.
+    """
+
+    __slots__ = ("columns", "length")
+
+    def __init__(self):
+        self.columns = {name: [] for name in BASE_COLUMNS}
+        self.length = 0
+
+    @classmethod
+    def from_records(cls, records):
+        """Build a table from incident dicts."""
+        table = cls()
+        table.extend(records)
+        return table
+
+    def append(self, record):
+        """Add an incident dict as the last row."""
+        for name, values in self.columns.items():
+            value = record.get(name, MISSING)
+            if isinstance(values, array) and not isinstance(value, int):
+                values = self.columns[name] = list(values)
+            values.append(_intern(name, value))
+        for name in record.keys() - self.columns.keys():
+            self.columns[name] = [MISSING] * self.length + [_intern(name, record[name])]
+        self.length += 1
+
+    def extend(self, records):
+        """Add several incident dicts as the last rows."""
+        for record in records:
+            self.append(record)
+
+    def column(self, name):
+        """Return the values of a column, in row order."""
+        return self.columns[name]
+
+    def set_column(self, name, values):
+        """Replace a whole column, values is a list or an array with one value per row."""
+        if len(values) != self.length:
+            raise ValueError(f"column {name} has {len(values)} values for {self.length} rows")
+        if isinstance(values, list):
+            values = [_intern(name, value) for value in values]
+        self.columns[name] = values
+
+    def to_records(self):
+        """Return the rows as plain incident dicts."""
+        return [dict(row) for row in self]
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("incident table index out of range")
+        return IncidentRow(self, index)
+
+    def __iter__(self):
+        for index in range(self.length):
+            yield IncidentRow(self, index)
+
+
+class IncidentRow(MutableMapping):
+    """Dict-compatible view of one row of an IncidentTable, writes go to the table columns."""
+
+    __slots__ = ("table", "index")
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __getitem__(self, key):
+        value = self.table.columns[key][self.index]
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        columns = self.table.columns
+        if key not in columns:
+            columns[key] = [MISSING] * self.table.length
+        elif isinstance(columns[key], array) and not isinstance(value, int):
+            columns[key] = list(columns[key])
+        columns[key][self.index] = _intern(key, value)
+
+    def __delitem__(self, key):
+        # raise KeyError when the row has no value in the column
+        self[key]
+        self.table.columns[key][self.index] = MISSING
+
+    def __iter__(self):
+        for name, values in self.table.columns.items():
+            if values[self.index] is not MISSING:
+                yield name
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"IncidentRow({dict(self)!r})"
+
+
+def _intern(name, value):
+    # store a single copy of the repeated strings of a column
+    if name in INTERNED_COLUMNS and type(value) is str:
+        return sys.intern(value)
+    return value
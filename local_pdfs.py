@@ -0,0 +1,57 @@
+import mmap
+import os
+
+# file name suffix of the PDFs collected from directories
+PDF_SUFFIX = '.pdf'
+
+
+class MappedPdf(mmap.mmap):
+    """Read-only memory map of a local PDF, used wherever the data of a downloaded PDF is.
+
+    Pages of the file are read by the kernel as they are accessed and can be dropped again under memory
+    pressure, so the PDF is never copied into the process. Maps are pickled as their path: a parsing process
+    maps the file itself instead of receiving its content.
+
+    Params:
+        path (str): PDF file
+    """
+
+    def __new__(cls, path):
+        with open(path, 'rb') as file:
+            pdf = super().__new__(cls, file.fileno(), 0, access=mmap.ACCESS_READ)
+        pdf.path = path
+        return pdf
+
+    def __reduce__(self):
+        return MappedPdf, (self.path,)
+
+
+def source_path(source):
+    """Return the local path of a URL list entry, None for an HTTP(S) URL."""
+    if source.startswith('file://'):
+        return source[len('file://'):]
+    if '://' in source:
+        return None
+    return source
+
+
+def expand_sources(sources):
+    """Replace the directories of a URL list with the PDFs below them.
+
+    Params:
+        sources (iterable): URLs, local PDF files and directories of PDFs
+    Return:
+        sources (list): URLs and PDF files in input order, the PDFs of a directory sorted by name
+    """
+    expanded = []
+    for source in sources:
+        path = source_path(source)
+        if path is None or not os.path.isdir(path):
+            expanded.append(source)
+            continue
+        for directory, subdirectories, files in os.walk(path):
+            # walk the tree in path order, daily summaries are named by their date
+            subdirectories.sort()
+            expanded.extend(os.path.join(directory, name) for name in sorted(files)
+                            if name.lower().endswith(PDF_SUFFIX))
+    return expanded
@@ -0,0 +1,149 @@
+import heapq
+import json
+import threading
+import time
+from collections import Counter
+
+# number of slowest downloads kept in the report
+SLOWEST_URLS = 5
+
+enabled = False
+_lock = threading.Lock()
+_stages = {}
+_counters = Counter()
+_observations = {}
+_slowest_urls = []
+
+
+class _Timer:
+    """Add the wall and CPU time of a with block to a stage."""
+
+    __slots__ = ("name", "wall_start", "cpu_start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.thread_time() - self.cpu_start
+        with _lock:
+            stage = _stages.setdefault(self.name, [0, 0.0, 0.0])
+            stage[0] += 1
+            stage[1] += wall
+            stage[2] += cpu
+
+
+class _NoTimer:
+    """Stand-in of _Timer while metrics are disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return None
+
+
+_NO_TIMER = _NoTimer()
+
+
+def enable(on=True):
+    """Turn collection on or off, metrics collected so far are kept."""
+    global enabled
+    enabled = on
+
+
+def reset():
+    """Drop every metric collected so far."""
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+        _observations.clear()
+        _slowest_urls.clear()
+
+
+def timer(name):
+    """Time a with block as one call of the stage name, does nothing while metrics are disabled."""
+    return _Timer(name) if enabled else _NO_TIMER
+
+
+def count(name, n=1):
+    """Increase the counter name by n."""
+    if enabled:
+        with _lock:
+            _counters[name] += n
+
+
+def observe(name, value):
+    """Record one value of a distribution, such as the number of records on a page."""
+    if enabled:
+        with _lock:
+            stats = _observations.setdefault(name, [0, 0, value, value])
+            stats[0] += 1
+            stats[1] += value
+            stats[2] = min(stats[2], value)
+            stats[3] = max(stats[3], value)
+
+
+def record_url(url, seconds):
+    """Record the download time of a URL, only the SLOWEST_URLS slowest are kept."""
+    if enabled:
+        with _lock:
+            if len(_slowest_urls) < SLOWEST_URLS:
+                heapq.heappush(_slowest_urls, (seconds, url))
+            else:
+                heapq.heappushpop(_slowest_urls, (seconds, url))
+
+
+def dump():
+    """Return every metric as a dict that can be serialized to JSON.
+
+    Stage times are summed over all threads, so concurrent stages can add up to more than the run time.
+    Work done in parsing processes is not included.
+    """
+    with _lock:
+        return {
+            "stages": {name: {"calls": calls, "wall_s": round(wall, 6), "cpu_s": round(cpu, 6)}
+                       for name, (calls, wall, cpu) in _stages.items()},
+            "counters": dict(_counters),
+            "observations": {name: {"count": n, "mean": total / n, "min": low, "max": high}
+                             for name, (n, total, low, high) in _observations.items()},
+            "slowest_urls": [{"url": url, "seconds": round(seconds, 6)}
+                             for seconds, url in sorted(_slowest_urls, reverse=True)],
+        }
+
+
+def write_json(path):
+    """Write the metrics of dump to a JSON file."""
+    with open(path, "w") as file:
+        json.dump(dump(), file, indent=2)
+
+
+def report():
+    """Format the metrics as a human-readable profile report."""
+    metrics = dump()
+    lines = ["Stage                    Calls     Wall (s)      CPU (s)"]
+    for name, stage in sorted(metrics["stages"].items(), key=lambda item: -item[1]["wall_s"]):
+        lines.append(f"{name:<20}{stage['calls']:>10}{stage['wall_s']:>13.3f}{stage['cpu_s']:>13.3f}")
+    if metrics["counters"]:
+        lines.append("")
+        lines.append("Counter                                Value")
+        for name, value in sorted(metrics["counters"].items()):
+            lines.append(f"{name:<35}{value:>10}")
+    if metrics["observations"]:
+        lines.append("")
+        lines.append("Distribution              Count      Mean   Min   Max")
+        for name, stats in sorted(metrics["observations"].items()):
+            lines.append(f"{name:<22}{stats['count']:>10}{stats['mean']:>10.1f}{stats['min']:>6}{stats['max']:>6}")
+    if metrics["slowest_urls"]:
+        lines.append("")
+        lines.append("Slowest downloads")
+        for entry in metrics["slowest_urls"]:
+            lines.append(f"{entry['seconds']:>10.3f}s  {entry['url']}")
+    return "\n".join(lines)
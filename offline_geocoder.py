@@ -0,0 +1,183 @@
+import csv
+import difflib
+import math
+import re
+from bisect import bisect_left
+
+# house number at the start of a street address
+HOUSE_NUMBER = re.compile(r'^(\d+)\s+(.+)$')
+# similarity a misspelled street name needs to be matched to a known one
+STREET_CUTOFF = 0.85
+# largest distance, in degrees, between the ends of two streets that are taken as their intersection
+INTERSECTION_TOLERANCE = 0.001
+# decimals of the coordinates of the street ends that are compared to find intersections
+NODE_PRECISION = 5
+
+
+class OfflineGeocoder:
+    """Geocoder reading coordinates from local address points and street centerlines.
+
+    Address points are CSV files with the columns address, lat and lon. Street centerlines are CSV files with
+    the columns street, from_lat, from_lon, to_lat and to_lon, and optionally the house number range of the
+    segment in from_number and to_number.
+
+    Params:
+        normalize (function): normalization of addresses, applied to the files and to every lookup
+    """
+
+    def __init__(self, normalize):
+        self.normalize = normalize
+        # normalized address -> (lat, lon)
+        self.addresses = {}
+        # street -> sorted (house number, lat, lon) of its address points
+        self.street_numbers = {}
+        # street -> (from_lat, from_lon, to_lat, to_lon, from_number, to_number) of its segments
+        self.segments = {}
+        # sorted pair of streets -> (lat, lon) of a centerline node they share
+        self.intersections = {}
+        self.sorted_addresses = []
+        self.street_names = []
+        self.street_matches = {}
+
+    def load(self, path):
+        """Add the address points or street centerlines of a CSV file to the indexes.
+
+        Params:
+            path (str): CSV file, its header tells which of the two kinds it holds
+        """
+        with open(path, newline='') as file:
+            reader = csv.DictReader(file)
+            if 'address' in reader.fieldnames:
+                for row in reader:
+                    self._add_address(self.normalize(row['address']), float(row['lat']), float(row['lon']))
+            elif 'street' in reader.fieldnames:
+                for row in reader:
+                    self._add_segment(self.normalize(row['street']), row)
+            else:
+                raise ValueError(f"{path} has neither an address nor a street column")
+        self._build()
+
+    def _add_address(self, address, lat, lon):
+        self.addresses[address] = (lat, lon)
+        match = HOUSE_NUMBER.match(address)
+        if match:
+            self.street_numbers.setdefault(match.group(2), []).append((int(match.group(1)), lat, lon))
+
+    def _add_segment(self, street, row):
+        from_number, to_number = row.get('from_number'), row.get('to_number')
+        self.segments.setdefault(street, []).append((
+            float(row['from_lat']), float(row['from_lon']), float(row['to_lat']), float(row['to_lon']),
+            int(from_number) if from_number else None, int(to_number) if to_number else None
+        ))
+
+    def _build(self):
+        # sorted indexes used by the prefix and fuzzy lookups, and the nodes shared by several streets
+        for numbers in self.street_numbers.values():
+            numbers.sort()
+        self.sorted_addresses = sorted(self.addresses)
+        self.street_names = sorted(set(self.street_numbers) | set(self.segments))
+        self.street_matches = {}
+
+        nodes = {}
+        for street, segments in self.segments.items():
+            for from_lat, from_lon, to_lat, to_lon, _, _ in segments:
+                for lat, lon in ((from_lat, from_lon), (to_lat, to_lon)):
+                    key = (round(lat, NODE_PRECISION), round(lon, NODE_PRECISION))
+                    nodes.setdefault(key, ((lat, lon), set()))[1].add(street)
+        self.intersections = {}
+        for point, streets in nodes.values():
+            streets = sorted(streets)
+            for i, first in enumerate(streets):
+                for second in streets[i + 1:]:
+                    self.intersections.setdefault((first, second), point)
+
+    def geocode(self, location):
+        """Return the (lat, lon) of a location, None when the local data cannot place it.
+
+        Exact addresses are looked up in a hash index, "A / B" locations are resolved as intersections,
+        house numbers are interpolated along their street, and other locations match the first address
+        starting with them.
+
+        Params:
+            location (str): incident location
+        Return:
+            coordinates (tuple/None): (lat, lon)
+        """
+        address = self.normalize(location)
+        point = self.addresses.get(address)
+        if point is not None:
+            return point
+        if ' / ' in address:
+            return self._intersection(*address.split(' / ', 1))
+        match = HOUSE_NUMBER.match(address)
+        if match:
+            street = self._street(match.group(2))
+            if street is not None:
+                point = self._along_street(street, int(match.group(1)))
+                if point is not None:
+                    return point
+        return self._prefix(address)
+
+    def _street(self, name):
+        # known street of that name, or the closest spelling of it
+        if name in self.segments or name in self.street_numbers:
+            return name
+        if name not in self.street_matches:
+            matches = difflib.get_close_matches(name, self.street_names, n=1, cutoff=STREET_CUTOFF)
+            self.street_matches[name] = matches[0] if matches else None
+        return self.street_matches[name]
+
+    def _along_street(self, street, number):
+        # interpolate along the segment whose house number range holds number
+        for from_lat, from_lon, to_lat, to_lon, from_number, to_number in self.segments.get(street, ()):
+            if from_number is not None and to_number is not None and \
+                    min(from_number, to_number) <= number <= max(from_number, to_number):
+                share = (number - from_number) / (to_number - from_number) if to_number != from_number else 0.5
+                return from_lat + (to_lat - from_lat) * share, from_lon + (to_lon - from_lon) * share
+
+        # otherwise interpolate between the address points with the closest numbers
+        numbers = self.street_numbers.get(street)
+        if not numbers:
+            return None
+        i = bisect_left(numbers, (number,))
+        if i == 0 or i == len(numbers):
+            _, lat, lon = numbers[min(i, len(numbers) - 1)]
+            return lat, lon
+        (low, low_lat, low_lon), (high, high_lat, high_lon) = numbers[i - 1], numbers[i]
+        share = (number - low) / (high - low)
+        return low_lat + (high_lat - low_lat) * share, low_lon + (high_lon - low_lon) * share
+
+    def _intersection(self, first, second):
+        # shared centerline node of both streets, or the middle of their closest ends
+        first, second = self._street(first), self._street(second)
+        if first is None or second is None:
+            return None
+        point = self.intersections.get(tuple(sorted((first, second))))
+        if point is not None:
+            return point
+
+        closest, closest_distance = None, INTERSECTION_TOLERANCE
+        for first_end in _segment_ends(self.segments.get(first, ())):
+            for second_end in _segment_ends(self.segments.get(second, ())):
+                distance = math.dist(first_end, second_end)
+                if distance <= closest_distance:
+                    closest, closest_distance = (first_end, second_end), distance
+        if closest is None:
+            return None
+        (first_lat, first_lon), (second_lat, second_lon) = closest
+        return (first_lat + second_lat) / 2, (first_lon + second_lon) / 2
+
+    def _prefix(self, address):
+        # first known address continuing the location with more words
+        prefix = address + ' '
+        i = bisect_left(self.sorted_addresses, prefix)
+        if i < len(self.sorted_addresses) and self.sorted_addresses[i].startswith(prefix):
+            return self.addresses[self.sorted_addresses[i]]
+        return None
+
+
+def _segment_ends(segments):
+    # both ends of every segment
+    for from_lat, from_lon, to_lat, to_lon, _, _ in segments:
+        yield from_lat, from_lon
+        yield to_lat, to_lon
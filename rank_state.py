@@ -0,0 +1,88 @@
+import sqlite3
+from collections import Counter
+
+
+class RankState:
+    """Location and nature counts, EMSSTAT index and keys of the incidents merged by earlier runs, kept in SQLite.
+
+    Incidents are identified by their number and ORI, since the police, fire and EMS numbers are separate series.
+    Merged incidents are only persisted by commit, so a run that fails before printing can be repeated.
+
+    Params:
+        path (str/None): SQLite database file, None keeps the state in memory only
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path or ":memory:")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS incidents (number TEXT, ori TEXT, PRIMARY KEY (number, ori))"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS counts (kind TEXT, value TEXT, count INTEGER, PRIMARY KEY (kind, value))"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS ems (time TEXT, location TEXT, PRIMARY KEY (time, location))"
+        )
+        self.conn.commit()
+
+    def merge(self, incidents):
+        """Add the incidents that were not merged before to the counts and the EMSSTAT index.
+
+        Params:
+            incidents (iterable): incidents of this run
+        Return:
+            new_incidents (list): incidents not merged before, in input order
+        """
+        new_incidents = []
+        location_counts, nature_counts, ems_index = Counter(), Counter(), set()
+        for incident in incidents:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO incidents (number, ori) VALUES (?, ?)",
+                (incident['incident_number'], incident['incident_ori'])
+            )
+            if not cursor.rowcount:
+                # processed by an earlier run or earlier in this one
+                continue
+            new_incidents.append(incident)
+            location_counts[incident['incident_location']] += 1
+            nature_counts[incident['incident_nature']] += 1
+            if incident['incident_ori'].upper() == 'EMSSTAT':
+                ems_index.add((incident['incident_time'], incident['incident_location']))
+
+        for kind, counts in (('location', location_counts), ('nature', nature_counts)):
+            self.conn.executemany(
+                "INSERT INTO counts (kind, value, count) VALUES (?, ?, ?) "
+                "ON CONFLICT (kind, value) DO UPDATE SET count = count + excluded.count",
+                ((kind, value, count) for value, count in counts.items())
+            )
+        self.conn.executemany("INSERT OR IGNORE INTO ems (time, location) VALUES (?, ?)", ems_index)
+        return new_incidents
+
+    def location_counts(self):
+        """Return the number of incidents per location over every merged incident."""
+        return self._counts('location')
+
+    def nature_counts(self):
+        """Return the number of incidents per nature over every merged incident."""
+        return self._counts('nature')
+
+    def _counts(self, kind):
+        return Counter(dict(self.conn.execute("SELECT value, count FROM counts WHERE kind = ?", (kind,))))
+
+    def ems_index(self):
+        """Return the (time, location) of every merged EMSSTAT incident."""
+        return set(self.conn.execute("SELECT time, location FROM ems"))
+
+    def commit(self):
+        """Persist the incidents merged since the last commit."""
+        self.conn.commit()
+
+    def rollback(self):
+        """Drop the incidents merged since the last commit, so that they can be merged again."""
+        self.conn.rollback()
+
+    def close(self):
+        """Close the database connection, dropping uncommitted merges."""
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
@@ -8,7 +8,8 @@ setup(
     url="https://github.com/pratikshadeo24/cis6930sp24-assignment2",
     packages=find_packages(exclude=('tests', 'docs', 'resources')),
     install_requires=[
-        'pypdf==4.0.0'
+        'pypdf>=6.19',
+        'numpy'
     ],
     tests_require=[
         'pytest==7.4.4',
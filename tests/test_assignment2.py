@@ -19,12 +19,71 @@ def test_main(mocker, mock_urls):
 
     # Path to the file containing URLs
     urls_filename = "urls.txt"
-    # Execute the main function with the mocked URLs file
-    main(urls_filename)
+    # Execute the main function with the mocked URLs file, without the persistent caches
+    main(urls_filename, cache_dir=None)
 
     # Assert that each mocked function was called the correct number of times
     assert fetch_incidents_mock.call_count == len(mock_urls)
     assert extract_incidents_mock.call_count == len(mock_urls)
     # Augment and print functions should only be called once since they are called after aggregating all incidents
     augment_data_mock.assert_called_once()
-    # print_augmented_data_mock.assert_called_once()
\ No newline at end of file
+    # print_augmented_data_mock.assert_called_once()
+
+def test_main_profile(mocker, mock_urls, capsys):
+    # Mocks
+    mocker.patch('builtins.open', mocker.mock_open(read_data='\n'.join(mock_urls)))
+    mocker.patch("functions.fetch_incidents", return_value="PDF data")
+    mocker.patch("functions.extract_incidents", return_value=[{'incident_data': 'data'}])
+    mocker.patch("functions.augment_and_print_data", return_value=[{'augmented_data': 'data'}])
+
+    # Execute
+    main("urls.txt", cache_dir=None, profile=True)
+
+    # Assert
+    report = capsys.readouterr().err
+    assert 'total' in report
+    assert 'augment' in report
+
+
+def test_run(mocker, mock_urls, tmp_path):
+    # Mocks
+    from tests import result_page_0
+    import functions
+    from assignment2 import run
+    mocker.patch("functions.fetch_incidents", side_effect=lambda url: url)
+    mocker.patch("functions.extract_incidents",
+                 side_effect=lambda url, extract_mode: functions.refactor_page_data(result_page_0))
+    output_path = tmp_path / "out.jsonl"
+
+    # Execute
+    count = run(mock_urls, {'columns': ['incident_rank', 'ems_stat'], 'output_format': 'jsonl',
+                            'output_path': str(output_path), 'cache_dir': None})
+
+    # Assert
+    with open(output_path) as file:
+        lines = file.read().splitlines()
+    assert count == len(lines) == 2 * len(functions.refactor_page_data(result_page_0))
+    with pytest.raises(ValueError):
+        run(mock_urls, {'worker': 2})
+    with pytest.raises(ValueError):
+        run([], {'watch': True, 'cache_dir': None})
+
+
+def test_run_shard_phase_rate_limits(mocker, mock_urls, tmp_path):
+    # Mocks
+    from tests import result_page_0
+    import functions
+    from assignment2 import run
+    mocker.patch("functions.fetch_incidents", side_effect=lambda url: url)
+    mocker.patch("functions.extract_incidents",
+                 side_effect=lambda url, extract_mode: functions.refactor_page_data(result_page_0))
+    options = {'shards': 2, 'shard_phase': 'count', 'shard_dir': str(tmp_path), 'cache_dir': None}
+
+    # Execute and Assert: repeated phases take the same share, and the next run takes the whole budget
+    run(mock_urls, options)
+    run(mock_urls, options)
+    assert functions.rate_limit_shares == 2
+    run(mock_urls, {'columns': ['incident_rank'], 'cache_dir': None})
+    assert functions.rate_limit_shares == 1
+    with pytest.raises(ValueError):
+        run(mock_urls, {'shards': 2, 'incremental': True, 'cache_dir': str(tmp_path)})
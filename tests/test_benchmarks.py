@@ -0,0 +1,64 @@
+from datetime import date
+import functions
+from benchmarks import bench
+from benchmarks.synthetic import daily_summary_pdf, incident_rows, ROWS_PER_PAGE
+
+
+def test_synthetic_pdf_parses_like_generated_rows():
+    # Setup
+    day = date(2024, 4, 5)
+    rows = incident_rows(day, 100)
+
+    # Execute
+    actual_incidents = functions.extract_incidents(daily_summary_pdf(day, 100))
+
+    # Expect
+    expected_incidents = [dict(zip(("incident_time", "incident_number", "incident_location", "incident_nature",
+                                    "incident_ori"), row)) for row in rows]
+
+    # Assert: the footer cut of the first page keeps the first letter of the title, as on the real summaries
+    assert len(actual_incidents) == len(expected_incidents)
+    first_page_end = ROWS_PER_PAGE - 1
+    assert actual_incidents[:first_page_end] == expected_incidents[:first_page_end]
+    assert actual_incidents[first_page_end + 1:] == expected_incidents[first_page_end + 1:]
+
+
+
+def test_layout_extraction_parses_generated_rows(mocker):
+    # Setup
+    day = date(2024, 4, 5)
+    data = daily_summary_pdf(day, 100)
+    expected_incidents = [dict(zip(functions.LAYOUT_FIELDS, row)) for row in incident_rows(day, 100)]
+
+    # Execute
+    actual_incidents = functions.extract_incidents(data, 'layout')
+    range_incidents = functions.extract_page_range(data, 1, None, 'layout')
+    # pypdf reports the text runs when the content stream cannot be read directly
+    mocker.patch('functions._content_stream_runs', return_value=None)
+    visitor_incidents = functions.extract_incidents(data, 'layout')
+
+    # Assert: the columns also fix the last row of the first page
+    assert actual_incidents == expected_incidents
+    assert range_incidents == expected_incidents[ROWS_PER_PAGE:]
+    assert visitor_incidents == expected_incidents
+
+
+def test_bench_run_and_compare():
+    # Execute
+    result = bench.run(days=2, incidents=30, workers=2, augment_workers=2)
+    lines, regressions = bench.compare(result, result)
+
+    # Assert
+    assert set(result["stages"]) == set(bench.STAGES)
+    assert result["stages"]["augment"]["items"] == 60
+    assert result["requests"]["pdfs"] == 2
+    assert regressions == 0
+
+
+def test_bench_startup_leaves_heavy_imports_to_stages():
+    # Execute
+    result = bench.startup(repeat=1)
+
+    # Assert: the time budget depends on the machine and is checked by `bench startup`
+    assert result["heavy_modules"] == []
+    assert result["cli_help_s"] > 0
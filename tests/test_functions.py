@@ -1,4 +1,7 @@
+import json
+import math
 import pytest
+import requests
 import functions
 
 
@@ -169,7 +172,7 @@ def test_find_weather(mocker, weather_resp_json, incident, lat, lon, expected):
     # Mocks
     mock_spi_resp = mocker.Mock()
     mock_spi_resp.json.return_value = weather_resp_json
-    mocker.patch('functions.requests.get', return_value=mock_spi_resp)
+    mocker.patch('http_client.get', return_value=mock_spi_resp)
 
     # Execute
     actual_weather_code = functions.find_weather(incident, lat, lon)
@@ -196,7 +199,7 @@ def test_get_lat_long(mocker, incident, loc_resp_json, expected):
     # Mocks
     mock_spi_resp = mocker.Mock()
     mock_spi_resp.json.return_value = loc_resp_json
-    mocker.patch('functions.requests.get', return_value=mock_spi_resp)
+    mocker.patch('http_client.get', return_value=mock_spi_resp)
 
     # Execute
     actual_weather_code = functions.get_lat_long(incident)
@@ -206,8 +209,638 @@ def test_get_lat_long(mocker, incident, loc_resp_json, expected):
     assert actual_weather_code[1] == expected[1]
 
 
+def test_fetch_incidents_retries(mocker):
+    # Mocks
+    mock_resp = mocker.Mock()
+    mock_resp.content = b'PDF data'
+    mock_resp.status_code = 200
+    mock_session = mocker.Mock()
+    mock_session.get.side_effect = [requests.ConnectionError('connection reset'), mock_resp]
+    mocker.patch('http_client.session_for', return_value=mock_session)
+    mocker.patch('http_client.time.sleep')
+
+    # Execute
+    actual_data = functions.fetch_incidents('http://testurl1.com')
+
+    # Assert
+    assert actual_data == b'PDF data'
+    assert mock_session.get.call_count == 2
+
+
+def test_fetch_all_incidents_keeps_url_order(mocker):
+    # Mocks
+    urls = [f'http://testurl{i}.com' for i in range(10)]
+    mocker.patch('functions.fetch_incidents', side_effect=lambda url: url.encode())
+
+    # Execute
+    actual_results = list(functions.fetch_all_incidents(urls, workers=3))
+
+    # Assert
+    assert actual_results == [(url, url.encode()) for url in urls]
+
+
+def test_extract_all_incidents_matches_serial(mocker):
+    # Mocks
+    header, footer = 'H' * 57, 'F' * 55
+    page_texts = [header + '1/17/2024 0:08 2024-00003584 608 S FLOOD AVE Check Area OK0140200\n' + footer]
+    page_texts += [f'1/17/2024 {i}:14 2024-0000{i:04d} 941 HEATHER GLEN DR Medical Call Pd Requested EMSSTAT\n'
+                   for i in range(1, 19)]
+    page_texts += ['1/17/2024 23:16 2024-00001510 750 S I35 NB I MVA With Injuries 14005\n1/18/2024 footer']
+    pages = []
+    for text in page_texts:
+        page = mocker.Mock()
+        page.extract_text.return_value = text
+        pages.append(page)
+    mocker.patch('pypdf.PdfReader', return_value=mocker.Mock(pages=pages))
+    mocker.patch('concurrent.futures.ProcessPoolExecutor', functions.ThreadPoolExecutor)
+
+    # Execute
+    serial_incidents = list(functions.extract_all_incidents([b'pdf1', b'pdf2']))
+    parallel_incidents = list(functions.extract_all_incidents([b'pdf1', b'pdf2'], workers=2))
+
+    # Assert
+    assert len(serial_incidents[0]) == 20
+    assert parallel_incidents == serial_incidents
+
+
+def test_get_lat_long_persistent_cache(mocker, tmp_path):
+    # Mocks
+    mock_spi_resp = mocker.Mock()
+    mock_spi_resp.json.return_value = {'results': [{'geometry': {'location': {'lat': 35.2109587, 'lng': -97.4587691}}}]}
+    requests_get_mock = mocker.patch('http_client.get', return_value=mock_spi_resp)
+    mocker.patch('functions.geocode_cache', functions.SqliteCache(None, 'geocode'))
+
+    # Execute
+    functions.configure_cache(str(tmp_path))
+    first = functions.get_lat_long({'incident_location': '1062 W BOYD ST'})
+    # a new process starts with an empty in-memory cache but the same database
+    functions.configure_cache(str(tmp_path))
+    second = functions.get_lat_long({'incident_location': '1062  w boyd st'})
+    functions.configure_cache(None)
+
+    # Assert
+    assert first == second == (35.2109587, -97.4587691)
+    requests_get_mock.assert_called_once()
+
+
+def test_sqlite_cache_expiry_and_lru(mocker):
+    # Setup
+    store = functions.SqliteCache(None, 'geocode', ttl=10, negative_ttl=1, lru_size=2)
+    time_mock = mocker.patch('cache.time.time', return_value=100)
+
+    # Execute
+    store.put('A', [1, 2])
+    store.put('B', None)
+    store.put('C', [3, 4])
+    time_mock.return_value = 102
+
+    # Assert
+    assert store.get('A') is functions.MISSING
+    assert store.get('B') is functions.MISSING
+    assert store.get('C') == [3, 4]
+
+
+def test_find_weather_one_request_per_cell_and_day(mocker, weather_resp_json):
+    # Mocks
+    mock_spi_resp = mocker.Mock()
+    mock_spi_resp.json.return_value = weather_resp_json
+    requests_get_mock = mocker.patch('http_client.get', return_value=mock_spi_resp)
+    mocker.patch('functions.weather_cache', functions.SqliteCache(None, 'weather'))
+    incidents = [{'incident_time': '2/26/2024 0:04'}, {'incident_time': '2/26/2024 1:06'},
+                 {'incident_time': '2/26/2024 4:08'}, {'incident_time': '2/27/2024 4:08'}]
+    coordinates = [(35.20458136231884, -97.43226908695652), (35.207455, -97.432611),
+                   (35.189401448979595, -97.45121940816327), (35.189401448979595, -97.45121940816327)]
+
+    # Execute
+    groups = functions.group_by_weather(incidents, coordinates)
+    actual_codes = [functions.find_weather(incident, lat, lon) for incident, (lat, lon) in zip(incidents, coordinates)]
+
+    # Assert
+    assert list(groups.values()) == [[0, 1], [2], [3]]
+    assert actual_codes == [0, 1, 5, 5]
+    assert requests_get_mock.call_count == 3
+
+
+def test_augment_and_print_data_concurrent(mocker, sample_incidents, capsys):
+    # Mocks
+    get_lat_long_mock = mocker.patch('functions.get_lat_long', return_value=(35.20458136231884, -97.43226908695652))
+    mocker.patch('functions.fetch_hourly_weather', return_value=[0, 1, 0])
 
+    # Execute
+    functions.augment_and_print_data([dict(incident) for incident in sample_incidents])
+    serial_output = capsys.readouterr().out
+    actual_aug_incidents = functions.augment_and_print_data(sample_incidents, workers=4)
+    concurrent_output = capsys.readouterr().out
 
+    # Assert
+    assert concurrent_output == serial_output
+    assert [incident['weather'] for incident in actual_aug_incidents] == [0, 0, 0]
+    # the two incidents at 1880 CLASSEN BLVD share one lookup
+    assert get_lat_long_mock.call_count == 3 + 2
 
 
+@pytest.mark.parametrize("augment_workers, ems_mode", [(1, 'index'), (4, 'index'), (1, 'window')])
+def test_stream_augment_and_print_matches_in_memory(mocker, capsys, augment_workers, ems_mode):
+    # Mocks
+    from tests import result_page_0, result_random_page, result_last_page
+    pages = {'http://testurl1.com': result_page_0 + result_random_page, 'http://testurl2.com': result_last_page}
+    mocker.patch('functions.fetch_incidents', side_effect=lambda url: url)
+    mocker.patch('functions.extract_incidents',
+                 side_effect=lambda url, extract_mode: functions.refactor_page_data(pages[url]))
+    mocker.patch('functions.get_lat_long', return_value=(35.20458136231884, -97.43226908695652))
+    mocker.patch('functions.fetch_hourly_weather', return_value=list(range(24)))
+    mocker.patch('functions.STREAM_CHUNK_SIZE', 5)
+
+    # Execute
+    all_incidents = functions.refactor_page_data(result_page_0 + result_random_page + result_last_page)
+    functions.augment_and_print_data(all_incidents, ems_mode=ems_mode)
+    expected_output = capsys.readouterr().out
+    count = functions.stream_augment_and_print(list(pages), augment_workers=augment_workers, ems_mode=ems_mode)
+    actual_output = capsys.readouterr().out
+
+    # Assert
+    assert count == len(all_incidents)
+    assert actual_output == expected_output
+
 
+def test_augment_and_print_table_matches_records(mocker, capsys):
+    # Mocks
+    from tests import result_page_0, result_random_page
+    mocker.patch('functions.get_lat_long', return_value=(35.20458136231884, -97.43226908695652))
+    mocker.patch('functions.fetch_hourly_weather', return_value=list(range(24)))
+    records = functions.refactor_page_data(result_page_0 + result_random_page)
+    table = functions.IncidentTable.from_records([dict(record) for record in records])
+
+    # Execute
+    expected_incidents = functions.augment_and_print_data(records)
+    expected_output = capsys.readouterr().out
+    actual_table = functions.augment_and_print_data(table)
+    actual_output = capsys.readouterr().out
+
+    # Assert
+    assert actual_output == expected_output
+    assert actual_table.to_records() == expected_incidents
+
+
+def test_incident_table_row_view():
+    # Setup
+    table = functions.IncidentTable.from_records([
+        {'incident_location': '1880 CLASSEN BLVD', 'incident_nature': 'Traffic Stop',
+         'incident_number': '2024-00013477', 'incident_ori': 'EMSSTAT', 'incident_time': '2/25/2024 0:04'}
+    ])
+
+    # Execute
+    row = table[0]
+    row['weather'] = 'Unknown'
+
+    # Assert
+    assert row['incident_nature'] == 'Traffic Stop'
+    assert row.get('side_of_town') is None
+    assert 'side_of_town' not in row
+    assert table.column('weather') == ['Unknown']
+    assert table.column('incident_location')[0] is row['incident_location']
+
+
+@pytest.mark.parametrize("ems_mode, expected", [
+    ('index', [1, 0, 1, 0, 0, 0, 0, 0, 1]),
+    ('window', [1, 0, 0, 0, 0, 0, 0, 0, 1])
+])
+def test_calculate_ems_stats(sample_incidents, ems_mode, expected):
+    # Setup: an EMSSTAT record more than three records after the incident it belongs to
+    incidents = sample_incidents + [dict(sample_incidents[1], incident_number=str(i)) for i in range(5)] + [
+        dict(sample_incidents[0], incident_time='2/25/2024 0:08')
+    ]
+
+    # Execute
+    actual_ems_stats = functions.calculate_ems_stats(incidents, ems_mode)
+    ems_index = functions.build_ems_index(incidents) if ems_mode == 'index' else None
+    actual_checks = [functions.check_ems_stat(incident, incidents, i, ems_index) for i, incident in enumerate(incidents)]
+
+    # Assert
+    assert actual_ems_stats == actual_checks == expected
+
+
+def test_fetch_incidents_conditional_get(mocker, tmp_path):
+    # Mocks
+    first_resp = mocker.Mock(status_code=200, content=b'PDF data', headers={'ETag': '"abc"'})
+    second_resp = mocker.Mock(status_code=304, content=b'', headers={})
+    mock_session = mocker.Mock()
+    mock_session.get.side_effect = [first_resp, second_resp]
+    mocker.patch('http_client.session_for', return_value=mock_session)
+
+    # Execute
+    functions.configure_cache(str(tmp_path))
+    first_data = functions.fetch_incidents('http://testurl1.com')
+    second_data = functions.fetch_incidents('http://testurl1.com')
+    functions.configure_cache(None)
+
+    # Assert
+    assert first_data == second_data == b'PDF data'
+    assert mock_session.get.call_args_list[1].kwargs['headers'] == {'If-None-Match': '"abc"'}
+
+
+def test_extract_all_incidents_skips_parsed_pdfs(mocker, tmp_path):
+    # Mocks
+    extract_incidents_mock = mocker.patch('functions.extract_incidents', return_value=[{'incident_number': '1'}])
+
+    # Execute
+    functions.configure_cache(str(tmp_path))
+    first_run = list(functions.extract_all_incidents([b'pdf1', b'pdf2']))
+    second_run = list(functions.extract_all_incidents([b'pdf1', b'pdf2', b'pdf3']))
+    # incidents parsed in another extraction mode are not reused
+    list(functions.extract_all_incidents([b'pdf1'], extract_mode='layout'))
+    functions.configure_cache(None)
+
+    # Assert
+    assert first_run == second_run[:2]
+    assert extract_incidents_mock.call_count == 4
+
+
+@pytest.mark.parametrize("page_type", [None, 'last'])
+def test_tokenize_page_matches_split_and_refactor(page_type):
+    from tests import result_page_0, result_random_page, result_last_page
+    edge_cases = ['3/1/2024 1:02 2024-00000001HWY 35 RAMPMVA OK0140200\n',
+                  '3/1/2024 1:03 2024-00000002 W MAIN ST HWYMotorist Assist 1200 OK0140200\n',
+                  '3/1/2024 1:04 2024-00000003 35.2;-97.4 911 Call Nuisance EMS 14005\n',
+                  '3/1/2024 1:05 2024-00000004 OK0140200\n']
+    for page in (result_page_0, result_random_page, result_last_page, edge_cases):
+        page_text = ''.join(page)
+        expected = functions.refactor_page_data(functions.split_all_incidents(page_text, page_type))
+        assert functions.tokenize_page(page_text, page_type) == expected
+
+
+def test_extract_location_and_nature_special_tokens():
+    assert functions.extract_location_and_nature(['I', '35', 'RAMPMVA']) == ('I 35 RAMP', 'MVA')
+    assert functions.extract_location_and_nature(['HWYMotorist', 'Assist']) == ('HWY', 'Motorist Assist')
+    assert functions.extract_location_and_nature(['1/2', 'W', 'MAIN', 'ST', '911', 'Call']) == ('1/2 W MAIN ST', '911 Call')
+    assert functions.extract_location_and_nature(['COP', 'Relationships']) == ('', 'COP Relationships')
+
+
+def test_layout_page_records():
+    # Setup
+    columns = [36, 110, 200, 380, 520]
+    runs = [(36, 770, 'NORMAN POLICE DEPARTMENT'),
+            (36, 740, 'Date / Time'), (110, 740, 'Incident Number'), (200, 740, 'Location'), (380, 740, 'Nature'),
+            (520, 740, 'Incident ORI'),
+            (36, 723, '1/17/2024 0:08'), (110, 723, '2024-00003584'), (200, 723, '608 S FLOOD'), (380, 723, 'MVA'),
+            (200, 715, 'AVE'), (520, 723, 'OK0140200'),
+            (36, 706, '1/17/2024 0:13'), (110, 706, '2024-00003585'), (520, 706, 'EMSSTAT'),
+            (36, 20, '1/18/2024 11:42')]
+
+    # Execute
+    layout = functions.layout_columns(runs)
+    incidents = functions.layout_page_records(runs, *layout)
+
+    # Assert: wrapped cells are joined, the footer date is dropped
+    assert layout == (columns, 740)
+    assert incidents == [
+        {'incident_time': '1/17/2024 0:08', 'incident_number': '2024-00003584', 'incident_location': '608 S FLOOD AVE',
+         'incident_nature': 'MVA', 'incident_ori': 'OK0140200'},
+        {'incident_time': '1/17/2024 0:13', 'incident_number': '2024-00003585', 'incident_location': '',
+         'incident_nature': '', 'incident_ori': 'EMSSTAT'},
+    ]
+    assert functions.layout_columns(runs[6:]) is None
+
+
+def test_augment_and_print_incremental_matches_full_run(mocker, capsys, tmp_path):
+    # Mocks
+    from tests import result_page_0, result_random_page, result_last_page
+    from rank_state import RankState
+    mocker.patch('functions.get_lat_long', return_value=(35.20458136231884, -97.43226908695652))
+    mocker.patch('functions.fetch_hourly_weather', return_value=list(range(24)))
+    first_day = functions.refactor_page_data(result_page_0 + result_random_page)
+    second_day = functions.refactor_page_data(result_last_page)
+
+    # Execute
+    functions.augment_and_print_data(functions.refactor_page_data(result_page_0 + result_random_page + result_last_page))
+    full_rows = capsys.readouterr().out.splitlines()
+    state = RankState(str(tmp_path / 'state.sqlite'))
+    functions.augment_and_print_incremental(first_day, state)
+    state.close()
+    capsys.readouterr()
+    state = RankState(str(tmp_path / 'state.sqlite'))
+    # the first day is skipped, only the incidents of the second day are augmented
+    count = functions.augment_and_print_incremental(first_day + second_day, state)
+    incremental_rows = capsys.readouterr().out.splitlines()
+    repeated_count = functions.augment_and_print_incremental(second_day, state)
+    state.close()
+
+    # Assert: ranks of the new incidents reflect both days
+    assert count == len(second_day)
+    assert incremental_rows == full_rows[:1] + full_rows[-len(second_day):]
+    assert repeated_count == 0
+
+
+def test_find_directions_matches_find_direction():
+    # Setup: a grid around the center, points on the sector boundaries, far away points and missing coordinates
+    center_lat, center_lon = functions.TOWN_CENTER
+    coordinates = [(center_lat + i * 0.01, center_lon + j * 0.01) for i in range(-10, 11) for j in range(-10, 11)]
+    coordinates += [(center_lat + 0.05 * math.cos(math.radians(angle)),
+                     center_lon + 0.05 * math.sin(math.radians(angle)) / math.cos(math.radians(center_lat)))
+                    for angle in range(0, 360, 45)]
+    coordinates += [(0.0, 0.0), (-89.5, 179.9), (None, center_lon), (center_lat, None), (None, None)]
+
+    # Execute
+    directions = functions.find_directions(coordinates)
+    moved_directions = functions.find_directions(coordinates, center=(35.0, -97.0))
+
+    # Assert
+    assert directions == [functions.find_direction(lat, lon) for lat, lon in coordinates]
+    assert moved_directions == [functions.find_direction(lat, lon, (35.0, -97.0)) for lat, lon in coordinates]
+
+
+def test_find_directions_with_sectors(mocker, tmp_path):
+    # Setup
+    sectors_path = tmp_path / "sectors.json"
+    sectors_path.write_text(json.dumps({
+        "Campus": [[35.19, -97.46], [35.21, -97.46], [35.21, -97.43], [35.19, -97.43]],
+        "Downtown": [[35.21, -97.46], [35.23, -97.46], [35.23, -97.43], [35.21, -97.43]],
+    }))
+    coordinates = [(35.20, -97.44), (35.22, -97.44), (35.30, -97.44), (None, None)]
+
+    # Execute
+    mocker.patch('functions.town_sectors', None)
+    mocker.patch('functions.town_center', functions.TOWN_CENTER)
+    functions.configure_town(sectors_path=str(sectors_path))
+    directions = functions.find_directions(coordinates)
+    scalar_directions = [functions.find_direction(lat, lon) for lat, lon in coordinates]
+
+    # Assert
+    assert directions == ['Campus', 'Downtown', 'Unknown', 'Unknown']
+    assert scalar_directions == directions
+
+
+def test_fetch_failure_skips_document(mocker, capsys):
+    # Mocks
+    mock_session = mocker.Mock()
+    mock_session.get.return_value = mocker.Mock(status_code=404, raise_for_status=mocker.Mock(
+        side_effect=requests.HTTPError('404 Not Found')))
+    mocker.patch('http_client.session_for', return_value=mock_session)
+    mocker.patch('functions.extract_incidents', return_value=[{'incident_number': '1'}])
+
+    # Execute
+    data = functions.fetch_incidents('http://missing.test/summary.pdf')
+    documents = list(functions.extract_all_incidents([b'pdf1', data]))
+
+    # Assert: a missing PDF is not retried and yields no incidents instead of aborting the run
+    assert data is None
+    assert mock_session.get.call_count == 1
+    assert documents == [[{'incident_number': '1'}], []]
+    assert 'ERROR in fetching incidents' in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("pipeline", ['records', 'table', 'stream'])
+def test_augment_selected_columns_skips_lookups(mocker, capsys, pipeline):
+    # Mocks
+    from tests import result_page_0, result_random_page
+    records = functions.refactor_page_data(result_page_0 + result_random_page)
+    mocker.patch('functions.get_lat_long', return_value=(35.20458136231884, -97.43226908695652))
+    mocker.patch('functions.fetch_hourly_weather', return_value=list(range(24)))
+    functions.augment_and_print_data([dict(record) for record in records])
+    full_rows = [line.split("\t\t") for line in capsys.readouterr().out.splitlines()]
+    get_lat_long_mock = mocker.patch('functions.get_lat_long', side_effect=AssertionError("geocoded"))
+    http_get_mock = mocker.patch('http_client.get', side_effect=AssertionError("network used"))
+    columns = ['location_rank', 'incident_rank', 'ems_stat']
+
+    # Execute
+    if pipeline == 'records':
+        functions.augment_and_print_data(records, workers=4, columns=columns)
+    elif pipeline == 'table':
+        functions.augment_and_print_data(functions.IncidentTable.from_records(records), columns=columns)
+    else:
+        functions._print_augmented_stream(functions.augment_stream(
+            records, functions.calculate_location_ranks(records), functions.calculate_incident_ranks(records),
+            ems_index=functions.build_ems_index(records), columns=columns
+        ), columns=columns)
+    actual_rows = [line.split("\t\t") for line in capsys.readouterr().out.splitlines()]
+
+    # Assert: the selected columns of the full output, without any lookup
+    indexes = [functions.writers.OUTPUT_COLUMNS.index(column) for column in columns]
+    assert actual_rows == [[row[i] for i in indexes] for row in full_rows]
+    assert get_lat_long_mock.call_count == 0
+    assert http_get_mock.call_count == 0
+
+
+def test_select_columns():
+    # Execute
+    columns, needed = functions.select_columns(['incident_rank', 'weather', 'incident_rank'])
+
+    # Assert
+    assert columns == ('incident_rank', 'weather')
+    assert needed == {'incident_rank', 'incident_ranks', 'weather', 'coordinates'}
+    with pytest.raises(ValueError):
+        functions.select_columns(['incident_time'])
+
+
+@pytest.mark.parametrize("processes", [True, False])
+def test_sharded_augment_and_print_matches_in_memory(mocker, capsys, tmp_path, processes):
+    # Mocks
+    from tests import result_page_0, result_random_page, result_last_page
+    pages = {'http://testurl1.com': result_page_0, 'http://testurl2.com': result_random_page,
+             'http://testurl3.com': result_last_page}
+    mocker.patch('functions.fetch_incidents', side_effect=lambda url: url)
+    mocker.patch('functions.extract_incidents',
+                 side_effect=lambda url, extract_mode: functions.refactor_page_data(pages[url]))
+    mocker.patch('functions.get_lat_long', return_value=(35.20458136231884, -97.43226908695652))
+    mocker.patch('functions.fetch_hourly_weather', return_value=list(range(24)))
+
+    # Execute
+    all_incidents = functions.refactor_page_data(result_page_0 + result_random_page + result_last_page)
+    functions.augment_and_print_data(all_incidents)
+    expected_output = capsys.readouterr().out
+    if processes:
+        count = functions.sharded_augment_and_print(list(pages), 2, str(tmp_path))
+    else:
+        # the phases of nodes sharing the shard directory
+        for index in range(2):
+            functions.count_shard(list(pages), index, 2, str(tmp_path))
+        functions.merge_shard_counts(str(tmp_path), 2)
+        for index in range(2):
+            functions.augment_shard(index, str(tmp_path))
+        count = functions.collect_shards(str(tmp_path), 2)
+    actual_output = capsys.readouterr().out
+
+    # Assert
+    assert count == len(all_incidents)
+    assert actual_output == expected_output
+    assert functions.shard_urls(list(pages), 0, 2) + functions.shard_urls(list(pages), 1, 2) == list(pages)
+
+
+def test_watch_and_print_polls_next_days(mocker, capsys, tmp_path):
+    # Mocks: the summary of the next day is published, the one after is not yet
+    from tests import result_page_0, result_random_page, result_last_page
+    from rank_state import RankState
+    listed = 'https://host/files/2024-02/2024-02-25_daily_incident_summary.pdf'
+    published = {'https://host/files/2024-02/2024-02-26_daily_incident_summary.pdf': b'%PDF-26'}
+    pages = {listed: result_page_0 + result_random_page, b'%PDF-26': result_last_page}
+
+    def get(url, headers=None, **kwargs):
+        if url not in published:
+            return mocker.Mock(status_code=404)
+        if headers.get('If-None-Match') == 'v26':
+            return mocker.Mock(status_code=304)
+        return mocker.Mock(status_code=200, content=published[url], headers={'ETag': 'v26'})
+
+    http_get = mocker.patch('http_client.get', side_effect=get)
+    mocker.patch('functions.fetch_incidents', side_effect=lambda url: url)
+    mocker.patch('functions.extract_incidents',
+                 side_effect=lambda data, extract_mode: functions.refactor_page_data(pages[data]))
+    mocker.patch('functions.get_lat_long', return_value=(35.20458136231884, -97.43226908695652))
+    mocker.patch('functions.fetch_hourly_weather', return_value=list(range(24)))
+    mocker.patch('functions.WATCH_GRACE_DAYS', 100000)
+    sleep = mocker.patch('time.sleep')
+
+    # Execute
+    functions.augment_and_print_data(functions.refactor_page_data(result_page_0 + result_random_page +
+                                                                  result_last_page))
+    full_rows = capsys.readouterr().out.splitlines()
+    state = RankState(str(tmp_path / 'state.sqlite'))
+    count = functions.watch_and_print([listed], state, interval=60, writer=functions.writers.open_writer(), polls=3)
+    state.close()
+
+    # Assert: every incident is printed once under one heading, those of the next day ranked over both days
+    rows = capsys.readouterr().out.splitlines()
+    new_rows = len(functions.refactor_page_data(result_last_page))
+    assert count == len(full_rows) - 1
+    assert len(rows) == len(full_rows) and rows[0] == full_rows[0]
+    assert rows[-new_rows:] == full_rows[-new_rows:]
+    assert sleep.call_count == 2
+    # the published summary is polled again conditionally while the next one is missing
+    polled = [(call.args[0].rsplit('/', 1)[1][:10], call.kwargs['headers']) for call in http_get.call_args_list]
+    assert polled == [('2024-02-26', {}), ('2024-02-27', {}), ('2024-02-26', {'If-None-Match': 'v26'}),
+                      ('2024-02-27', {}), ('2024-02-26', {'If-None-Match': 'v26'})]
+
+
+def test_summary_urls():
+    # Execute
+    template, day = functions.summary_url_template(
+        'https://www.normanok.gov/sites/default/files/documents/2024-04/2024-04-06_daily_incident_summary.pdf'
+    )
+
+    # Assert: the summary of the last day of a month may be uploaded to the folder of the next one
+    assert day.isoformat() == '2024-04-06'
+    assert functions.summary_urls(template, day.replace(day=30)) == [
+        'https://www.normanok.gov/sites/default/files/documents/2024-04/2024-04-30_daily_incident_summary.pdf',
+        'https://www.normanok.gov/sites/default/files/documents/2024-05/2024-04-30_daily_incident_summary.pdf'
+    ]
+    with pytest.raises(ValueError):
+        functions.summary_url_template('https://host/latest.pdf')
+
+
+@pytest.mark.parametrize("parse_workers", [1, 2])
+def test_fetch_incidents_maps_local_files(mocker, tmp_path, parse_workers):
+    # Setup
+    from datetime import date
+    from benchmarks.synthetic import daily_summary_pdf
+    from local_pdfs import MappedPdf
+    data = daily_summary_pdf(date(2024, 2, 25), 120)
+    path = tmp_path / '2024-02-25_daily_incident_summary.pdf'
+    path.write_bytes(data)
+    http_get = mocker.patch('http_client.get')
+
+    # Execute
+    incident_data = functions.fetch_incidents(str(path))
+    local_incidents = list(functions.extract_all_incidents([incident_data], parse_workers))
+
+    # Assert: the file is mapped instead of downloaded and parses like the downloaded data
+    assert isinstance(incident_data, MappedPdf)
+    assert not http_get.called
+    assert local_incidents == [functions.extract_incidents(data)]
+    assert functions.fetch_incidents(str(tmp_path / 'missing.pdf')) is None
+
+
+def test_extract_incidents_reads_local_paths(tmp_path):
+    # Setup
+    from datetime import date
+    from benchmarks.synthetic import daily_summary_pdf
+    first = daily_summary_pdf(date(2024, 2, 25), 30)
+    second = daily_summary_pdf(date(2024, 2, 26), 20)
+    (tmp_path / '2024-02-26_daily_incident_summary.pdf').write_bytes(second)
+    (tmp_path / '2024-02-25_daily_incident_summary.pdf').write_bytes(first)
+    (tmp_path / 'notes.txt').write_text("not a summary")
+
+    # Execute
+    file_incidents = functions.extract_incidents(str(tmp_path / '2024-02-25_daily_incident_summary.pdf'))
+    directory_incidents = functions.extract_incidents(tmp_path)
+
+    # Assert: a file parses like its data, a directory like its PDFs in name order
+    assert file_incidents == functions.extract_incidents(first)
+    assert directory_incidents == file_incidents + functions.extract_incidents(second)
+    assert functions.extract_incidents(str(tmp_path / 'missing.pdf')) == []
+
+
+def test_configure_shard_worker(mocker, tmp_path):
+    # Mocks: restore the configuration of this process afterwards
+    import http_client
+    for name in ('offline_geocoder', 'geocoder_paths', 'town_center', 'town_sectors', 'GEOCODE_URL', 'WEATHER_URL',
+                 'rate_limit_shares'):
+        mocker.patch(f'functions.{name}', getattr(functions, name))
+    mocker.patch('http_client._breakers', {'host': http_client.CircuitBreaker()})
+    addresses = tmp_path / 'addresses.csv'
+    addresses.write_text("address,lat,lon\n1 MAIN ST,35.1,-97.4\n")
+    sectors = {'Campus': [(35.0, -97.5), (35.3, -97.5), (35.3, -97.3)]}
+
+    # Execute: a worker started without the state of its parent
+    functions.configure_shard_worker(None, 4, [str(addresses)], (35.0, -97.0), sectors, ('http://g', 'http://w'))
+
+    # Assert: the worker is configured like its parent, with fresh connections and a quarter of the rate limits
+    assert functions.offline_geocoder.geocode('1 Main St') == (35.1, -97.4)
+    assert (functions.town_center, functions.town_sectors) == ((35.0, -97.0), sectors)
+    assert (functions.GEOCODE_URL, functions.WEATHER_URL) == ('http://g', 'http://w')
+    assert http_client._breakers == {}
+    assert functions.rate_limit_shares == 4
+    assert functions.API_RATE_LIMITS == {'geocode': 50, 'weather': 10}
+
+
+def test_prefetch_weather_outlives_the_cache(mocker):
+    # Mocks: a weather cache holding a single group, and one request per fetch
+    from cache import SqliteCache
+    mocker.patch('functions.weather_cache', SqliteCache(None, 'weather', lru_size=1))
+    get = mocker.patch('http_client.get')
+    get.return_value.json.side_effect = lambda: {'hourly': {'weather_code': list(range(24))}}
+    incidents = [{'incident_time': f'2/{day}/2024 5:00'} for day in range(1, 6)]
+    coordinates = [(35.2, -97.4)] * len(incidents)
+
+    # Execute
+    weather = functions.prefetch_weather(incidents, coordinates, workers=2)
+    codes = [functions.find_weather(incident, lat, lon, weather) for incident, (lat, lon) in zip(incidents, coordinates)]
+
+    # Assert: the evicted groups are not fetched again
+    assert codes == [5] * len(incidents)
+    assert get.call_count == len(incidents)
+
+
+def test_watch_and_print_retries_malformed_summaries(mocker, capsys, tmp_path):
+    # Mocks: the next summary is first served truncated, then complete
+    from datetime import date
+    from benchmarks.synthetic import daily_summary_pdf
+    from rank_state import RankState
+    listed = 'https://host/files/2024-02/2024-02-25_daily_incident_summary.pdf'
+    summary = daily_summary_pdf(date(2024, 2, 26), 30)
+    responses = [summary[:200], summary]
+
+    def get(url, headers=None, **kwargs):
+        if '2024-02-26' not in url:
+            return mocker.Mock(status_code=404)
+        return mocker.Mock(status_code=200, content=responses.pop(0), headers={'ETag': 'v26'})
+
+    http_get = mocker.patch('http_client.get', side_effect=get)
+    mocker.patch('functions.fetch_incidents', return_value=None)
+    mocker.patch('functions.get_lat_long', return_value=(35.20458136231884, -97.43226908695652))
+    mocker.patch('functions.fetch_hourly_weather', return_value=list(range(24)))
+    mocker.patch('functions.WATCH_GRACE_DAYS', 100000)
+    sleep = mocker.patch('time.sleep')
+
+    # Execute
+    state = RankState(str(tmp_path / 'state.sqlite'))
+    count = functions.watch_and_print([listed], state, writer=functions.writers.open_writer(), polls=2)
+    state.close()
+
+    # Assert: the failure is logged, and the summary is downloaded again unconditionally and printed
+    captured = capsys.readouterr()
+    assert 'ERROR in processing incidents' in captured.err
+    assert count == len(functions.extract_incidents(summary)) == len(captured.out.splitlines()) - 1
+    assert sleep.call_count == 1
+    assert [call.kwargs['headers'] for call in http_get.call_args_list if '2024-02-26' in call.args[0]] == [{}, {}]
+    with pytest.raises(ValueError):
+        functions.watch_and_print([], state)
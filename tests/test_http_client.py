@@ -0,0 +1,74 @@
+import pytest
+import requests
+import http_client
+
+
+def _response(mocker, status_code, headers=None):
+    return mocker.Mock(status_code=status_code, headers=headers or {})
+
+
+def test_get_retries_with_retry_after(mocker):
+    # Mocks
+    mock_session = mocker.Mock()
+    mock_session.get.side_effect = [_response(mocker, 429, {'Retry-After': '7'}), _response(mocker, 503),
+                                    _response(mocker, 200)]
+    mocker.patch('http_client.session_for', return_value=mock_session)
+    sleep_mock = mocker.patch('http_client.time.sleep')
+
+    # Execute
+    resp = http_client.get('http://retry-after.test/data', backoff=0.5)
+
+    # Assert: the Retry-After delay is honored, then the backoff is at most 0.5 * 2
+    assert resp.status_code == 200
+    assert sleep_mock.call_args_list[0].args[0] == 7
+    assert 0 <= sleep_mock.call_args_list[1].args[0] <= 1
+    assert mock_session.get.call_count == 3
+
+
+def test_get_raises_after_last_attempt(mocker):
+    # Mocks
+    mock_session = mocker.Mock()
+    mock_session.get.side_effect = requests.Timeout('read timed out')
+    mocker.patch('http_client.session_for', return_value=mock_session)
+    mocker.patch('http_client.time.sleep')
+
+    # Execute / Assert
+    with pytest.raises(requests.Timeout):
+        http_client.get('http://timeout.test/data', retries=2)
+    assert mock_session.get.call_count == 3
+
+
+def test_circuit_breaker_fails_fast_and_recovers(mocker):
+    # Mocks
+    now = [1000.0]
+    mocker.patch('http_client.time.monotonic', side_effect=lambda: now[0])
+    mocker.patch('http_client.time.sleep')
+    mock_session = mocker.Mock()
+    mock_session.get.return_value = _response(mocker, 500)
+    mocker.patch('http_client.session_for', return_value=mock_session)
+
+    # Execute: the fifth consecutive failure opens the circuit
+    http_client.get('http://flaky.test/data', retries=4)
+    with pytest.raises(http_client.CircuitOpenError):
+        http_client.get('http://flaky.test/data')
+    calls_while_open = mock_session.get.call_count
+    # after the cooldown a trial request closes the circuit again
+    now[0] += http_client.CIRCUIT_COOLDOWN
+    mock_session.get.return_value = _response(mocker, 200)
+    resp = http_client.get('http://flaky.test/data')
+
+    # Assert
+    assert calls_while_open == http_client.FAILURE_THRESHOLD
+    assert resp.status_code == 200
+    assert http_client.get('http://flaky.test/data').status_code == 200
+
+
+def test_retry_after_http_date(mocker):
+    # Mocks
+    mocker.patch('http_client.time.time', return_value=1_700_000_000)
+
+    # Execute
+    seconds = http_client.retry_after(_response(mocker, 503, {'Retry-After': 'Tue, 14 Nov 2023 22:13:50 GMT'}))
+
+    # Assert
+    assert seconds == 30
@@ -0,0 +1,66 @@
+import pytest
+from incident_store import IncidentStore
+
+
+def _incident(number, time, nature, side, ems_stat, ori='OK0140200'):
+    return {'incident_number': number, 'incident_ori': ori, 'incident_time': time,
+            'incident_location': '1880 CLASSEN BLVD', 'incident_nature': nature, 'day_of_week': 1,
+            'time_of_day': int(time.split()[1].split(':')[0]), 'weather': 3, 'location_rank': 1,
+            'side_of_town': side, 'incident_rank': 1, 'ems_stat': ems_stat}
+
+
+@pytest.fixture
+def store():
+    store = IncidentStore(None)
+    store.add([
+        _incident('1', '1/31/2024 23:10', 'Traffic Stop', 'N', 0),
+        _incident('2', '2/1/2024 0:05', 'Traffic Stop', 'N', 1),
+        _incident('3', '2/12/2024 0:40', 'Sick Person', 'N', 1, 'EMSSTAT'),
+        _incident('4', '2/12/2024 0:40', 'Sick Person', 'N', 1),
+        _incident('5', '2/29/2024 13:00', 'Traffic Stop', 'S', 0),
+        _incident('6', '3/1/2024 13:00', 'Sick Person', 'N', 0),
+    ])
+    yield store
+    store.close()
+
+
+def test_aggregate_filters_by_date_and_side(store):
+    # Execute
+    actual = store.aggregate('nature', start='2024-02-01', end='2024-02-29', side_of_town='N')
+
+    # Assert: most frequent first
+    assert actual == [('Sick Person', 2), ('Traffic Stop', 1)]
+    assert store.aggregate('nature', side_of_town=['N', 'S'], limit=1) == [('Sick Person', 3)]
+
+
+def test_aggregate_ems_share_by_hour(store):
+    # Execute
+    actual = store.aggregate(['hour'], measure='ems_share', order='group')
+
+    # Assert
+    assert actual == [(0, 1.0), (13, 0.0), (23, 0.0)]
+    assert store.aggregate('month', order='group') == [('2024-01', 1), ('2024-02', 4), ('2024-03', 1)]
+    with pytest.raises(ValueError):
+        store.aggregate('incident_time')
+
+
+def test_add_replaces_stored_incidents(store):
+    # Execute: the same incidents again, one with a changed nature
+    stored = list(store.tee([_incident('6', '3/1/2024 13:00', 'Mutual Aid', 'N', 0)]))
+
+    # Assert
+    assert len(stored) == 1
+    assert store.aggregate() == [(6,)]
+    assert store.aggregate('nature', start='2024-03-01') == [('Mutual Aid', 1)]
+    assert store.date_range() == ('2024-01-31', '2024-03-01')
+
+
+def test_date_filter_uses_index(store):
+    # Execute
+    plan = store.conn.execute(
+        "EXPLAIN QUERY PLAN SELECT nature, COUNT(*) FROM incidents WHERE date >= ? AND date <= ? GROUP BY nature",
+        ('2024-02-01', '2024-02-29')
+    ).fetchall()
+
+    # Assert
+    assert any('USING INDEX' in row[-1] for row in plan)
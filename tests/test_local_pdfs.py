@@ -0,0 +1,35 @@
+import pickle
+import local_pdfs
+
+
+def test_expand_sources(tmp_path):
+    # Setup: summaries in month folders next to other files
+    for name in ('2024-03/2024-03-01_daily_incident_summary.pdf', '2024-02/2024-02-29_daily_incident_summary.pdf',
+                 '2024-02/2024-02-28_daily_incident_summary.PDF', '2024-02/notes.txt'):
+        (tmp_path / name).parent.mkdir(exist_ok=True)
+        (tmp_path / name).write_bytes(b'%PDF-1.4')
+
+    # Execute
+    sources = local_pdfs.expand_sources(['https://host/a.pdf', f"file://{tmp_path}", 'local.pdf'])
+
+    # Assert: URLs and files are kept in place, the PDFs of a directory are sorted by name
+    assert sources == ['https://host/a.pdf', str(tmp_path / '2024-02/2024-02-28_daily_incident_summary.PDF'),
+                       str(tmp_path / '2024-02/2024-02-29_daily_incident_summary.pdf'),
+                       str(tmp_path / '2024-03/2024-03-01_daily_incident_summary.pdf'), 'local.pdf']
+    assert local_pdfs.source_path('https://host/a.pdf') is None
+
+
+def test_mapped_pdf_pickles_as_path(tmp_path):
+    # Setup
+    path = tmp_path / 'summary.pdf'
+    path.write_bytes(b'%PDF-1.4 incidents')
+
+    # Execute
+    pdf = local_pdfs.MappedPdf(str(path))
+    data = pickle.dumps(pdf)
+    copy = pickle.loads(data)
+
+    # Assert: the content is not pickled, the copy maps the same file
+    assert b'incidents' not in data
+    assert copy[:] == pdf[:] == b'%PDF-1.4 incidents'
+    assert copy.path == str(path)
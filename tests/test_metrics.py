@@ -0,0 +1,38 @@
+import metrics
+
+
+def test_metrics_disabled_collects_nothing():
+    # Execute
+    metrics.reset()
+    metrics.enable(False)
+    with metrics.timer('fetch'):
+        metrics.count('http.pdf')
+        metrics.observe('records_per_page', 16)
+        metrics.record_url('http://testurl1.com', 1.5)
+
+    # Assert
+    assert metrics.dump() == {'stages': {}, 'counters': {}, 'observations': {}, 'slowest_urls': []}
+
+
+def test_metrics_enabled(mocker):
+    # Execute
+    metrics.reset()
+    metrics.enable()
+    for i in range(3):
+        with metrics.timer('fetch'):
+            metrics.count('http.pdf')
+        metrics.observe('records_per_page', 10 + i)
+    for i in range(metrics.SLOWEST_URLS + 2):
+        metrics.record_url(f'http://testurl{i}.com', i)
+    actual_metrics = metrics.dump()
+    actual_report = metrics.report()
+    metrics.enable(False)
+
+    # Assert
+    assert actual_metrics['stages']['fetch']['calls'] == 3
+    assert actual_metrics['counters'] == {'http.pdf': 3}
+    assert actual_metrics['observations']['records_per_page'] == {'count': 3, 'mean': 11, 'min': 10, 'max': 12}
+    assert [entry['url'] for entry in actual_metrics['slowest_urls']][:2] == ['http://testurl6.com',
+                                                                              'http://testurl5.com']
+    assert len(actual_metrics['slowest_urls']) == metrics.SLOWEST_URLS
+    assert 'fetch' in actual_report and 'http://testurl6.com' in actual_report
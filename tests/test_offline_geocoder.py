@@ -0,0 +1,57 @@
+import pytest
+import functions
+from offline_geocoder import OfflineGeocoder
+
+
+@pytest.fixture
+def geocoder(tmp_path):
+    addresses = tmp_path / "addresses.csv"
+    addresses.write_text("address,lat,lon\n"
+                         "100 W MAIN ST,35.2000,-97.4500\n"
+                         "200 W MAIN ST,35.2000,-97.4400\n"
+                         "1144 24TH AVE SE,35.1900,-97.4000\n")
+    centerlines = tmp_path / "centerlines.csv"
+    centerlines.write_text("street,from_lat,from_lon,to_lat,to_lon,from_number,to_number\n"
+                           "DOVER ST,35.2100,-97.4300,35.2100,-97.4200,100,198\n"
+                           "VICKSBURG AVE,35.2000,-97.4200,35.2100,-97.4200,,\n"
+                           "TROUT AVE,35.2200,-97.4105,35.2300,-97.4105,,\n"
+                           "E BOYD ST,35.2200,-97.4100,35.2200,-97.4000,,\n")
+    geocoder = OfflineGeocoder(functions.normalize_address)
+    geocoder.load(str(addresses))
+    geocoder.load(str(centerlines))
+    return geocoder
+
+
+@pytest.mark.parametrize("location, expected", [
+    ("100 w  main st", (35.2, -97.45)),                  # exact address after normalization
+    ("150 W MAIN ST", (35.2, -97.445)),                  # between two address points
+    ("149 DOVER ST", (35.21, -97.425)),                  # house number range of a centerline
+    ("DOVER ST/VICKSBURG AVE", (35.21, -97.42)),         # node shared by both streets
+    ("E BOYD ST / TROUT AVE", (35.22, -97.41025)),       # closest ends of both streets
+    ("150 W MAIN STT", (35.2, -97.445)),                 # misspelled street
+    ("1144 24TH AVE", (35.19, -97.4)),                   # prefix of a known address
+    ("1 UNKNOWN RD", None),
+    ("DOVER ST / UNKNOWN RD", None),
+])
+def test_offline_geocoder(geocoder, location, expected):
+    # Execute
+    point = geocoder.geocode(location)
+
+    # Assert
+    if expected is None:
+        assert point is None
+    else:
+        assert point == pytest.approx(expected)
+
+
+def test_get_lat_long_offline(mocker, geocoder):
+    # Mocks
+    requests_mock = mocker.patch('http_client.get')
+    mocker.patch('functions.offline_geocoder', geocoder)
+
+    # Execute
+    lat, lon = functions.get_lat_long({'incident_location': 'DOVER ST / VICKSBURG AVE'})
+
+    # Assert: no request is sent for a location found in the local data
+    assert (lat, lon) == pytest.approx((35.21, -97.42))
+    requests_mock.assert_not_called()
@@ -0,0 +1,56 @@
+import pytest
+from collections import Counter
+import functions
+import vectorized
+
+
+@pytest.mark.parametrize("values", [
+    ['1880 CLASSEN BLVD', '2120 W BROOKS ST', '1880 CLASSEN BLVD'],
+    ['Traffic Stop', 'Mutual Aid', 'Alarm', 'Mutual Aid', 'Alarm', 'Falls', 'Traffic Stop', 'Traffic Stop'],
+    ['', 'Falls', ''],
+    []
+])
+def test_competition_ranks(values):
+    # Execute
+    actual_row_ranks, actual_ranks = vectorized.competition_ranks(values)
+
+    # Expect
+    expected_ranks = functions.ranks_from_counts(Counter(values))
+
+    # Asserts
+    assert actual_ranks == expected_ranks
+    assert actual_row_ranks.tolist() == [expected_ranks[value] for value in values]
+
+
+def test_days_and_hours():
+    # Setup
+    times = ['2/25/2024 0:04', '1/17/2024 23:16', '2/29/2024 12:00', '1/1/1900 00:00', '12/31/2099 7:59', '2/25/2024 0:04']
+
+    # Execute
+    actual_days, actual_hours = vectorized.days_and_hours(times)
+
+    # Asserts
+    assert list(zip(actual_days.tolist(), actual_hours.tolist())) == [functions._day_and_hour(t) for t in times]
+
+
+def test_days_and_hours_edge_times():
+    # Setup: leap days, month ends, one digit minutes and a double space that only strptime takes
+    times = ['2/29/2024 0:4', '2/28/2023 23:5', '2/29/2000 1:00', '4/30/2024 9:09', '12/31/2024 23:59',
+             '03/01/2024 00:00', '2/25/2024  0:04']
+
+    # Execute
+    actual_days, actual_hours = vectorized.days_and_hours(times)
+
+    # Asserts
+    assert list(zip(actual_days.tolist(), actual_hours.tolist())) == [functions._day_and_hour(t) for t in times]
+
+
+@pytest.mark.parametrize("time", ['2/25/2024', '2/30/2024 0:04', '2/29/2023 0:04', '2/29/1900 0:04', '4/31/2024 0:04',
+                                  '13/1/2024 0:04', '0/1/2024 0:04', '1/0/2024 0:04', '1/1/2024 24:00',
+                                  '1/1/2024 0:60', '1/1/0000 0:00'])
+def test_days_and_hours_invalid_time(time):
+    # Execute and Assert: rejected like the scalar path
+    with pytest.raises(ValueError):
+        functions._day_and_hour(time)
+    with pytest.raises(ValueError):
+        vectorized.days_and_hours(['2/25/2024 0:04', time])
@@ -0,0 +1,102 @@
+import csv
+import json
+import pytest
+import writers
+
+ROWS = [(3, 0, 2, 1, 'NW', 4, 'Check Area', 0), (3, 1, 'Unknown', 2, 'Unknown', 1, 'Sick Person', 1)]
+
+
+@pytest.mark.parametrize("output_format, delimiter", [('tsv', '\t'), ('csv', ',')])
+def test_text_writer(tmp_path, output_format, delimiter):
+    # Execute
+    path = tmp_path / f"out.{output_format}"
+    writer = writers.open_writer(output_format, str(path))
+    writer.write_rows(ROWS)
+    writer.close()
+
+    # Assert: the headings come first, in the order of print_headers
+    with open(path, newline='') as file:
+        lines = list(csv.reader(file, delimiter=delimiter))
+    assert lines[0] == list(writers.OUTPUT_HEADERS)
+    assert lines[1:] == [[str(value) for value in row] for row in ROWS]
+
+
+def test_print_writer_matches_print_augmented_data(capsys):
+    # Setup
+    import functions
+    incident = dict(zip(writers.OUTPUT_COLUMNS, ROWS[0]))
+
+    # Execute
+    functions.print_headers()
+    functions.print_augmented_data(incident)
+    expected_output = capsys.readouterr().out
+    writer = writers.open_writer()
+    writer.write_row(ROWS[0])
+    writer.close()
+
+    # Assert
+    assert capsys.readouterr().out == expected_output
+
+
+def test_jsonl_writer(tmp_path):
+    # Execute
+    path = tmp_path / "out.jsonl"
+    writer = writers.open_writer('jsonl', str(path))
+    writer.write_rows(ROWS)
+    writer.close()
+
+    # Assert
+    with open(path) as file:
+        assert [json.loads(line) for line in file] == [dict(zip(writers.OUTPUT_COLUMNS, row)) for row in ROWS]
+
+
+def test_parquet_writer(tmp_path, mocker):
+    pyarrow_parquet = pytest.importorskip("pyarrow.parquet")
+    # Mocks
+    mocker.patch('writers.PARQUET_ROW_GROUP', 1)
+
+    # Execute
+    path = tmp_path / "out.parquet"
+    writer = writers.open_writer('parquet', str(path))
+    writer.write_rows(ROWS)
+    writer.close()
+
+    # Assert
+    table = pyarrow_parquet.read_table(str(path))
+    assert table.column_names == list(writers.OUTPUT_COLUMNS)
+    assert table.column('weather').to_pylist() == ['2', 'Unknown']
+    assert table.column('incident_nature').to_pylist() == ['Check Area', 'Sick Person']
+
+
+def test_open_writer_rejects_parquet_to_stdout():
+    with pytest.raises(ValueError):
+        writers.open_writer('parquet')
+
+
+def test_jsonl_writer_selected_columns(tmp_path):
+    # Execute
+    path = tmp_path / "out.jsonl"
+    writer = writers.open_writer('jsonl', str(path), ('incident_rank', 'ems_stat'))
+    writer.write_rows([(4, 0), (1, 1)])
+    writer.close()
+
+    # Assert
+    with open(path) as file:
+        assert [json.loads(line) for line in file] == [{'incident_rank': 4, 'ems_stat': 0},
+                                                       {'incident_rank': 1, 'ems_stat': 1}]
+
+
+def test_open_writer_append(tmp_path):
+    # Execute: a second run adds its rows to the file of the first one
+    path = tmp_path / "out.tsv"
+    for row in ROWS:
+        writer = writers.open_writer('tsv', str(path), append=True)
+        writer.write_row(row)
+        writer.close()
+
+    # Assert: the headings are only written to the empty file
+    with open(path, newline='') as file:
+        lines = list(csv.reader(file, delimiter='\t'))
+    assert lines == [list(writers.OUTPUT_HEADERS)] + [[str(value) for value in row] for row in ROWS]
+    with pytest.raises(ValueError):
+        writers.open_writer('parquet', str(tmp_path / "out.parquet"), append=True)
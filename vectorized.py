@@ -0,0 +1,180 @@
+import re
+from array import array
+
+import numpy as np
+
+# incident time as printed in the PDF, for example "2/25/2024 0:04", with one or two digit fields like strptime;
+# any other line matches the empty alternative, so that findall gives one field tuple per line
+INCIDENT_TIME_PATTERN = re.compile(r'^(?:(\d{1,2})/(\d{1,2})/(\d{4}) (\d{1,2}):(\d{1,2})|.*)$', re.MULTILINE)
+
+# days of each month in a common year
+MONTH_DAYS = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31], dtype=np.int64)
+
+
+def factorize(values):
+    """Replace values by integer codes.
+
+    Params:
+        values (list): column values
+    Return:
+    - codes (ndarray): index of each value in uniques
+    - uniques (ndarray): distinct values in sorted order
+    """
+    uniques, codes = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    return codes.reshape(-1), uniques
+
+
+def competition_ranks(values):
+    """Rank values by descending count, tied values share the rank of the first of them.
+
+    Gives the same ranks as functions.ranks_from_counts.
+
+    Params:
+        values (list): column values
+    Return:
+    - row_ranks (ndarray): rank of the value of each row
+    - ranks (dict): rank of each distinct value
+    """
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.int32), {}
+    codes, uniques = factorize(values)
+    counts = np.bincount(codes, minlength=len(uniques))
+    # the rank of a value is one more than the number of distinct values seen more often
+    sorted_counts = np.sort(counts)
+    value_ranks = (len(counts) - np.searchsorted(sorted_counts, counts, side='right') + 1).astype(np.int32)
+    return value_ranks[codes], dict(zip(uniques.tolist(), value_ranks.tolist()))
+
+
+def days_and_hours(times):
+    """Parse all incident times at once.
+
+    Params:
+        times (list): incident times formatted as "%m/%d/%Y %H:%M"
+    Return:
+    - days_of_week (ndarray): isoweekday() + 1 of each time
+    - hours (ndarray): hour of each time
+    Raise:
+        ValueError if a time does not match the format
+    """
+    if len(times) == 0:
+        return np.zeros(0, dtype=np.int8), np.zeros(0, dtype=np.int8)
+    # parse each distinct time once
+    codes, uniques = factorize(times)
+    uniques = uniques.tolist()
+    fields = INCIDENT_TIME_PATTERN.findall("\n".join(uniques))
+    if len(fields) != len(uniques):
+        # a time spanning lines, strptime rejects it below
+        fields = [('',) * 5] * len(uniques)
+    matched = np.array([field[0] != '' for field in fields], dtype=bool)
+    month, day, year, hour, minute = np.array([field if field[0] else ('1', '1', '1970', '0', '0') for field in fields],
+                                              dtype=np.int64).reshape(-1, 5).T
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    month_days = MONTH_DAYS[np.clip(month, 1, 12) - 1] + ((month == 2) & leap)
+    valid = (matched & (year >= 1) & (month >= 1) & (month <= 12) & (day >= 1) & (day <= month_days) & (hour <= 23)
+             & (minute <= 59))
+
+    # days since 1970-01-01 of the civil dates, then weekday with Monday as 0
+    days = (_days_from_civil(year, month, day) + 3) % 7
+    # isoweekday is the weekday plus one, and the augmented day of week adds one more
+    days_of_week = (days + 2).astype(np.int8)
+    hours = hour.astype(np.int8)
+    # times the pattern does not take, such as extra spaces or 2/30, are parsed or rejected by strptime
+    if not valid.all():
+        from functions import _day_and_hour
+        for index in np.flatnonzero(~valid).tolist():
+            days_of_week[index], hours[index] = _day_and_hour(uniques[index])
+    return days_of_week[codes], hours[codes]
+
+
+def _days_from_civil(year, month, day):
+    # Number of days from 1970-01-01 to each proleptic Gregorian date
+    year = year - (month <= 2)
+    era = np.floor_divide(year, 400)
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + np.where(month > 2, -3, 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def coordinates_array(coordinates):
+    """Split (lat, lon) tuples into float arrays, missing coordinates become NaN.
+
+    Params:
+        coordinates (list): (lat, lon) tuple of each incident, either may be None
+    Return:
+    - lats (ndarray): latitudes
+    - lons (ndarray): longitudes
+    - known (ndarray): True where both coordinates are given
+    """
+    lats = np.array([np.nan if lat is None else lat for lat, lon in coordinates], dtype=np.float64)
+    lons = np.array([np.nan if lon is None else lon for lat, lon in coordinates], dtype=np.float64)
+    known = np.array([lat is not None and lon is not None for lat, lon in coordinates], dtype=bool)
+    return lats, lons, known
+
+
+def bearings(lats, lons, center_lat_rad, center_lon_rad, sin_center_lat, cos_center_lat):
+    """Initial bearing in degrees from the center to each point, computed like functions.find_direction.
+
+    Params:
+    - lats, lons (ndarray): coordinates of the points in degrees
+    - center_lat_rad, center_lon_rad (float): center in radians
+    - sin_center_lat, cos_center_lat (float): sine and cosine of the center latitude
+    Return:
+        bearings (ndarray): bearing of each point in [0, 360)
+    """
+    target_lat_rad, target_lon_rad = np.radians(lats), np.radians(lons)
+    delta_lon = target_lon_rad - center_lon_rad
+    x = np.sin(delta_lon) * np.cos(target_lat_rad)
+    y = cos_center_lat * np.sin(target_lat_rad) - (sin_center_lat * np.cos(target_lat_rad) * np.cos(delta_lon))
+    return (np.degrees(np.arctan2(x, y)) + 360) % 360
+
+
+def octants(bearings):
+    """Index of the 45 degree sector, N first and clockwise, of each bearing."""
+    return (np.floor_divide(np.nan_to_num(bearings) + 22.5, 45) % 8).astype(np.int8)
+
+
+def near_octant_boundary(bearings, tolerance):
+    """Positions of the bearings within tolerance degrees of a sector boundary, or not finite.
+
+    Params:
+    - bearings (ndarray): bearings in degrees
+    - tolerance (float): distance to a boundary in degrees
+    Return:
+        positions (list): index of each such bearing
+    """
+    offset = np.mod(bearings + 22.5, 45)
+    return np.flatnonzero(~np.isfinite(bearings) | (offset < tolerance) | (offset > 45 - tolerance)).tolist()
+
+
+def points_in_polygon(lats, lons, polygon):
+    """Even-odd rule test of every point against a polygon, with the same arithmetic as functions._in_polygon.
+
+    Params:
+    - lats, lons (ndarray): coordinates of the points
+    - polygon (list): (lat, lon) vertices of the polygon
+    Return:
+        inside (ndarray): True for the points inside the polygon
+    """
+    inside = np.zeros(len(lats), dtype=bool)
+    for (lat_i, lon_i), (lat_j, lon_j) in zip(polygon, polygon[-1:] + polygon[:-1]):
+        crosses = (lat_i > lats) != (lat_j > lats)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crossing_lon = (lon_j - lon_i) * (lats - lat_i) / (lat_j - lat_i) + lon_i
+        inside ^= crosses & (lons < crossing_lon)
+    return inside
+
+
+def sector_indexes(lats, lons, polygons):
+    """Index of the first polygon holding each point, -1 for points outside all of them."""
+    indexes = np.full(len(lats), -1, dtype=np.int32)
+    for index, polygon in enumerate(polygons):
+        indexes[(indexes == -1) & points_in_polygon(lats, lons, polygon)] = index
+    return indexes
+
+
+def to_array(typecode, values):
+    """Convert a numpy integer array into an array.array column of an IncidentTable."""
+    column = array(typecode)
+    column.frombytes(np.ascontiguousarray(values, dtype=np.dtype(typecode)).tobytes())
+    return column
@@ -0,0 +1,197 @@
+import csv
+import json
+import sys
+from itertools import islice
+
+# augmented fields written for every incident and their headings, in the order of print_headers
+OUTPUT_COLUMNS = (
+    'day_of_week', 'time_of_day', 'weather', 'location_rank', 'side_of_town', 'incident_rank', 'incident_nature',
+    'ems_stat'
+)
+OUTPUT_HEADERS = (
+    "Day of the Week", "Time of Day", "Weather", "Location Rank", "Side of Town", "Incident Rank", "Nature",
+    "EMSSTAT"
+)
+# 'print' is the double tab separated output of print_augmented_data
+OUTPUT_FORMATS = ('print', 'tsv', 'csv', 'jsonl', 'parquet')
+# size of the buffer of output files
+BUFFER_SIZE = 1 << 20
+# rows formatted together by write_rows
+WRITE_BATCH = 1024
+# rows collected before a Parquet row group is written
+PARQUET_ROW_GROUP = 65536
+
+
+def open_writer(output_format='print', path=None, columns=OUTPUT_COLUMNS, append=False):
+    """Open a writer of augmented incidents.
+
+    Params:
+    - output_format (str): one of OUTPUT_FORMATS
+    - path (str/None): output file, None writes to stdout
+    - columns (tuple): OUTPUT_COLUMNS written, in this order
+    - append (bool): add the rows to the end of the output file, without headings when it is not empty
+    Return:
+        writer: object with write_row, write_rows, flush and close
+    """
+    unknown = [column for column in columns if column not in OUTPUT_COLUMNS]
+    if unknown:
+        raise ValueError(f"unknown output columns {unknown}, expected some of {OUTPUT_COLUMNS}")
+    if output_format == 'parquet':
+        if not path:
+            raise ValueError("the parquet format needs an output file")
+        if append:
+            raise ValueError("parquet files cannot be appended to, use another format")
+        return ParquetWriter(path, columns)
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"unknown output format {output_format!r}, expected one of {OUTPUT_FORMATS}")
+
+    if path:
+        file = open(path, 'a' if append else 'w', newline='', buffering=BUFFER_SIZE)
+    else:
+        file = sys.stdout
+    # the headings of an appended file were written by the run that started it
+    headings = not (append and path and file.tell() > 0)
+    if output_format == 'jsonl':
+        return JsonLinesWriter(file, file is not sys.stdout, columns)
+    return TextWriter(file, output_format, file is not sys.stdout, columns, headings)
+
+
+def headers_of(columns):
+    """Return the headings of some OUTPUT_COLUMNS."""
+    return tuple(OUTPUT_HEADERS[OUTPUT_COLUMNS.index(column)] for column in columns)
+
+
+class TextWriter:
+    """Writes rows as text lines WRITE_BATCH rows at a time, the headings are written before the first row.
+
+    Params:
+    - file (file): text file receiving the rows
+    - output_format (str): 'print', 'tsv' or 'csv'
+    - close_file (bool): close the file with the writer
+    - columns (tuple): OUTPUT_COLUMNS of the rows
+    - headings (bool): write the headings before the first row
+    """
+
+    def __init__(self, file, output_format='print', close_file=False, columns=OUTPUT_COLUMNS, headings=True):
+        self.file = file
+        self.close_file = close_file
+        self.headings = headings
+        self.columns = tuple(columns)
+        self.headers = headers_of(self.columns)
+        # line of the 'print' format
+        self.line = "\t\t".join(["{}"] * len(self.columns)) + "\n"
+        self.count = 0
+        self.pending = []
+        if output_format == 'print':
+            self.writerows = self._write_print_rows
+        else:
+            self.writerows = csv.writer(file, delimiter='\t' if output_format == 'tsv' else ',').writerows
+
+    def _write_print_rows(self, rows):
+        self.file.write("".join([self.line.format(*row) for row in rows]))
+
+    def write_row(self, row):
+        """Write one row of values of the writer columns."""
+        self.pending.append(row)
+        if len(self.pending) >= WRITE_BATCH:
+            self.flush()
+
+    def write_rows(self, rows):
+        """Write every row of an iterable of values of the writer columns."""
+        rows = iter(rows)
+        while True:
+            self.pending.extend(islice(rows, WRITE_BATCH - len(self.pending)))
+            if len(self.pending) < WRITE_BATCH:
+                return
+            self.flush()
+
+    def flush(self, file=False):
+        """Format and write the pending rows, and flush the file when file is True."""
+        if self.pending:
+            if self.count == 0 and self.headings:
+                self.writerows([self.headers])
+            self.writerows(self.pending)
+            self.count += len(self.pending)
+            self.pending = []
+        if file:
+            self.file.flush()
+
+    def close(self):
+        """Write the pending rows, closing the file unless it is stdout."""
+        self.flush()
+        if self.close_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+
+class JsonLinesWriter(TextWriter):
+    """Writes every row as a JSON object keyed by the writer columns, one per line."""
+
+    def __init__(self, file, close_file=False, columns=OUTPUT_COLUMNS):
+        # every object carries its keys, there is no heading line
+        super().__init__(file, 'print', close_file, columns, headings=False)
+        self.writerows = self._write_json_rows
+
+    def _write_json_rows(self, rows):
+        encode = json.JSONEncoder().encode
+        self.file.write("".join([encode(dict(zip(self.columns, row))) + "\n" for row in rows]))
+
+
+class ParquetWriter:
+    """Writes rows to a Parquet file in row groups of PARQUET_ROW_GROUP rows, needs pyarrow.
+
+    Params:
+    - path (str): output file
+    - columns (tuple): OUTPUT_COLUMNS of the rows
+    """
+
+    def __init__(self, path, columns=OUTPUT_COLUMNS):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as ex:
+            raise ImportError("the parquet format needs pyarrow, install it with 'pipenv install pyarrow'") from ex
+        self.pyarrow = pyarrow
+        # weather is a code or "Unknown", so it is kept as text
+        schema = pyarrow.schema([
+            ('day_of_week', pyarrow.int8()), ('time_of_day', pyarrow.int8()), ('weather', pyarrow.string()),
+            ('location_rank', pyarrow.int32()), ('side_of_town', pyarrow.string()),
+            ('incident_rank', pyarrow.int32()), ('incident_nature', pyarrow.string()), ('ems_stat', pyarrow.int8())
+        ])
+        self.columns = tuple(columns)
+        self.schema = pyarrow.schema([schema.field(column) for column in self.columns])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        self.rows = []
+        self.count = 0
+
+    def write_row(self, row):
+        """Write one row of values of the writer columns."""
+        self.rows.append(row)
+        self.count += 1
+        if len(self.rows) >= PARQUET_ROW_GROUP:
+            self.flush()
+
+    def write_rows(self, rows):
+        """Write every row of an iterable of values of the writer columns."""
+        for row in rows:
+            self.write_row(row)
+
+    def flush(self, file=False):
+        """Write the collected rows as one row group, the file is only complete once closed."""
+        if not self.rows:
+            return
+        columns = [list(column) for column in zip(*self.rows)]
+        if 'weather' in self.columns:
+            weather = self.columns.index('weather')
+            columns[weather] = [None if value is None else str(value) for value in columns[weather]]
+        self.writer.write_table(self.pyarrow.Table.from_arrays(
+            [self.pyarrow.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema
+        ))
+        self.rows = []
+
+    def close(self):
+        """Write the remaining rows and close the file."""
+        self.flush()
+        self.writer.close()